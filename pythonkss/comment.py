@@ -1,6 +1,8 @@
 import codecs
 import re
 
+from pythonkss.variables import get_variable_substituter
+
 
 single_line_re = re.compile(r'^\s*\/\/')
 single_line_strip_re = re.compile(r'\s*\/\/')
@@ -13,6 +15,14 @@ multi_line_middle_strip_re = re.compile(r'^(\s*\*+)')
 
 preceding_white_space_re = re.compile(r'^\s*')
 
+# Lines that start with "//" or "/*" (after optional whitespace). Starting
+# with a literal newline instead of using ^ and re.MULTILINE is much faster.
+comment_start_re = re.compile(r'[^\S\n]*/[/*]')
+comment_start_line_re = re.compile(r'\n[^\S\n]*/[/*]')
+
+# Line breaks recognized by str.splitlines() other than "\n" and "\r\n".
+special_line_breaks = u'\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
 
 def is_single_line_comment(line):
     return single_line_re.match(line) is not None
@@ -33,6 +43,9 @@ def parse_single_line(line):
 
 
 def parse_multi_line(line):
+    if '/' not in line:
+        # Nothing to strip except trailing whitespace
+        return line.rstrip()
     cleaned = multi_line_start_strip_re.sub('', line)
     return multi_line_end_strip_re.sub('', cleaned).rstrip()
 
@@ -42,17 +55,186 @@ def normalize(lines):
     indents = []
 
     for line in lines:
-        line = multi_line_middle_strip_re.sub('', line)
+        # Same as multi_line_middle_strip_re.sub('', line) and
+        # len(preceding_white_space_re.match(line).group()), but without regexes
+        stripped = line.lstrip()
+        if stripped.startswith('*'):
+            line = stripped.lstrip('*')
+            stripped = line.lstrip()
         cleaned.append(line)
-        match = preceding_white_space_re.match(line)
         if line:
-            indents.append(len(match.group()))
+            indents.append(len(line) - len(stripped))
 
     indent = min(indents) if indents else 0
 
     return '\n'.join([l[indent:] for l in cleaned]).strip()
 
 
+def iter_comment_blocks_by_line(lines):
+    """
+    Find comment blocks in an iterable of lines.
+
+    This is the reference implementation for :func:`.iter_comment_blocks`.
+    It checks every line, so prefer :func:`.iter_comment_blocks`.
+
+    Args:
+        lines: Iterable of lines (with or without line endings).
+
+    Returns:
+        iterator: Comment blocks normalized with :func:`.normalize`.
+    """
+    current_block = []
+    inside_single_line_block = False
+    inside_multi_line_block = False
+
+    for line in lines:
+        # Parse single-line style
+        if is_single_line_comment(line) and not inside_multi_line_block:
+            parsed = parse_single_line(line)
+
+            if inside_single_line_block:
+                current_block.append(parsed)
+            else:
+                current_block = [parsed]
+                inside_single_line_block = True
+
+        # Prase multi-line style
+        if is_multi_line_comment_start(line) or inside_multi_line_block:
+            parsed = parse_multi_line(line)
+
+            if inside_multi_line_block:
+                current_block.append(parsed)
+            else:
+                current_block = [parsed]
+                inside_multi_line_block = True
+
+        # End a multi-line block if detected
+        if is_multi_line_comment_end(line):
+            inside_multi_line_block = False
+
+        # Store the current block if we're done
+        if is_single_line_comment(line) is False and inside_multi_line_block is False:
+            if current_block:
+                yield normalize(current_block)
+
+            inside_single_line_block = False
+            current_block = []
+
+
+def _find_line_end(text, position):
+    line_end = text.find('\n', position)
+    if line_end == -1:
+        return len(text)
+    return line_end
+
+
+def _find_multi_line_comment_end(text, position):
+    """
+    Find the end of the line ending the multi-line comment that
+    continues at ``position``. Returns ``-1`` if the comment does not end.
+    """
+    while True:
+        end = text.find('*/', position)
+        if end == -1:
+            return -1
+        line_start = text.rfind('\n', 0, end) + 1
+        line_end = _find_line_end(text, end)
+        if not is_single_line_comment(text[line_start:line_end]):
+            return line_end
+        position = line_end + 1
+
+
+def _find_comment_start(text, position):
+    """
+    Find the first line starting at or after ``position`` (which must be
+    the start of a line) that starts a comment.
+
+    Returns:
+        tuple: ``(line_start, is_single_line)``. ``line_start`` is ``-1``
+        if there are no more comments.
+    """
+    if position == 0:
+        match = comment_start_re.match(text)
+        if match is not None:
+            return 0, match.group().endswith('//')
+    # position - 1 is the newline ending the previous line
+    match = comment_start_line_re.search(text, max(position - 1, 0))
+    if match is None:
+        return -1, False
+    return match.start() + 1, match.group().endswith('//')
+
+
+def _iter_comment_blocks_in_buffer(text):
+    # Same rules as iter_comment_blocks_by_line(), but we jump directly between
+    # lines starting a comment and lines ending multi-line comments. Lines
+    # between comments only matter in that they end a single-line comment block.
+    current_block = []
+    inside_single_line_block = False
+    position = 0
+    length = len(text)
+    while position < length:
+        line_start, is_single_line = _find_comment_start(text, position)
+        if line_start == -1:
+            if current_block:
+                yield normalize(current_block)
+            return
+        if line_start > position:
+            if current_block:
+                yield normalize(current_block)
+            current_block = []
+            inside_single_line_block = False
+        line_end = _find_line_end(text, line_start)
+        line = text[line_start:line_end]
+        position = line_end + 1
+
+        if is_single_line:
+            parsed = parse_single_line(line)
+            if inside_single_line_block:
+                current_block.append(parsed)
+            else:
+                current_block = [parsed]
+                inside_single_line_block = True
+            continue
+
+        current_block = [parse_multi_line(line)]
+        if '*/' not in line:
+            comment_end = _find_multi_line_comment_end(text, position)
+            if comment_end == -1:
+                return
+            for comment_line in text[position:comment_end].split('\n'):
+                current_block.append(parse_multi_line(comment_line))
+            position = comment_end + 1
+        yield normalize(current_block)
+        current_block = []
+        inside_single_line_block = False
+
+
+def _has_special_line_breaks(text):
+    for character in special_line_breaks:
+        if character in text:
+            return True
+    return text.count('\r') != text.count('\r\n')
+
+
+def iter_comment_blocks(text):
+    """
+    Find comment blocks in a string.
+
+    Gives exactly the same result as :func:`.iter_comment_blocks_by_line`
+    for ``text.splitlines()``, but only looks at the lines
+    that start or end comments.
+
+    Args:
+        text: The contents of a style file.
+
+    Returns:
+        iterator: Comment blocks normalized with :func:`.normalize`.
+    """
+    if _has_special_line_breaks(text):
+        return iter_comment_blocks_by_line(text.splitlines(True))
+    return _iter_comment_blocks_in_buffer(text)
+
+
 class CommentParser(object):
     """
     The comment parser.
@@ -68,22 +250,39 @@ class CommentParser(object):
             filename: The path to a style file.
             variablemap (dict): Maps variable substitution strings to values.
                 We replace all occurrences of each key with the value in all parsed
-                comments.
+                comments using a :class:`pythonkss.variables.VariableSubstituter`.
         """
         self.filename = filename
         self.variablemap = variablemap
 
     def _apply_variables_to_commentblock(self, commentblock):
-        for key, value in self.variablemap.items():
-            commentblock = commentblock.replace(key, value)
-        return commentblock
+        return get_variable_substituter(self.variablemap).substitute(commentblock)
 
-    def _apply_variables_to_commentblocks(self, commentblocks):
-        commentblocks_with_variables_applied = []
-        for commentblock in commentblocks:
-            commentblocks_with_variables_applied.append(
-                self._apply_variables_to_commentblock(commentblock=commentblock))
-        return commentblocks_with_variables_applied
+    def iter_blocks(self):
+        """
+        Iterate over the comment blocks in the file.
+
+        Unlike :meth:`.blocks`, this does not build a list of all the blocks.
+
+        Returns:
+            iterator: Comment blocks with variables applied.
+        """
+        for rawcommentblock, commentblock in self.iter_raw_and_blocks():
+            yield commentblock
+
+    def iter_raw_and_blocks(self):
+        """
+        Same as :meth:`.iter_blocks`, but yields ``(rawcommentblock, commentblock)``
+        tuples where ``rawcommentblock`` is the comment block before variables
+        are applied.
+        """
+        with codecs.open(self.filename, 'r', 'utf-8') as fileobj:
+            text = fileobj.read()
+        for rawcommentblock in iter_comment_blocks(text):
+            commentblock = rawcommentblock
+            if self.variablemap:
+                commentblock = self._apply_variables_to_commentblock(commentblock=commentblock)
+            yield rawcommentblock, commentblock
 
     def parse(self):
         """
@@ -92,49 +291,7 @@ class CommentParser(object):
         Returns:
             list: Comment blocks list.
         """
-        blocks = []
-        current_block = []
-        inside_single_line_block = False
-        inside_multi_line_block = False
-
-        with codecs.open(self.filename, 'r', 'utf-8') as fileobj:
-            for line in fileobj:
-                # Parse single-line style
-                if is_single_line_comment(line) and not inside_multi_line_block:
-                    parsed = parse_single_line(line)
-
-                    if inside_single_line_block:
-                        current_block.append(parsed)
-                    else:
-                        current_block = [parsed]
-                        inside_single_line_block = True
-
-                # Prase multi-line style
-                if is_multi_line_comment_start(line) or inside_multi_line_block:
-                    parsed = parse_multi_line(line)
-
-                    if inside_multi_line_block:
-                        current_block.append(parsed)
-                    else:
-                        current_block = [parsed]
-                        inside_multi_line_block = True
-
-                # End a multi-line block if detected
-                if is_multi_line_comment_end(line):
-                    inside_multi_line_block = False
-
-                # Store the current block if we're done
-                if is_single_line_comment(line) is False and inside_multi_line_block is False:
-                    if current_block:
-                        blocks.append(normalize(current_block))
-
-                    inside_single_line_block = False
-                    current_block = []
-
-        if self.variablemap:
-            blocks = self._apply_variables_to_commentblocks(commentblocks=blocks)
-
-        return blocks
+        return list(self.iter_blocks())
 
     @property
     def blocks(self):
@@ -1,14 +1,114 @@
 from __future__ import unicode_literals
 
+import re
+
 import yaml
 from pythonkss import exceptions
 from pythonkss import markdownformatter
+from pythonkss.interning import intern_string
 from yaml import YAMLError
 
 try:
-    from yaml import CLoader as Loader
+    from yaml import CSafeLoader as SafeLoader
 except ImportError:
-    from yaml import Loader
+    from yaml import SafeLoader
+
+
+#: Matches a ``key: value`` item in an argument string that
+#: :func:`.parse_arguments` can parse without YAML.
+flat_argument_re = re.compile(
+    r'^ *(?P<key>[A-Za-z_][A-Za-z0-9_-]*) *: +'
+    r'(?P<value>[A-Za-z_][A-Za-z0-9_-]*|0|-?[1-9][0-9]*) *$')
+
+#: Plain YAML 1.1 words that are not loaded as strings.
+YAML_SPECIAL_WORDS = {
+    'yes': True, 'Yes': True, 'YES': True, 'no': False, 'No': False, 'NO': False,
+    'true': True, 'True': True, 'TRUE': True, 'false': False, 'False': False, 'FALSE': False,
+    'on': True, 'On': True, 'ON': True, 'off': False, 'Off': False, 'OFF': False,
+    'null': None, 'Null': None, 'NULL': None,
+}
+
+#: Max number of argument strings memoized by :func:`.parse_argumentstring`.
+ARGUMENTSTRING_CACHE_SIZE = 1024
+
+_argumentstring_cache = {}
+
+
+def _parse_flat_arguments(arguments):
+    """
+    Parse the arguments within ``{}`` if they are a flat map of
+    words and integers (E.g.: ``syntax: scss, height: 300``).
+
+    Returns:
+        dict: The arguments, or ``None`` if ``arguments`` is not
+        that simple, and must be parsed as YAML.
+    """
+    argumentdict = {}
+    if not arguments.strip():
+        return argumentdict
+    for item in arguments.split(','):
+        match = flat_argument_re.match(item)
+        if match is None:
+            return None
+        key = match.group('key')
+        if key in YAML_SPECIAL_WORDS:
+            return None
+        value = match.group('value')
+        if value in YAML_SPECIAL_WORDS:
+            value = YAML_SPECIAL_WORDS[value]
+        elif value[0] == '-' or value[0].isdigit():
+            value = int(value)
+        argumentdict[key] = value
+    return argumentdict
+
+
+def parse_arguments(arguments):
+    """
+    Parse the arguments within ``{}`` in an argument string.
+
+    Flat maps of words and integers are parsed directly, and
+    anything else is parsed as a YAML flow mapping with ``yaml.safe_load``.
+
+    Raises:
+        yaml.YAMLError: If the arguments are not valid YAML.
+    """
+    argumentdict = _parse_flat_arguments(arguments)
+    if argumentdict is None:
+        argumentdict = yaml.load('{{{arguments}}}'.format(arguments=arguments), Loader=SafeLoader)
+    return argumentdict
+
+
+def parse_argumentstring(argumentstring):
+    """
+    Parse an argument string (see :class:`.Example`).
+
+    The results are memoized, so parsing the same argument string again
+    is cheap.
+
+    Returns:
+        tuple: ``(title, argumentdict)``.
+
+    Raises:
+        pythonkss.exceptions.ArgumentStringError: If the arguments are invalid.
+    """
+    cached = _argumentstring_cache.get(argumentstring)
+    if cached is None:
+        argumentdict = {}
+        if argumentstring.startswith('{') and '}' in argumentstring:
+            arguments, title = argumentstring.split('}', 1)
+            title = title.strip()
+            try:
+                argumentdict = parse_arguments(arguments[1:])
+            except YAMLError as e:
+                raise exceptions.ArgumentStringError('Invalid argument string: {!r}. {}'.format(
+                    argumentstring, e))
+        else:
+            title = argumentstring
+        if len(_argumentstring_cache) >= ARGUMENTSTRING_CACHE_SIZE:
+            _argumentstring_cache.clear()
+        cached = _argumentstring_cache[argumentstring] = (title, argumentdict)
+    title, argumentdict = cached
+    return title, dict(argumentdict)
 
 
 class Example(object):
@@ -27,9 +127,16 @@ class Example(object):
     .. attribute:: title
 
         The title for the markup block. Can be ``None``.
+
+    .. attribute:: html_output_mode
+
+        The ``output_mode`` for :meth:`pythonkss.markdownformatter.MarkdownFormatter.to_html`
+        used by :meth:`.html`. Can be ``None``.
     """
+    __slots__ = ('text', 'filename', 'html_output_mode', 'argumentstring', 'argumentdict', 'title',
+                 '_rendered_html')
 
-    def __init__(self, text, filename=None, argumentstring=None):
+    def __init__(self, text, filename=None, argumentstring=None, html_output_mode=None):
         """
 
         Args:
@@ -40,9 +147,11 @@ class Example(object):
                 on formatted as ``key: value``. The only argument supported
                 by this class is ``syntax``, but the subclasses for supported
                 arguments.
+            html_output_mode: See :attr:`.html_output_mode`.
         """
         self.text = text
-        self.filename = filename
+        self.filename = intern_string(filename) if filename else filename
+        self.html_output_mode = html_output_mode
         self.argumentstring = None
         self.argumentdict = {}
         self.title = ''
@@ -53,22 +162,7 @@ class Example(object):
             self.argumentstring = argumentstring
 
     def _parse_argumentstring(self):
-        argumentdict = {}
-        if self.argumentstring.startswith('{') and '}' in self.argumentstring:
-            arguments, title = self.argumentstring.split('}', 1)
-            arguments = arguments[1:]
-            title = title.strip()
-            try:
-                argumentdict = yaml.load(
-                    '{{{arguments}}}'.format(arguments=arguments),
-                    Loader=Loader)
-            except YAMLError as e:
-                raise exceptions.ArgumentStringError('Invalid argument string: {!r}. {}'.format(
-                    self.argumentstring, e))
-        else:
-            title = self.argumentstring
-
-        return title, argumentdict
+        return parse_argumentstring(self.argumentstring)
 
     @property
     def syntax(self):
@@ -84,11 +178,39 @@ class Example(object):
     def html(self):
         """
         Format the text as HTML with syntax hilighting.
+
+        The result is memoized until :attr:`.text`, :attr:`.html_output_mode`
+        or the syntax changes, or :meth:`.clear_rendered_html` is called.
+        """
+        if not self.has_rendered_html():
+            html = markdownformatter.MarkdownFormatter.code_to_html(
+                code=self.text, syntax=self.syntax, output_mode=self.html_output_mode)
+            self.set_rendered_html(html)
+        return self._rendered_html[1]
+
+    def _get_html_cachekey(self):
+        return self.syntax, self.text, self.html_output_mode
+
+    def has_rendered_html(self):
+        """
+        Returns ``True`` if :meth:`.html` is memoized for the current text.
+        """
+        return hasattr(self, '_rendered_html') and self._rendered_html[0] == self._get_html_cachekey()
+
+    def set_rendered_html(self, html):
+        """
+        Memoize ``html`` as the :meth:`.html` for the current text.
+        Used when the HTML is rendered elsewhere (E.g.: by
+        :meth:`pythonkss.parser.Parser.render_all`).
+        """
+        self._rendered_html = (self._get_html_cachekey(), html)
+
+    def clear_rendered_html(self):
+        """
+        Release the HTML memoized by :meth:`.html`.
         """
-        markdowntext = '```{syntax}\n{text}\n```'.format(
-            syntax=self.syntax,
-            text=self.text)
-        return markdownformatter.MarkdownFormatter.to_html(markdowntext=markdowntext)
+        if hasattr(self, '_rendered_html'):
+            del self._rendered_html
 
     @property
     def type(self):
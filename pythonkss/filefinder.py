@@ -0,0 +1,254 @@
+import fnmatch
+import os
+import re
+
+WILDCARD_CHARACTERS = '*?['
+
+
+def get_filestat(filepath):
+    """
+    Get the ``(size, mtime)`` tuple used to detect changes in ``filepath``.
+
+    Raises:
+        OSError: If the file does not exist.
+    """
+    stat = os.stat(filepath)
+    return stat.st_size, getattr(stat, 'st_mtime_ns', stat.st_mtime)
+
+
+class _ListdirEntry(object):
+    """
+    Minimal stand-in for :class:`os.DirEntry` on python versions
+    without :func:`os.scandir`.
+    """
+    def __init__(self, directorypath, name):
+        self.name = name
+        self.path = os.path.join(directorypath, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(directorypath):
+    if hasattr(os, 'scandir'):
+        return os.scandir(directorypath)
+    else:  # pragma: no cover
+        return [_ListdirEntry(directorypath, name) for name in os.listdir(directorypath)]
+
+
+class FilenamePatternMatcher(object):
+    """
+    Matches file paths against a list of :func:`fnmatch.fnmatchcase` patterns.
+
+    All the patterns are compiled into a single regex, and the literal
+    prefix (the part before the first wildcard) of each pattern is
+    used to decide if a directory can contain any matching files.
+    """
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns: Iterable of :func:`fnmatch.fnmatchcase` patterns.
+        """
+        self.patterns = list(patterns)
+        if self.patterns:
+            self._regex = re.compile('|'.join(
+                '(?:{})'.format(fnmatch.translate(pattern))
+                for pattern in self.patterns))
+        else:
+            self._regex = None
+        self._literal_prefixes = [self._get_literal_prefix(pattern)
+                                  for pattern in self.patterns]
+
+    def _get_literal_prefix(self, pattern):
+        for index, character in enumerate(pattern):
+            if character in WILDCARD_CHARACTERS:
+                return pattern[:index], True
+        return pattern, False
+
+    def matches(self, filepath):
+        """
+        Returns ``True`` if ``filepath`` matches any of the patterns.
+        """
+        if self._regex is None:
+            return False
+        return self._regex.match(filepath) is not None
+
+    def can_match_below(self, directorypath):
+        """
+        Returns ``False`` if we are certain that no file path
+        below ``directorypath`` can match any of the patterns.
+        """
+        directoryprefix = os.path.join(directorypath, '')
+        for literal_prefix, has_wildcard in self._literal_prefixes:
+            if literal_prefix.startswith(directoryprefix):
+                return True
+            if has_wildcard and directoryprefix.startswith(literal_prefix):
+                return True
+        return False
+
+
+class FileFinder(object):
+    """
+    Finds style files in one or more directories.
+
+    Used by :meth:`pythonkss.parser.Parser.find_files`.
+
+    Walks the directories with :func:`os.scandir`, skips directories
+    where no file can match the ``filename_patterns``, and never yields
+    the same file twice, even if it is reachable through overlapping
+    ``paths`` or symlinks. Files are yielded in sorted order within each
+    directory, with the files of a directory before the files in its
+    subdirectories.
+
+    .. note:: Since the order of the files decides which file "wins" for
+        :class:`pythonkss.exceptions.DuplicateReferenceError` and the order
+        of replace and extend sections, the sorted order makes the result
+        independent of the directory listing order of the filesystem.
+    """
+    def __init__(self, paths, extensions, filename_patterns=None, exclude_directory_patterns=None,
+                 include_file=None):
+        """
+        Args:
+            paths: Directories to search for style files.
+            extensions: Iterable of file extensions to include (E.g.: ``.scss``).
+            filename_patterns: See ``filename_patterns`` for :class:`pythonkss.parser.Parser`.
+            exclude_directory_patterns: See ``exclude_directory_patterns`` for
+                :class:`pythonkss.parser.Parser`.
+            include_file: Optional callable that takes a file path and returns
+                ``True`` if the file should be included. Used instead of matching
+                the path against ``filename_patterns`` (the patterns are still
+                used to skip directories).
+        """
+        self.paths = paths
+        self.include_file = include_file
+        self.extensions = frozenset(extensions)
+        if filename_patterns is None:
+            self.filename_pattern_matcher = None
+        else:
+            self.filename_pattern_matcher = FilenamePatternMatcher(filename_patterns)
+        if exclude_directory_patterns:
+            self.exclude_directory_matcher = FilenamePatternMatcher(exclude_directory_patterns)
+        else:
+            self.exclude_directory_matcher = None
+
+    def _get_identity(self, path, entry=None):
+        try:
+            if entry is None:
+                stat = os.stat(path)
+            else:
+                stat = entry.stat()
+        except OSError:
+            return None
+        if stat.st_ino:
+            return stat.st_dev, stat.st_ino
+        else:
+            # Some platforms (I.E.: Windows with some python versions)
+            # do not provide inode numbers.
+            return os.path.realpath(path)
+
+    def _should_descend_into(self, entry):
+        if entry.is_symlink():
+            # Same as the os.walk() default (followlinks=False).
+            return False
+        if self.exclude_directory_matcher is not None \
+                and self.exclude_directory_matcher.matches(entry.name):
+            return False
+        if self.filename_pattern_matcher is not None \
+                and not self.filename_pattern_matcher.can_match_below(entry.path):
+            return False
+        return True
+
+    def _should_include_file(self, entry):
+        if os.path.splitext(entry.name)[1] not in self.extensions:
+            return False
+        if self.include_file is not None:
+            return self.include_file(entry.path)
+        if self.filename_pattern_matcher is None:
+            return True
+        return self.filename_pattern_matcher.matches(entry.path)
+
+    def _scan_directory(self, directorypath):
+        try:
+            entries = sorted(_scandir(directorypath), key=lambda entry: entry.name)
+        except OSError:
+            return [], []
+        files = []
+        directories = []
+        for entry in entries:
+            try:
+                is_directory = entry.is_dir()
+            except OSError:
+                is_directory = False
+            if is_directory:
+                if self._should_descend_into(entry):
+                    directories.append(entry)
+            elif self._should_include_file(entry):
+                files.append(entry)
+        return files, directories
+
+    def might_contain_files(self, directorypath):
+        """
+        Returns ``False`` if :meth:`.iter_files` would not descend into ``directorypath``
+        (a subdirectory of one of the ``paths``). Only looks at the path, so
+        this also works for directories that have been removed.
+        """
+        return self._should_descend_into(_ListdirEntry(*os.path.split(directorypath)))
+
+    def includes_file(self, filepath):
+        """
+        Returns ``True`` if :meth:`.iter_files` would include ``filepath`` when
+        it finds it. Only looks at the path, so this also works for files that
+        have been removed.
+        """
+        return self._should_include_file(_ListdirEntry(*os.path.split(filepath)))
+
+    def _walk(self, paths):
+        seen_directories = set()
+        for path in paths:
+            stack = [(path, None)]
+            while stack:
+                directorypath, entry = stack.pop()
+                directory_identity = self._get_identity(directorypath, entry=entry)
+                if directory_identity is None or directory_identity in seen_directories:
+                    continue
+                seen_directories.add(directory_identity)
+                files, directories = self._scan_directory(directorypath)
+                yield directorypath, files
+                for directoryentry in reversed(directories):
+                    stack.append((directoryentry.path, directoryentry))
+
+    def iter_directories(self, paths=None):
+        """
+        Iterate over all the directories searched by :meth:`.iter_files`.
+
+        Args:
+            paths: Search these directories instead of the ``paths`` for the finder.
+                Used to find the directories below a new directory.
+
+        Returns:
+            iterator: An iterable yielding directory paths.
+        """
+        for directorypath, files in self._walk(paths=self.paths if paths is None else paths):
+            yield directorypath
+
+    def iter_files(self):
+        """
+        Iterate over all the matching files.
+
+        Returns:
+            iterator: An iterable yielding file paths.
+        """
+        seen_files = set()
+        for directorypath, files in self._walk(paths=self.paths):
+            for fileentry in files:
+                file_identity = self._get_identity(fileentry.path, entry=fileentry)
+                if file_identity is None or file_identity in seen_files:
+                    continue
+                seen_files.add(file_identity)
+                yield fileentry.path
@@ -0,0 +1,17 @@
+"""
+Interning for strings that are repeated in many sections and examples
+(reference segments and file paths), so each of them is only stored once.
+"""
+import sys
+
+
+if sys.version_info.major == 2:  # pragma: no cover
+    _interned_strings = {}
+
+    def intern_string(string):
+        """
+        Get the interned version of ``string`` (also works for unicode strings on Python 2).
+        """
+        return _interned_strings.setdefault(string, string)
+else:
+    intern_string = sys.intern
@@ -1,5 +1,87 @@
+import re
+import threading
+
 import markdown
+import pygments
+import pygments.formatters
+import pygments.lexers
+import pygments.util
 from bs4 import BeautifulSoup
+from markdown.extensions import Extension
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension
+from markdown.treeprocessors import Treeprocessor
+
+_thread_local = threading.local()
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+#: A ``syntax`` that :class:`markdown.extensions.fenced_code` parses as the language
+#: without any attributes.
+FENCED_CODE_SYNTAX_RE = re.compile(r'^[\w#+-][\w#.+-]*$')
+
+#: Characters that Markdown changes or handles specially before the fenced code is extracted.
+FENCED_CODE_UNSAFE_CHARACTERS = ('```', '\t', '\r', '\x02', '\x03')
+
+_library_versions = None
+
+
+def _get_function(cls, methodname):
+    method = getattr(cls, methodname)
+    return getattr(method, '__func__', method)
+
+
+def _get_library_versions():
+    global _library_versions
+    if _library_versions is None:
+        import bs4
+        import html5lib
+        import pythonkss
+        _library_versions = [
+            pythonkss.__version__,
+            markdown.__version__,
+            pygments.__version__,
+            bs4.__version__,
+            html5lib.__version__,
+        ]
+    return _library_versions
+
+
+#: Prefix for the HTML comments that :meth:`.MarkdownFormatter.to_html_many` puts
+#: between the HTML for each text.
+BATCH_SEPARATOR_PREFIX = 'pythonkss-batch-separator-'
+
+batch_separator_re = re.compile(r'\s*<!-- ' + BATCH_SEPARATOR_PREFIX + r'(\d+) -->\s*')
+
+#: Maps the header tags shifted by :class:`.HeaderShiftTreeprocessor` to their new tag.
+SHIFTED_HEADER_TAGS = {
+    'h1': 'h3',
+    'h2': 'h4',
+    'h3': 'h5',
+}
+
+
+class HeaderShiftTreeprocessor(Treeprocessor):
+    """
+    Converts ``<h1>``, ``<h2>`` and ``<h3>`` to ``<h3>``, ``<h4>`` and ``<h5>``
+    in the element tree.
+    """
+    def run(self, root):
+        for element in root.iter():
+            tag = SHIFTED_HEADER_TAGS.get(element.tag)
+            if tag is not None:
+                element.tag = tag
+
+
+class HeaderShiftExtension(Extension):
+    """
+    Markdown extension that registers :class:`.HeaderShiftTreeprocessor`.
+    """
+    def extendMarkdown(self, md):
+        # After the inline processor, so the headers have their final content.
+        md.treeprocessors.register(HeaderShiftTreeprocessor(md), 'pythonkss_header_shift', 5)
 
 
 class MarkdownFormatter(object):
@@ -24,38 +106,335 @@ class MarkdownFormatter(object):
         'fenced_code',
     ]
 
+    #: Convert headers with BeautifulSoup in :meth:`.postprocess_html` instead of
+    #: with :class:`.HeaderShiftExtension`. The only difference in the output is that
+    #: the BeautifulSoup approach also converts headers written as raw HTML in
+    #: the markdown, but it requires an extra parse of the HTML, so only set this
+    #: to ``True`` if you depend on that.
+    beautifulsoup_header_shift = False
+
+    #: Output mode where the HTML is prettified (re-indented) with BeautifulSoup. The default.
+    OUTPUT_MODE_PRETTY = 'pretty'
+
+    #: Output mode where the HTML is returned as serialized by Markdown,
+    #: without prettifying it. Smaller, faster, and does not add
+    #: whitespace inside ``<pre>`` blocks.
+    OUTPUT_MODE_COMPACT = 'compact'
+
+    OUTPUT_MODES = {OUTPUT_MODE_PRETTY, OUTPUT_MODE_COMPACT}
+
+    #: A :class:`pythonkss.rendercache.RenderCache` used by :meth:`.to_html`
+    #: and :meth:`.code_to_html`. Defaults to ``None`` (no cache).
+    render_cache = None
+
+    #: :meth:`.code_to_html` only highlights code directly with Pygments if all the
+    #: :attr:`.markdown_extensions` are in this set, since other extensions may
+    #: change how the fenced code block is handled.
+    code_fast_path_extensions = frozenset([
+        'sane_lists', 'def_list', 'tables', 'smarty', 'codehilite', 'fenced_code',
+    ])
+
     @classmethod
-    def to_html(cls, markdowntext):
+    def to_html(cls, markdowntext, output_mode=None):
         """
         Convert the provided ``markdowntext`` to HTML.
 
         Args:
             markdowntext (str): Markdown formatted text.
+            output_mode: One of the ``OUTPUT_MODE_*`` constants.
+                Defaults to :attr:`.OUTPUT_MODE_PRETTY`.
 
         Returns:
             str: The resulting HTML.
         """
-        return cls(markdowntext=markdowntext).resulthtml
+        return cls._render(markdowntext=markdowntext, output_mode=output_mode)
 
-    def __init__(self, markdowntext):
-        markdowntext = self.preprocess_markdowntext(markdowntext=markdowntext)
-        html = self.process_html(markdowntext=markdowntext)
+    @classmethod
+    def code_to_html(cls, code, syntax, output_mode=None):
+        """
+        Convert the provided ``code`` to HTML with syntax hilighting.
+
+        Gives the same result as using :meth:`.to_html` on ``code``
+        in a fenced code block with ``syntax`` as the language, but
+        the code is highlighted with Pygments directly instead of
+        converting it with Markdown when that is known to give
+        the same result.
+
+        Args:
+            code (str): The code.
+            syntax (str): The Pygments lexer name.
+            output_mode: See :meth:`.to_html`.
+
+        Returns:
+            str: The resulting HTML.
+        """
+        return cls._render(markdowntext=cls.make_code_markdowntext(code=code, syntax=syntax),
+                           output_mode=output_mode, code=code, syntax=syntax)
+
+    @classmethod
+    def get_render_cache_keyparts(cls, markdowntext, output_mode=None):
+        """
+        Get everything that affects the HTML for ``markdowntext`` as a list
+        of JSON serializable values. Used to make keys for :attr:`.render_cache`.
+
+        Override this if you override other methods in ways that change the output
+        depending on something that is not in this list.
+        """
+        extensions = []
+        for extension in cls.markdown_extensions:
+            if isinstance(extension, string_types):
+                extensions.append(extension)
+            else:
+                extensions.append([extension.__class__.__module__, extension.__class__.__name__,
+                                   sorted((key, repr(value)) for key, value in extension.getConfigs().items())])
+        return [
+            _get_library_versions(),
+            cls.__module__, cls.__name__,
+            extensions,
+            cls.beautifulsoup_header_shift,
+            output_mode or cls.OUTPUT_MODE_PRETTY,
+            markdowntext,
+        ]
+
+    @classmethod
+    def to_html_many(cls, markdowntexts, output_mode=None):
+        """
+        Convert many markdown texts to HTML.
+
+        Gives the same result as using :meth:`.to_html` on each text. Each text
+        is converted with Markdown on its own, so texts can not affect each other,
+        but the HTML for texts without raw HTML is joined with HTML comments as
+        separators, postprocessed in a single pass, and split again. This avoids
+        the per-call overhead of the BeautifulSoup postprocessing, which dominates
+        for short texts.
+
+        Args:
+            markdowntexts: Iterable of markdown texts.
+            output_mode: See :meth:`.to_html`.
+
+        Returns:
+            list: The HTML for each text.
+        """
+        markdowntexts = list(markdowntexts)
+        results = [None] * len(markdowntexts)
+        render_cache = cls.render_cache
+        keys = [None] * len(markdowntexts)
+        batch_indexes = []
+        # Without BeautifulSoup, the per-call overhead is too small for batching to help.
+        use_batch = output_mode != cls.OUTPUT_MODE_COMPACT or cls.beautifulsoup_header_shift
+        for index, markdowntext in enumerate(markdowntexts):
+            if render_cache is not None:
+                keys[index] = render_cache.make_key(cls.get_render_cache_keyparts(
+                    markdowntext=markdowntext, output_mode=output_mode))
+                results[index] = render_cache.get(keys[index])
+                if results[index] is not None:
+                    continue
+            if use_batch and cls._can_batch(markdowntext):
+                batch_indexes.append(index)
+        if len(batch_indexes) > 1:
+            htmllist = cls._to_html_batch(
+                [markdowntexts[index] for index in batch_indexes], output_mode=output_mode)
+            if htmllist is not None:
+                for index, html in zip(batch_indexes, htmllist):
+                    results[index] = html
+                    if render_cache is not None:
+                        render_cache.set(keys[index], html)
+        for index, markdowntext in enumerate(markdowntexts):
+            if results[index] is None:
+                results[index] = cls(markdowntext=markdowntext, output_mode=output_mode).resulthtml
+                if render_cache is not None:
+                    render_cache.set(keys[index], results[index])
+        return results
+
+    @classmethod
+    def _can_batch(cls, markdowntext):
+        for methodname in ('__init__', 'preprocess_markdowntext', 'process_html', 'postprocess_html'):
+            if _get_function(cls, methodname) is not _get_function(MarkdownFormatter, methodname):
+                return False
+        # Raw HTML is passed through to the HTML unchanged, and html5lib keeps unclosed
+        # elements open across the separators, and moves some elements to <head>.
+        return '<' not in markdowntext and BATCH_SEPARATOR_PREFIX not in markdowntext
+
+    @classmethod
+    def _to_html_batch(cls, markdowntexts, output_mode=None):
+        """
+        Convert each of ``markdowntexts`` with Markdown, and postprocess the HTML in a
+        single pass. Returns ``None`` if the result can not be split back into one
+        HTML string for each text.
+        """
+        formatter = cls.__new__(cls)
+        formatter.output_mode = cls._clean_output_mode(output_mode)
+        parts = []
+        for index, markdowntext in enumerate(markdowntexts):
+            if index > 0:
+                parts.append('<!-- {}{} -->'.format(BATCH_SEPARATOR_PREFIX, index - 1))
+            parts.append(formatter.process_html(markdowntext=markdowntext))
+        html = formatter.postprocess_html(html='\n'.join(parts))
+        splitted = batch_separator_re.split(html)
+        htmllist = splitted[0::2]
+        separator_indexes = splitted[1::2]
+        if separator_indexes != [str(index) for index in range(len(markdowntexts) - 1)]:
+            return None
+        return [html.strip() for html in htmllist]
+
+    @classmethod
+    def _render(cls, markdowntext, output_mode=None, **kwargs):
+        render_cache = cls.render_cache
+        if render_cache is None:
+            return cls(markdowntext=markdowntext, output_mode=output_mode, **kwargs).resulthtml
+        key = render_cache.make_key(cls.get_render_cache_keyparts(
+            markdowntext=markdowntext, output_mode=output_mode))
+        html = render_cache.get(key)
+        if html is None:
+            html = cls(markdowntext=markdowntext, output_mode=output_mode, **kwargs).resulthtml
+            render_cache.set(key, html)
+        return html
+
+    @classmethod
+    def make_code_markdowntext(cls, code, syntax):
+        """
+        Make a fenced code block with ``code`` and ``syntax`` as the language.
+        """
+        return '```{syntax}\n{code}\n```'.format(syntax=syntax, code=code)
+
+    @classmethod
+    def _clean_output_mode(cls, output_mode):
+        if output_mode is None:
+            return cls.OUTPUT_MODE_PRETTY
+        if output_mode not in cls.OUTPUT_MODES:
+            raise ValueError('Invalid output_mode: {!r}. Must be one of: {}'.format(
+                output_mode, ', '.join(sorted(cls.OUTPUT_MODES))))
+        return output_mode
+
+    def __init__(self, markdowntext, output_mode=None, code=None, syntax=None):
+        self.output_mode = self._clean_output_mode(output_mode)
+        preprocessed_markdowntext = self.preprocess_markdowntext(markdowntext=markdowntext)
+        html = None
+        if code is not None and preprocessed_markdowntext == markdowntext:
+            html = self.highlight_code(code=code, syntax=syntax)
+        if html is None:
+            html = self.process_html(markdowntext=preprocessed_markdowntext)
         self.resulthtml = self.postprocess_html(html=html)
 
     def preprocess_markdowntext(self, markdowntext):
         return markdowntext
 
-    def process_html(self, markdowntext):
-        md = markdown.Markdown(
+    def make_markdown(self):
+        """
+        Create a :class:`markdown.Markdown` object.
+
+        Override this if you need to configure the :class:`markdown.Markdown`
+        object in other ways than overriding :attr:`.markdown_extensions`.
+        """
+        return markdown.Markdown(
             output_format='html5',
-            extensions=self.markdown_extensions)
+            extensions=self.get_markdown_extensions())
+
+    def get_markdown_extensions(self):
+        """
+        Get the extensions for :meth:`.make_markdown`.
+
+        Defaults to :attr:`.markdown_extensions` and :class:`.HeaderShiftExtension`.
+        """
+        extensions = list(self.markdown_extensions)
+        if not self.beautifulsoup_header_shift:
+            extensions.append(HeaderShiftExtension())
+        return extensions
+
+    def get_markdown(self):
+        """
+        Get a :class:`markdown.Markdown` object for the current thread.
+
+        Loading the extensions is more expensive than converting a
+        short text, so we create one object per thread for each
+        formatter class and list of extensions using :meth:`.make_markdown`,
+        and reuse it for all conversions in that thread.
+        """
+        instances = getattr(_thread_local, 'markdown_instances', None)
+        if instances is None:
+            instances = _thread_local.markdown_instances = {}
+        key = (self.__class__, tuple(self.markdown_extensions), self.beautifulsoup_header_shift)
+        md = instances.get(key)
+        if md is None:
+            md = instances[key] = self.make_markdown()
+        return md
+
+    def process_html(self, markdowntext):
+        md = self.get_markdown()
+        md.reset()
         return md.convert(markdowntext)
 
-    def _make_h1_h3(self, html):
-        soup = BeautifulSoup(html, 'html5lib')
-        for headerlevel in (3, 2, 1):
-            for element in soup.find_all('h{}'.format(headerlevel)):
-                element.name = 'h{}'.format(headerlevel + 2)
+    def _can_highlight_code(self, code, syntax):
+        for extension in self.markdown_extensions:
+            if not isinstance(extension, string_types) or extension not in self.code_fast_path_extensions:
+                return False
+        if 'codehilite' not in self.markdown_extensions or 'fenced_code' not in self.markdown_extensions:
+            return False
+        if not isinstance(syntax, string_types) or not FENCED_CODE_SYNTAX_RE.match(syntax):
+            return False
+        for characters in FENCED_CODE_UNSAFE_CHARACTERS:
+            if characters in code:
+                return False
+        return True
+
+    def _make_code_highlighter(self, syntax):
+        """
+        Make a ``(lexer, formatter)`` tuple configured just like
+        :class:`markdown.extensions.codehilite.CodeHilite` configures them for a
+        fenced code block, or ``None`` if that is not possible.
+        """
+        codehilite_config = None
+        for extension in self.get_markdown().registeredExtensions:
+            if isinstance(extension, CodeHiliteExtension):
+                codehilite_config = extension.getConfigs()
+        if codehilite_config is None or not codehilite_config.get('use_pygments', True):
+            return None
+        style = codehilite_config.pop('pygments_style', 'default')
+        codehilite = CodeHilite('', lang=syntax, style=style, **codehilite_config)
+        options = getattr(codehilite, 'options', None)
+        formattername = getattr(codehilite, 'pygments_formatter', None)
+        if options is None or not isinstance(formattername, string_types):
+            return None
+        try:
+            lexer = pygments.lexers.get_lexer_by_name(syntax, **options)
+            formatter = pygments.formatters.get_formatter_by_name(formattername, **options)
+        except pygments.util.ClassNotFound:
+            # CodeHilite guesses the lexer from the code in this case.
+            return None
+        return lexer, formatter
+
+    def _get_code_highlighter(self, syntax):
+        highlighters = getattr(_thread_local, 'code_highlighters', None)
+        if highlighters is None:
+            highlighters = _thread_local.code_highlighters = {}
+        key = (self.__class__, tuple(self.markdown_extensions), syntax)
+        if key not in highlighters:
+            highlighters[key] = self._make_code_highlighter(syntax=syntax)
+        return highlighters[key]
+
+    def highlight_code(self, code, syntax):
+        """
+        Highlight ``code`` with Pygments directly, with the same result as
+        :meth:`.process_html` would give for the text from :meth:`.make_code_markdowntext`.
+
+        The Pygments lexer and formatter are cached per thread for each ``syntax``.
+
+        Returns:
+            str: The HTML, or ``None`` if we can not be sure that the result would
+            be the same as with :meth:`.process_html`.
+        """
+        if not self._can_highlight_code(code=code, syntax=syntax):
+            return None
+        highlighter = self._get_code_highlighter(syntax=syntax)
+        if highlighter is None:
+            return None
+        lexer, formatter = highlighter
+        # Markdown empties lines with only spaces before it extracts the code.
+        lines = [line if line.strip(' ') else '' for line in code.split('\n')]
+        code = '\n'.join(lines).strip('\n')
+        return pygments.highlight(code, lexer, formatter).strip()
+
+    def _soup_to_html(self, soup):
         try:
             html = unicode(soup.prettify(encoding='utf-8'), encoding='utf-8')
         except NameError:
@@ -63,8 +442,24 @@ class MarkdownFormatter(object):
         html = html.split('<body>')[1].split('</body>')[0]
         return html.strip()
 
+    def _make_h1_h3(self, soup):
+        for headerlevel in (3, 2, 1):
+            for element in soup.find_all('h{}'.format(headerlevel)):
+                element.name = 'h{}'.format(headerlevel + 2)
+
     def postprocess_html(self, html):
         """
-        Postprocess the HTML. Converts <h1>, <h2> and <h3> to <h3>, <h4> and <h5>.
+        Postprocess the HTML. Prettifies the HTML unless :attr:`.output_mode` is
+        :attr:`.OUTPUT_MODE_COMPACT`, and converts <h1>, <h2> and <h3>
+        to <h3>, <h4> and <h5> if :attr:`.beautifulsoup_header_shift` is ``True``.
         """
-        return self._make_h1_h3(html)
+        if self.output_mode == self.OUTPUT_MODE_COMPACT:
+            if not self.beautifulsoup_header_shift:
+                return html.strip()
+            soup = BeautifulSoup(html, 'html5lib')
+            self._make_h1_h3(soup)
+            return soup.body.decode_contents().strip()
+        soup = BeautifulSoup(html, 'html5lib')
+        if self.beautifulsoup_header_shift:
+            self._make_h1_h3(soup)
+        return self._soup_to_html(soup)
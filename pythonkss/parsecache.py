@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import time
+
+from pythonkss.filefinder import get_filestat
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+#: Changed when the data stored for the parsed sections changes, so
+#: entries written by older versions of the code are not used.
+CACHE_FORMAT = 4
+
+#: Namespaces that have not been used for this many seconds are removed by
+#: :meth:`.ParseCache.prune_namespaces`.
+NAMESPACE_MAX_AGE = 30 * 24 * 60 * 60
+
+#: Name of the file in each namespace directory with the version and format
+#: the namespace was created for. Its mtime is the last time the namespace was used.
+NAMESPACE_INFO_FILENAME = 'namespace.json'
+
+#: Name of the lock file in each namespace directory.
+LOCK_FILENAME = '.lock'
+
+_namespace_re = re.compile(r'^[0-9a-f]{40}$')
+
+
+def _replace_file(source, destination):
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:  # pragma: no cover
+        os.rename(source, destination)
+
+
+class ParseCache(object):
+    """
+    On-disk cache of the sections parsed from style files.
+
+    Used by :class:`pythonkss.parser.Parser` when the ``cache_dir``
+    argument is provided.
+
+    Each file gets an entry keyed by the absolute path of the file. The entry stores
+    the size, mtime and a SHA-1 hash of the file contents along with the parsed
+    :class:`pythonkss.section.Section` objects. An entry is used if the size and mtime
+    is unchanged, or if they have changed but the content hash is the same.
+
+    Entries live in a subdirectory of ``cache_dir`` named after a hash of the
+    pythonkss version and the variable map, so changing any of those
+    gives a new and empty cache.
+
+    Entries are written to a temporary file and moved into place, so readers never
+    see a partially written entry, and writers hold an exclusive lock on the
+    namespace directory (on platforms with :mod:`fcntl`) while writing. This makes
+    it safe for multiple processes to share the same ``cache_dir``.
+
+    When a namespace directory is created, namespaces for other pythonkss versions
+    or cache formats, and namespaces that have not been used for
+    ``max_namespace_age`` seconds, are removed (see :meth:`.prune_namespaces`).
+    """
+    def __init__(self, cache_dir, variablemap=None, max_namespace_age=NAMESPACE_MAX_AGE):
+        """
+        Args:
+            cache_dir: The directory to store the cache in. Created if it does not exist.
+            variablemap (dict): See :class:`pythonkss.comment.CommentParser`.
+            max_namespace_age: See :meth:`.prune_namespaces`.
+        """
+        self.cache_dir = cache_dir
+        self.max_namespace_age = max_namespace_age
+        self.namespace = self._make_namespace(variablemap=variablemap)
+        self.directory = os.path.join(cache_dir, self.namespace)
+        self._touched_namespace = False
+
+    def _get_namespace_info(self):
+        import pythonkss
+        return {
+            'version': pythonkss.__version__,
+            'format': CACHE_FORMAT,
+        }
+
+    def _make_namespace(self, variablemap):
+        info = self._get_namespace_info()
+        info['variablemap'] = sorted((variablemap or {}).items())
+        data = json.dumps(info, sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _read_namespace_info(self, directory):
+        try:
+            with open(os.path.join(directory, NAMESPACE_INFO_FILENAME), 'r') as fileobj:
+                return json.load(fileobj)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _is_stale_namespace(self, directory, now):
+        info = self._read_namespace_info(directory)
+        if info != self._get_namespace_info():
+            return True
+        try:
+            last_used = os.stat(os.path.join(directory, NAMESPACE_INFO_FILENAME)).st_mtime
+        except OSError:
+            return True
+        return now - last_used > self.max_namespace_age
+
+    def prune_namespaces(self):
+        """
+        Remove the namespace directories in ``cache_dir`` that were created
+        for another pythonkss version or cache format, and the namespaces
+        that have not been used for ``max_namespace_age`` seconds.
+        The namespace of this cache is never removed.
+
+        Called automatically when the namespace directory of this cache is created.
+        """
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            if name == self.namespace or not _namespace_re.match(name):
+                continue
+            directory = os.path.join(self.cache_dir, name)
+            if os.path.isdir(directory) and self._is_stale_namespace(directory, now):
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _ensure_directory(self):
+        if self._touched_namespace and os.path.isdir(self.directory):
+            return
+        created = False
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+                created = True
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+        # Rewriting the info file marks the namespace as used (see prune_namespaces()).
+        with open(os.path.join(self.directory, NAMESPACE_INFO_FILENAME), 'w') as fileobj:
+            json.dump(self._get_namespace_info(), fileobj, sort_keys=True)
+        self._touched_namespace = True
+        if created:
+            self.prune_namespaces()
+
+    def _get_entry_path(self, filepath):
+        key = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _get_content_hash(self, filepath):
+        sha1 = hashlib.sha1()
+        with open(filepath, 'rb') as fileobj:
+            for chunk in iter(lambda: fileobj.read(65536), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def stat_file(self, filepath):
+        """
+        Get the ``(size, mtime)`` used to detect changes in ``filepath``.
+
+        Call this before parsing the file, and pass the result to :meth:`.set`.
+        """
+        return get_filestat(filepath)
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as fileobj:
+                return pickle.load(fileobj)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def _write_entry(self, entry_path, entry):
+        self._ensure_directory()
+        with open(os.path.join(self.directory, LOCK_FILENAME), 'a') as lockfile:
+            if fcntl is not None:
+                fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+            try:
+                filedescriptor, temppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                try:
+                    with os.fdopen(filedescriptor, 'wb') as fileobj:
+                        pickle.dump(entry, fileobj, protocol=pickle.HIGHEST_PROTOCOL)
+                    _replace_file(temppath, entry_path)
+                except Exception:
+                    if os.path.exists(temppath):
+                        os.remove(temppath)
+                    raise
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+
+    def get(self, filepath, filestat):
+        """
+        Get the cached sections for ``filepath``.
+
+        Args:
+            filepath: The path to a style file.
+            filestat: The return value of :meth:`.stat_file`.
+
+        Returns:
+            list: A list of :class:`pythonkss.section.Section` objects,
+            or ``None`` if the file is not in the cache, or if it has changed.
+        """
+        entry_path = self._get_entry_path(filepath)
+        entry = self._read_entry(entry_path)
+        if entry is None or entry['filepath'] != filepath:
+            return None
+        self._ensure_directory()
+        if entry['filestat'] == filestat:
+            return entry['sections']
+        contenthash = self._get_content_hash(filepath)
+        if entry['contenthash'] != contenthash:
+            return None
+        entry['filestat'] = filestat
+        self._write_entry(entry_path, entry)
+        return entry['sections']
+
+    def set(self, filepath, filestat, sections):
+        """
+        Store the sections parsed from ``filepath`` in the cache.
+
+        Args:
+            filepath: The path to a style file.
+            filestat: The return value of :meth:`.stat_file` from before the file was parsed.
+            sections: A list of :class:`pythonkss.section.Section` objects.
+        """
+        contenthash = self._get_content_hash(filepath)
+        if self.stat_file(filepath) != filestat:
+            # Changed while we parsed it - the sections may not match contenthash.
+            return
+        self._write_entry(self._get_entry_path(filepath), {
+            'filepath': filepath,
+            'filestat': filestat,
+            'contenthash': contenthash,
+            'sections': sections,
+        })
@@ -1,16 +1,156 @@
-import fnmatch
-import os
+import collections
+import functools
+import mmap
+import multiprocessing
 
 from pythonkss.comment import CommentParser
 from pythonkss.exceptions import SectionDoesNotExist, DuplicateReferenceError, ExtendReferenceDoesNotExistError, \
     ReplaceReferenceDoesNotExistError, NotSectionError
-from pythonkss.section import Section
+from pythonkss.filefinder import FileFinder, FilenamePatternMatcher, get_filestat
+from pythonkss.markdownformatter import MarkdownFormatter
+from pythonkss.parsecache import ParseCache
+from pythonkss.section import Section, SectionMergePlan, STYLEGUIDE_KEYWORD
 from pythonkss.sectiontree import SectionTree
+from pythonkss.variables import get_variable_substituter
+
+
+def parse_commentblock(commentblock, filepath):
+    """
+    Parse a comment block into a :class:`pythonkss.section.Section`.
+
+    Returns:
+        pythonkss.section.Section: The parsed section, or ``None`` if the
+        comment block is not a section.
+    """
+    if STYLEGUIDE_KEYWORD not in commentblock:
+        return None
+    section = Section(commentblock, filepath=filepath)
+    try:
+        section.parse()
+    except NotSectionError:
+        return None
+    return section
+
+
+def file_might_contain_sections(filepath):
+    """
+    Check if the raw bytes of a file contains
+    :obj:`pythonkss.section.STYLEGUIDE_KEYWORD`.
+
+    If this returns ``False``, the file does not contain any sections (unless
+    a variable value adds them). The file is memory-mapped, so this
+    is much faster than reading and decoding it.
+    """
+    keyword = STYLEGUIDE_KEYWORD.encode('ascii')
+    with open(filepath, 'rb') as fileobj:
+        try:
+            mappedfile = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            # Empty files (ValueError) or files that can not be mapped
+            return keyword in fileobj.read()
+        try:
+            return mappedfile.find(keyword) != -1
+        finally:
+            mappedfile.close()
+
+
+def variablemap_might_add_sections(variablemap):
+    """
+    Returns ``True`` if any of the values in ``variablemap`` contains
+    :obj:`pythonkss.section.STYLEGUIDE_KEYWORD`. If this is the case, we can not
+    use :func:`.file_might_contain_sections` to skip files.
+    """
+    if not variablemap:
+        return False
+    for value in variablemap.values():
+        if STYLEGUIDE_KEYWORD in str(value):
+            return True
+    return False
+
+
+def parse_file(filepath, variablemap=None, prefilter=True, parse_bodies=False):
+    """
+    Parse a single style file into a list of sections.
+
+    This only takes picklable arguments and returns picklable
+    :class:`pythonkss.section.Section` objects, so it can be
+    sent to a process pool (see the ``workers`` and ``executor``
+    arguments for :class:`.Parser`).
+
+    Args:
+        filepath: The path to a style file.
+        variablemap (dict): See :class:`pythonkss.comment.CommentParser`.
+        prefilter (bool): Use :func:`.file_might_contain_sections` to skip
+            files without sections. Must be ``False`` if
+            :func:`.variablemap_might_add_sections` is ``True`` for ``variablemap``.
+        parse_bodies (bool): Parse the description and examples of the sections
+            (see :meth:`pythonkss.section.Section.parse_body_if_needed`) instead of
+            leaving them to be parsed on demand. Used when the sections are parsed
+            in a worker process or stored in a :class:`pythonkss.parsecache.ParseCache`.
+
+    The keys of ``variablemap`` used in each section is stored in
+    :attr:`pythonkss.section.Section.used_variables`.
+
+    Returns:
+        list: The sections in the order they occur in the file.
+        Comment blocks that are not sections are not included.
+    """
+    sections = []
+    if prefilter and not file_might_contain_sections(filepath):
+        return sections
+    commentparser = CommentParser(filepath, variablemap=variablemap)
+    substituter = get_variable_substituter(variablemap) if variablemap else None
+    for rawcommentblock, commentblock in commentparser.iter_raw_and_blocks():
+        section = parse_commentblock(commentblock, filepath=filepath)
+        if section is not None:
+            if substituter is not None:
+                used_variables = substituter.find_variables(rawcommentblock)
+                if used_variables:
+                    section.used_variables = frozenset(used_variables)
+            if parse_bodies:
+                section.parse_body_if_needed()
+            sections.append(section)
+    return sections
+
+
+#: A :func:`.render_jobs` job for a ``(markdowntext, output_mode)`` tuple.
+RENDER_JOB_MARKDOWN = 'markdown'
+
+#: A :func:`.render_jobs` job for a ``(code, syntax, output_mode)`` tuple.
+RENDER_JOB_CODE = 'code'
+
+
+def render_jobs(jobs):
+    """
+    Render a list of jobs with :class:`pythonkss.markdownformatter.MarkdownFormatter`.
+    Used by :meth:`.Parser.render_all`.
+
+    Args:
+        jobs: List of ``(jobtype, arguments)`` tuples where ``jobtype`` is
+            :obj:`.RENDER_JOB_MARKDOWN` or :obj:`.RENDER_JOB_CODE`.
+
+    Returns:
+        list: The HTML for each job.
+    """
+    results = []
+    for jobtype, arguments in jobs:
+        if jobtype == RENDER_JOB_MARKDOWN:
+            markdowntext, output_mode = arguments
+            results.append(MarkdownFormatter.to_html(markdowntext=markdowntext, output_mode=output_mode))
+        else:
+            code, syntax, output_mode = arguments
+            results.append(MarkdownFormatter.code_to_html(code=code, syntax=syntax, output_mode=output_mode))
+    return results
+
+
+def _get_render_job_size(job):
+    return len(job[1][0])
 
 
 class MultiCommentBlockParser(object):
     def __init__(self):
         self._finished = False
+        self._default_sections = {}
         self._sections = {}
         self._extend_sections_map = {}
         self._replace_sections_map = {}
@@ -37,17 +177,23 @@ class MultiCommentBlockParser(object):
         )
 
     def _add_section_type_default(self, section):
-        if section.reference in self._sections:
-            first_defined_section = self._sections[section.reference]
+        if section.reference in self._default_sections:
+            first_defined_section = self._default_sections[section.reference]
             raise DuplicateReferenceError(
                 reference=section.reference,
                 first_defined_section=first_defined_section,
                 duplicate_section=section
             )
         else:
-            self._sections[section.reference] = section
+            self._default_sections[section.reference] = section
 
-    def _add_section(self, section):
+    def add_section(self, section):
+        """
+        Add an already parsed section (typically from :func:`.parse_file`).
+
+        Sections must be added in the order they occur in the parsed files
+        to get deterministic duplicate, replace and extend handling.
+        """
         if section.section_type == Section.TYPE_DEFAULT:
             self._add_section_type_default(section)
         elif section.section_type in Section.EXTEND_TYPES:
@@ -55,23 +201,62 @@ class MultiCommentBlockParser(object):
         elif section.section_type == Section.TYPE_REPLACE:
             self._add_section_type_replace(section)
 
+    def copy(self):
+        """
+        Make a copy that can be changed with :meth:`.discard_references`,
+        :meth:`.add_section` and :meth:`.finish` without changing this object.
+        The sections are not copied.
+        """
+        multiblockparser = MultiCommentBlockParser()
+        multiblockparser._finished = self._finished
+        multiblockparser._default_sections = dict(self._default_sections)
+        multiblockparser._sections = dict(self._sections)
+        multiblockparser._extend_sections_map = dict(
+            (reference, list(sections)) for reference, sections in self._extend_sections_map.items())
+        multiblockparser._replace_sections_map = dict(
+            (reference, list(sections)) for reference, sections in self._replace_sections_map.items())
+        multiblockparser._ignored_extend_sections = list(self._ignored_extend_sections)
+        multiblockparser._replaced_sections = list(self._replaced_sections)
+        return multiblockparser
+
     def parse_commentblock(self, commentblock, filepath):
-        section = Section(commentblock, filepath=filepath)
-        try:
-            section.parse()
-        except NotSectionError:
-            pass
-        else:
-            self._add_section(section)
+        section = parse_commentblock(commentblock, filepath=filepath)
+        if section is not None:
+            self.add_section(section)
+
+    def discard_references(self, references):
+        """
+        Forget all sections (default, replace and extend) with
+        any of the provided references.
+
+        Used together with :meth:`.add_section` and ``finish(references=...)``
+        to update some of the references after :meth:`.finish` has been called.
+
+        Args:
+            references: A set of references.
+        """
+        for reference in references:
+            self._default_sections.pop(reference, None)
+            self._sections.pop(reference, None)
+            self._extend_sections_map.pop(reference, None)
+            self._replace_sections_map.pop(reference, None)
+        self._ignored_extend_sections = [section for section in self._ignored_extend_sections
+                                         if section.reference not in references]
+        self._replaced_sections = [section for section in self._replaced_sections
+                                   if section.reference not in references]
+
+    def _get_items_for_references(self, dct, references):
+        if references is None:
+            return list(dct.items())
+        return [(reference, dct[reference]) for reference in references if reference in dct]
 
-    def _replace_sections(self):
-        for reference, sections in self._replace_sections_map.items():
-            if reference in self._sections:
-                self._replaced_sections.append(
-                    self._sections.pop(reference))
+    def _replace_sections(self, references=None):
+        for reference, sections in self._get_items_for_references(self._replace_sections_map, references):
+            if reference in self._default_sections:
+                self._replaced_sections.append(self._default_sections[reference])
                 if reference in self._extend_sections_map:
                     self._ignored_extend_sections.extend(
-                        self._extend_sections_map.pop(reference))
+                        self._extend_sections_map[reference])
                 self._sections[reference] = sections[-1]
             else:
                 raise ReplaceReferenceDoesNotExistError(
@@ -81,10 +266,13 @@ class MultiCommentBlockParser(object):
                         reference=reference,
                         filepath=sections[0].filepath))
 
-    def _merge_sections(self):
-        for reference, source_sections in self._extend_sections_map.items():
+    def _merge_sections(self, references=None):
+        for reference, source_sections in self._get_items_for_references(self._extend_sections_map, references):
+            if reference in self._replace_sections_map:
+                # Ignored - see _replace_sections()
+                continue
             try:
-                target_section = self._sections[reference]
+                target_section = self._default_sections[reference]
             except KeyError:
                 raise ExtendReferenceDoesNotExistError(
                     'Invalid "Styleguide{section_type} {reference}". '
@@ -95,16 +283,46 @@ class MultiCommentBlockParser(object):
                         reference=reference
                     ))
             else:
-                for source_section in source_sections:
-                    source_section.merge_into_section(target_section=target_section)
+                # Merge into a copy to keep the parsed section unchanged
+                # in case we need to merge again (see discard_references()).
+                target_section = target_section.copy()
+                SectionMergePlan(source_sections).merge_into_section(target_section=target_section)
+                self._sections[reference] = target_section
 
-    def finish(self):
+    def get_replaced_and_extended_references(self):
+        """
+        Get the references to the sections that are affected by replace or extend sections.
+
+        Returns:
+            list: List of references.
+        """
+        references = [reference for reference in self._replace_sections_map
+                      if reference in self._default_sections]
+        for reference in self._extend_sections_map:
+            if reference in self._default_sections and reference not in self._replace_sections_map:
+                references.append(reference)
+        return references
+
+    def finish(self, references=None):
         """
         Handle merge and replace, and set ``self.sections`` to
         the resulting dict of sections.
+
+        Args:
+            references: If this is provided, only handle merge and replace for
+                these references. Only useful if you have called
+                :meth:`.discard_references` after the initial ``finish()``.
         """
-        self._replace_sections()
-        self._merge_sections()
+        if references is None:
+            self._sections = dict(self._default_sections)
+        else:
+            for reference in references:
+                if reference in self._default_sections:
+                    self._sections[reference] = self._default_sections[reference]
+                else:
+                    self._sections.pop(reference, None)
+        self._replace_sections(references=references)
+        self._merge_sections(references=references)
         self._finished = True
 
     def __check_finished(self, property_):
@@ -128,6 +346,57 @@ class MultiCommentBlockParser(object):
         return self._replaced_sections
 
 
+class ParserChanges(object):
+    """
+    Changes detected by :meth:`.Parser.refresh` and :meth:`.Parser.update_variables`.
+
+    .. attribute:: added_files
+
+        List of paths to files that are new since the last parse/refresh.
+
+    .. attribute:: changed_files
+
+        List of paths to files that have changed since the last parse/refresh.
+
+    .. attribute:: removed_files
+
+        List of paths to files that have been removed since the last parse/refresh.
+
+    .. attribute:: added_references
+
+        Set of references to sections that did not exist before the refresh.
+
+    .. attribute:: changed_references
+
+        Set of references to sections that was re-parsed or re-merged
+        by the refresh.
+
+    .. attribute:: removed_references
+
+        Set of references to sections that no longer exist.
+    """
+    def __init__(self, added_files=None, changed_files=None, removed_files=None,
+                 added_references=None, changed_references=None, removed_references=None):
+        self.added_files = added_files or []
+        self.changed_files = changed_files or []
+        self.removed_files = removed_files or []
+        self.added_references = added_references or set()
+        self.changed_references = changed_references or set()
+        self.removed_references = removed_references or set()
+
+    def has_file_changes(self):
+        """
+        Returns ``True`` if any files have been added, changed or removed.
+        """
+        return bool(self.added_files or self.changed_files or self.removed_files)
+
+    def has_section_changes(self):
+        """
+        Returns ``True`` if any sections have been added, changed or removed.
+        """
+        return bool(self.added_references or self.changed_references or self.removed_references)
+
+
 class Parser(object):
     """
     Parses one or more directories of style files.
@@ -196,6 +465,17 @@ class Parser(object):
                 filename extensions (see ``extensions`` kwarg). So if a filename
                 does not match the required extensions, putting it in ``filename_patterns``
                 does not help at all.
+
+                Directories where no file can match any of the patterns are
+                not searched. This is only possible to decide for patterns
+                that do not start with a wildcard, so prefer patterns like
+                ``'/path/to/my/styles/mytheme/*'`` over ``'*mytheme/*'``
+                for large directory trees.
+            exclude_directory_patterns: Optional list of :func:`fnmatch.fnmatchcase`
+                patterns for directory names (not paths) that should not be searched.
+                Example::
+
+                    exclude_directory_patterns=['node_modules', '.*']
             variables (dict): Dict that maps variables to values.
                 Variables can be used anywhere in the comments, and they are
                 applied before any other parsing of the comments.
@@ -210,16 +490,61 @@ class Parser(object):
 
                     Styleguide 1.1
                     */
+            workers (int): Parse files in a process pool with this many worker
+                processes. Defaults to ``None``, which means that all files are
+                parsed in the current process. Duplicate, replace and extend
+                handling is always performed in the current process in the
+                same file order as when parsing without workers, so
+                the result is the same.
+            executor: A :class:`concurrent.futures.Executor` to parse files with.
+                Use this instead of ``workers`` if you want to control the
+                lifetime of the pool yourself. Takes precedence over ``workers``.
+            cache_dir: Optional directory for a :class:`pythonkss.parsecache.ParseCache`.
+                If this is provided, the sections parsed from each file is stored
+                in this directory, and files that have not changed since they
+                were cached are not parsed again. Can safely be shared by multiple
+                processes, and between parsers with different ``variables``.
+            html_output_mode: The ``output_mode`` for
+                :meth:`pythonkss.markdownformatter.MarkdownFormatter.to_html` used by
+                :meth:`pythonkss.section.Section.description_html` and
+                :meth:`pythonkss.example.Example.html` for all the parsed sections.
+                Use ``MarkdownFormatter.OUTPUT_MODE_COMPACT`` for compact HTML.
+                Defaults to ``None`` (prettified HTML).
         """
         self.paths = paths
         self.variables = kwargs.pop('variables', None)
         self.filename_patterns = kwargs.pop('filename_patterns', None)
+        self.exclude_directory_patterns = kwargs.pop('exclude_directory_patterns', None)
+        if self.filename_patterns is None:
+            self._filename_pattern_matcher = None
+        else:
+            self._filename_pattern_matcher = FilenamePatternMatcher(self.filename_patterns)
         self.variablepattern = kwargs.pop('variablepattern', '{{% {variable} %}}')
+        self.workers = kwargs.pop('workers', None)
+        self.executor = kwargs.pop('executor', None)
+        self.cache_dir = kwargs.pop('cache_dir', None)
+        self.html_output_mode = kwargs.pop('html_output_mode', None)
         extensions = kwargs.pop('extensions', None)
         if extensions is None:
             extensions = ['.less', '.css', '.sass', '.scss']
         self.extensions = extensions
 
+    def _get_init_kwargs(self):
+        """
+        Get the kwargs for creating a new :class:`.Parser` with the same settings.
+        """
+        return {
+            'variables': self.variables,
+            'filename_patterns': self.filename_patterns,
+            'exclude_directory_patterns': self.exclude_directory_patterns,
+            'variablepattern': self.variablepattern,
+            'workers': self.workers,
+            'executor': self.executor,
+            'cache_dir': self.cache_dir,
+            'html_output_mode': self.html_output_mode,
+            'extensions': self.extensions,
+        }
+
     def _make_variablemap(self):
         variablemap = {}
         if not self.variables:
@@ -230,10 +555,7 @@ class Parser(object):
         return variablemap
 
     def _has_match_in_filename_patterns(self, filepath):
-        for pattern in self.filename_patterns:
-            if fnmatch.fnmatchcase(filepath, pattern):
-                return True
-        return False
+        return self._filename_pattern_matcher.matches(filepath)
 
     def should_include_file(self, filepath):
         if self.filename_patterns is None:
@@ -247,30 +569,451 @@ class Parser(object):
         """
         Find files in `paths` which match valid extensions.
 
+        Uses :class:`pythonkss.filefinder.FileFinder`, so each file is
+        only included once even if it is reachable through multiple
+        ``paths`` or through symlinks. Files are sorted by name within
+        each directory. Each file is checked with :meth:`.should_include_file`.
+
         Returns:
             iterator: An iterable yielding file paths.
         """
-        for path in self.paths:
-            for subpath, dirs, files in os.walk(path):
-                for filename in files:
-                    (name, ext) = os.path.splitext(filename)
-                    if ext in self.extensions:
-                        filepath = os.path.join(subpath, filename)
-                        if self.should_include_file(filepath):
-                            yield filepath
+        return self.make_file_finder().iter_files()
 
-    def parse(self):
+    def make_file_finder(self):
+        """
+        Make the :class:`pythonkss.filefinder.FileFinder` used by :meth:`.find_files`.
+        """
+        return FileFinder(
+            paths=self.paths,
+            extensions=self.extensions,
+            filename_patterns=self.filename_patterns,
+            exclude_directory_patterns=self.exclude_directory_patterns,
+            include_file=self.should_include_file)
+
+    def _get_chunksize(self, filecount, workers):
+        # A few chunks per worker keeps the IPC overhead low while still
+        # balancing the load when some files are much larger than others.
+        return max(1, filecount // (workers * 4))
+
+    def _iter_parsed_files_with_executor(self, executor, filepaths, variablemap, chunksize=1):
+        parse_function = functools.partial(
+            parse_file, variablemap=variablemap,
+            prefilter=not variablemap_might_add_sections(variablemap),
+            parse_bodies=True)
+        results = executor.map(parse_function, filepaths, chunksize=chunksize)
+        for filepath, sections in zip(filepaths, results):
+            yield filepath, sections
+
+    def _iter_parsed_files_cached(self, filepaths, variablemap):
+        parsecache = ParseCache(self.cache_dir, variablemap=variablemap)
+        lookups = []
+        for filepath in filepaths:
+            filestat = parsecache.stat_file(filepath)
+            lookups.append((filepath, filestat, parsecache.get(filepath, filestat)))
+        missing_filepaths = (filepath for filepath, filestat, sections in lookups if sections is None)
+        parsed_files = self._iter_parsed_files_uncached(
+            filepaths=missing_filepaths, variablemap=variablemap, parse_bodies=True)
+        for filepath, filestat, sections in lookups:
+            if sections is None:
+                parsed_filepath, sections = next(parsed_files)
+                parsecache.set(filepath, filestat, sections)
+            yield filepath, sections
+
+    def _iter_parsed_files(self, filepaths, variablemap):
+        """
+        Parse ``filepaths`` (an iterable), and yield ``(filepath, sections)``
+        tuples in the same order as ``filepaths``.
+        """
+        if self.cache_dir is None:
+            parsed_files = self._iter_parsed_files_uncached(filepaths=filepaths, variablemap=variablemap)
+        else:
+            parsed_files = self._iter_parsed_files_cached(filepaths=filepaths, variablemap=variablemap)
+        for filepath, sections in parsed_files:
+            if self.html_output_mode is not None:
+                for section in sections:
+                    section.html_output_mode = self.html_output_mode
+            yield filepath, sections
+
+    def _iter_parsed_files_uncached(self, filepaths, variablemap, parse_bodies=False):
+        if self.executor is not None:
+            filepaths = list(filepaths)
+            for result in self._iter_parsed_files_with_executor(
+                    executor=self.executor, filepaths=filepaths, variablemap=variablemap):
+                yield result
+        elif self.workers and self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            filepaths = list(filepaths)
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for result in self._iter_parsed_files_with_executor(
+                        executor=executor, filepaths=filepaths, variablemap=variablemap,
+                        chunksize=self._get_chunksize(len(filepaths), self.workers)):
+                    yield result
+        else:
+            prefilter = not variablemap_might_add_sections(variablemap)
+            for filepath in filepaths:
+                yield filepath, parse_file(filepath, variablemap=variablemap, prefilter=prefilter,
+                                           parse_bodies=parse_bodies)
+
+    def _iter_and_stat_files(self, filepaths, file_stats):
+        for filepath in filepaths:
+            file_stats[filepath] = get_filestat(filepath)
+            yield filepath
+
+    def _add_to_reference_filepaths(self, filepath, sections):
+        # Tuples instead of sets, since almost all references are only in a single
+        # file, and a 1-tuple uses a fraction of the memory of a set.
+        for section in sections:
+            filepaths = self._reference_filepaths.get(section.reference, ())
+            if filepath not in filepaths:
+                self._reference_filepaths[section.reference] = filepaths + (filepath,)
+
+    def _remove_from_reference_filepaths(self, filepath, sections):
+        for section in sections:
+            filepaths = self._reference_filepaths.get(section.reference)
+            if filepaths is not None:
+                filepaths = tuple(other for other in filepaths if other != filepath)
+                if filepaths:
+                    self._reference_filepaths[section.reference] = filepaths
+                else:
+                    del self._reference_filepaths[section.reference]
+
+    def _parse(self, multiblockparser):
+        """
+        Parse all files into the provided ``multiblockparser``. A generator
+        that yields default sections as soon as they are parsed.
+        """
         variablemap = self._make_variablemap()
-        multiblockparser = MultiCommentBlockParser()
-        for filepath in self.find_files():
-            commentparser = CommentParser(filepath, variablemap=variablemap)
-            for commentblock in commentparser.blocks:
-                multiblockparser.parse_commentblock(
-                    commentblock=commentblock,
-                    filepath=filepath)
+        self._file_stats = {}
+        self._file_sections = collections.OrderedDict()
+        self._reference_filepaths = {}
+        filepaths = self._iter_and_stat_files(filepaths=self.find_files(), file_stats=self._file_stats)
+        for filepath, sections in self._iter_parsed_files(filepaths=filepaths, variablemap=variablemap):
+            self._file_sections[filepath] = sections
+            self._add_to_reference_filepaths(filepath=filepath, sections=sections)
+            for section in sections:
+                multiblockparser.add_section(section)
+                if section.section_type == Section.TYPE_DEFAULT:
+                    yield section
         multiblockparser.finish()
+
+    def parse(self):
+        multiblockparser = MultiCommentBlockParser()
+        for section in self._parse(multiblockparser=multiblockparser):
+            pass
         return multiblockparser
 
+    def iter_sections(self):
+        """
+        Parse all the files, and yield sections as soon as they are parsed.
+
+        Each default section (not ``StyleguideReplace`` or ``StyleguideExtend*``)
+        is yielded as soon as the file defining it has been parsed. When all the
+        files are parsed, replace and extend sections are applied, and the resulting
+        section for each affected reference is yielded again. This means that the
+        last section yielded for a reference is the one in :meth:`.sections`.
+
+        Files are parsed as the generator is consumed, so you can start
+        rendering before all files are parsed. When the generator is exhausted,
+        :meth:`.sections`, :meth:`.as_tree` etc. use the result without
+        parsing again.
+
+        Returns:
+            iterator: Iterable of :class:`pythonkss.section.Section` objects.
+        """
+        multiblockparser = MultiCommentBlockParser()
+        for section in self._parse(multiblockparser=multiblockparser):
+            yield section
+        sections = multiblockparser.sections
+        for reference in multiblockparser.get_replaced_and_extended_references():
+            yield sections[reference]
+        self._multiblockparser = multiblockparser
+        if hasattr(self, '_built_tree'):
+            del self._built_tree
+
+    def _find_changed_files(self):
+        filepaths = []
+        file_stats = {}
+        added_files = []
+        changed_files = []
+        for filepath in self.find_files():
+            try:
+                filestat = get_filestat(filepath)
+            except OSError:
+                continue
+            filepaths.append(filepath)
+            file_stats[filepath] = filestat
+            if filepath not in self._file_stats:
+                added_files.append(filepath)
+            elif self._file_stats[filepath] != filestat:
+                changed_files.append(filepath)
+        removed_files = [filepath for filepath in self._file_sections
+                         if filepath not in file_stats]
+        return filepaths, file_stats, ParserChanges(
+            added_files=added_files,
+            changed_files=changed_files,
+            removed_files=removed_files)
+
+    def find_changed_files(self):
+        """
+        Find files that have been added, changed or removed since the
+        last :meth:`.parse` or :meth:`.refresh` without parsing anything.
+
+        Returns:
+            ParserChanges: With only the ``*_files`` attributes set.
+        """
+        if not hasattr(self, '_multiblockparser'):
+            return ParserChanges(added_files=list(self.find_files()))
+        return self._find_changed_files()[2]
+
+    def _readd_references(self, multiblockparser, references, file_order):
+        for reference in references:
+            filepaths = sorted(self._reference_filepaths.get(reference, ()), key=file_order.__getitem__)
+            for filepath in filepaths:
+                for section in self._file_sections[filepath]:
+                    if section.reference == reference:
+                        multiblockparser.add_section(section)
+
+    def refresh(self):
+        """
+        Re-parse files that have been added, changed or removed since the
+        last :meth:`.parse` or :meth:`.refresh`.
+
+        Only the changed files are parsed, and replace and merge is only
+        re-done for the references defined in those files. If :meth:`.as_tree`
+        has been called, the tree is patched with the changed sections
+        instead of being rebuilt.
+
+        If the parser has not parsed anything yet, this just parses
+        everything.
+
+        If the refresh raises an exception (E.g.: a
+        :class:`pythonkss.exceptions.DuplicateReferenceError`), the parser
+        is left unchanged.
+
+        Returns:
+            ParserChanges: The changed files and references.
+        """
+        if not hasattr(self, '_multiblockparser'):
+            self._multiblockparser = self.parse()
+            return ParserChanges(added_files=list(self._file_sections),
+                                 added_references=set(self._multiblockparser.sections))
+        filepaths, file_stats, changes = self._find_changed_files()
+        if not changes.has_file_changes():
+            return changes
+        return self._apply_file_changes(filepaths=filepaths, file_stats=file_stats, changes=changes)
+
+    def _get_parse_state(self):
+        return self._file_stats, self._file_sections, self._reference_filepaths, self._multiblockparser
+
+    def _set_parse_state(self, parse_state):
+        self._file_stats, self._file_sections, self._reference_filepaths, self._multiblockparser = parse_state
+
+    def _apply_file_changes(self, filepaths, file_stats, changes):
+        """
+        Re-parse the added and changed files in ``changes``, drop the removed files,
+        and re-do replace and merge for the references defined in those files.
+
+        The changes are made to copies of the parsed state, so if parsing
+        or merging raises an exception (E.g.: :class:`pythonkss.exceptions.DuplicateReferenceError`),
+        the parser is left unchanged, and the next refresh finds the same changes.
+
+        Args:
+            filepaths: All the files in the order they should be parsed.
+            file_stats: Maps the added and changed files to their :func:`~pythonkss.filefinder.get_filestat`.
+            changes: A :class:`.ParserChanges` with the ``*_files`` attributes set.
+                The ``*_references`` attributes are updated.
+        """
+        previous_parse_state = self._get_parse_state()
+        self._set_parse_state((
+            dict(self._file_stats),
+            collections.OrderedDict(self._file_sections),
+            dict(self._reference_filepaths),
+            self._multiblockparser.copy()))
+        try:
+            self._update_parse_state(filepaths=filepaths, file_stats=file_stats, changes=changes)
+        except Exception:
+            self._set_parse_state(previous_parse_state)
+            raise
+        sections = self._multiblockparser.sections
+        if hasattr(self, '_built_tree'):
+            self._built_tree.update_sections(
+                added_sections=[sections[reference] for reference in changes.added_references],
+                changed_sections=[sections[reference] for reference in changes.changed_references],
+                removed_references=changes.removed_references)
+        self._clear_variant_template()
+        return changes
+
+    def _update_parse_state(self, filepaths, file_stats, changes):
+        multiblockparser = self._multiblockparser
+        affected_references = set()
+        for filepath in changes.changed_files + changes.removed_files:
+            sections = self._file_sections.pop(filepath)
+            self._remove_from_reference_filepaths(filepath=filepath, sections=sections)
+            affected_references.update(section.reference for section in sections)
+            self._file_stats.pop(filepath)
+        parsed_files = self._iter_parsed_files(
+            filepaths=changes.added_files + changes.changed_files,
+            variablemap=self._make_variablemap())
+        for filepath, sections in parsed_files:
+            self._file_sections[filepath] = sections
+            self._file_stats[filepath] = file_stats[filepath]
+            self._add_to_reference_filepaths(filepath=filepath, sections=sections)
+            affected_references.update(section.reference for section in sections)
+        self._file_sections = collections.OrderedDict(
+            (filepath, self._file_sections[filepath])
+            for filepath in filepaths if filepath in self._file_sections)
+        file_order = dict((filepath, index) for index, filepath in enumerate(self._file_sections))
+
+        old_sections = multiblockparser.sections
+        previous = dict((reference, old_sections[reference])
+                        for reference in affected_references if reference in old_sections)
+        multiblockparser.discard_references(affected_references)
+        self._readd_references(multiblockparser=multiblockparser, references=affected_references,
+                               file_order=file_order)
+        multiblockparser.finish(references=affected_references)
+
+        sections = multiblockparser.sections
+        for reference in affected_references:
+            if reference not in sections:
+                if reference in previous:
+                    changes.removed_references.add(reference)
+            elif reference in previous:
+                changes.changed_references.add(reference)
+            else:
+                changes.added_references.add(reference)
+
+    def _get_changed_variablemap_keys(self, old_variablemap, new_variablemap):
+        changed_keys = set()
+        for key in set(old_variablemap) | set(new_variablemap):
+            if key not in old_variablemap or key not in new_variablemap \
+                    or old_variablemap[key] != new_variablemap[key]:
+                changed_keys.add(key)
+        return changed_keys
+
+    def get_sections_using_variables(self, variables):
+        """
+        Get the sections that use any of ``variables``.
+
+        Args:
+            variables: Iterable of variable names (the keys in the ``variables``
+                dict for :class:`.Parser`).
+
+        Returns:
+            list: A list of :class:`pythonkss.section.Section` objects from :meth:`.sections`.
+        """
+        keys = set(self.variablepattern.format(variable=variable) for variable in variables)
+        sections = self.sections  # Parses the files if needed, so _file_sections is set.
+        references = set()
+        for file_sections in self._file_sections.values():
+            for section in file_sections:
+                if section.used_variables & keys:
+                    references.add(section.reference)
+        return [section for reference, section in sections.items() if reference in references]
+
+    def update_variables(self, variables):
+        """
+        Change the ``variables``, and re-parse only the files that use
+        variables that were added, removed or changed.
+
+        The variables used by each section are recorded when the files are parsed
+        (see :attr:`pythonkss.section.Section.used_variables`), so this is much
+        faster than parsing all the files with a new :class:`.Parser`. Sections
+        that are not re-parsed keep their memoized HTML.
+
+        If any of the old or new values for the changed variables contain
+        ``Styleguide``, they can add or remove sections in any file, so all
+        the files are re-parsed.
+
+        If the parser has not parsed anything yet, this just parses everything
+        with the new variables.
+
+        Args:
+            variables (dict): See :class:`.Parser`.
+
+        Returns:
+            ParserChanges: The re-parsed files (as ``changed_files``) and the added,
+            changed and removed references.
+        """
+        old_variables = self.variables
+        old_variablemap = self._make_variablemap()
+        self.variables = variables
+        if not hasattr(self, '_multiblockparser'):
+            return self.refresh()
+        new_variablemap = self._make_variablemap()
+        changed_keys = self._get_changed_variablemap_keys(old_variablemap, new_variablemap)
+        if not changed_keys:
+            return ParserChanges()
+        changed_values = [
+            variablemap[key]
+            for variablemap in (old_variablemap, new_variablemap)
+            for key in changed_keys if key in variablemap]
+        if any(STYLEGUIDE_KEYWORD in str(value) for value in changed_values):
+            changed_files = list(self._file_sections)
+        else:
+            changed_files = [
+                filepath for filepath, sections in self._file_sections.items()
+                if any(section.used_variables & changed_keys for section in sections)]
+        if not changed_files:
+            return ParserChanges()
+        file_stats = dict((filepath, get_filestat(filepath)) for filepath in changed_files)
+        try:
+            return self._apply_file_changes(
+                filepaths=list(self._file_sections), file_stats=file_stats,
+                changes=ParserChanges(changed_files=changed_files))
+        except Exception:
+            self.variables = old_variables
+            raise
+
+    def _clear_variant_template(self):
+        for attribute in ('_variant_template', '_variant_template_parser'):
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+
+    def _get_variant_template(self):
+        from pythonkss.variants import VariantTemplate
+        if self.variables:
+            if not hasattr(self, '_variant_template_parser'):
+                kwargs = self._get_init_kwargs()
+                kwargs['variables'] = None
+                self._variant_template_parser = Parser(*self.paths, **kwargs)
+            return self._variant_template_parser._get_variant_template()
+        if not hasattr(self, '_variant_template'):
+            self._variant_template = VariantTemplate(self)
+        return self._variant_template
+
+    def variant(self, variables):
+        """
+        Get a parser with other ``variables``, without parsing the files again.
+
+        Useful when building the same styleguide for multiple themes that only
+        differ in variables::
+
+            parser = pythonkss.Parser('/path/to/my/styles/')
+            for theme, variables in themes.items():
+                render_styleguide(theme, parser.variant(variables).as_tree())
+
+        The files are parsed once without variables (or not at all if this parser
+        has no ``variables``), and each variant only applies its variables to
+        the sections that use them. Sections and examples that do not use any
+        variables are shared by all the variants, and the HTML memoized for them
+        is only rendered once.
+
+        Variables can only be applied after parsing if their values can not
+        change how the comments are parsed. If they can, the variant falls back to
+        parsing the files. See :func:`pythonkss.variants.can_apply_variables_after_parsing`.
+
+        Variants do not see changes made by :meth:`.refresh` after their sections
+        have been accessed.
+
+        Args:
+            variables (dict): See :class:`.Parser`.
+
+        Returns:
+            pythonkss.variants.ParserVariant: A :class:`.Parser` with ``variables``.
+        """
+        from pythonkss.variants import ParserVariant
+        return ParserVariant(self, variables=variables)
+
     @property
     def multiblockparser(self):
         if not hasattr(self, '_multiblockparser'):
@@ -314,6 +1057,126 @@ class Parser(object):
         """
         return sorted(self.get_sections(referenceprefix=referenceprefix), key=lambda s: s.reference)
 
+    def prerender_html(self, referenceprefix=None):
+        """
+        Render and memoize the HTML for sections and their examples.
+        See :meth:`pythonkss.section.Section.prerender_html`.
+
+        Args:
+            referenceprefix: See :meth:`.get_sections`.
+        """
+        for section in self.get_sections(referenceprefix=referenceprefix):
+            section.prerender_html()
+
+    def _collect_render_jobs(self, referenceprefix=None):
+        setters = []
+        jobs = []
+        seen_examples = set()
+        for section in self.get_sections(referenceprefix=referenceprefix):
+            if not section.has_rendered_description_html():
+                setters.append(section.set_rendered_description_html)
+                jobs.append((RENDER_JOB_MARKDOWN, (section.description, section.html_output_mode)))
+            for example in section.examples:
+                if id(example) in seen_examples or example.has_rendered_html():
+                    continue
+                seen_examples.add(id(example))
+                setters.append(example.set_rendered_html)
+                jobs.append((RENDER_JOB_CODE, (example.text, example.syntax, example.html_output_mode)))
+        return setters, jobs
+
+    def _chunk_render_jobs(self, jobs, workers):
+        """
+        Split ``jobs`` into chunks of roughly the same total text size, with a
+        few chunks per worker. Jobs larger than the chunk size get their own
+        chunk, so one huge section does not stall a worker with other jobs queued
+        behind it.
+
+        Returns:
+            list: List of lists of indexes into ``jobs``, largest chunk first.
+        """
+        totalsize = sum(_get_render_job_size(job) for job in jobs)
+        chunksize = max(1, totalsize // (workers * 4))
+        chunks = []
+        chunk = []
+        size = 0
+        for index, job in enumerate(jobs):
+            jobsize = _get_render_job_size(job)
+            if jobsize >= chunksize:
+                chunks.append((jobsize, [index]))
+                continue
+            chunk.append(index)
+            size += jobsize
+            if size >= chunksize:
+                chunks.append((size, chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            chunks.append((size, chunk))
+        chunks.sort(key=lambda sizeandchunk: sizeandchunk[0], reverse=True)
+        return [chunk for size, chunk in chunks]
+
+    def _render_jobs_with_executor(self, executor, jobs, workers):
+        chunks = self._chunk_render_jobs(jobs=jobs, workers=workers)
+        results = [None] * len(jobs)
+        chunkresults = executor.map(render_jobs, [[jobs[index] for index in chunk] for chunk in chunks])
+        for chunk, htmllist in zip(chunks, chunkresults):
+            for index, html in zip(chunk, htmllist):
+                results[index] = html
+        return results
+
+    def render_all(self, workers=None, executor=None, referenceprefix=None):
+        """
+        Render :meth:`pythonkss.section.Section.description_html` and
+        :meth:`pythonkss.example.Example.html` for all the sections and examples
+        that do not have their HTML memoized, and memoize the results on
+        the :class:`~pythonkss.section.Section` and :class:`~pythonkss.example.Example`
+        objects.
+
+        Same as :meth:`.prerender_html`, except that the rendering can be performed
+        in a process pool. The jobs are chunked by text size. The result is the same
+        as when rendering in the current process.
+
+        Args:
+            workers (int): Render in a process pool with this many worker
+                processes. Defaults to the ``workers`` argument for :class:`.Parser`.
+                If ``executor`` is used, this is the number of workers in the executor,
+                and is only used to size the chunks of jobs. Defaults to the number
+                of CPUs in that case (the default for :class:`concurrent.futures.ProcessPoolExecutor`).
+            executor: A :class:`concurrent.futures.Executor` to render with. Takes
+                precedence over ``workers``. Defaults to the ``executor`` argument
+                for :class:`.Parser`.
+            referenceprefix: See :meth:`.get_sections`.
+        """
+        if workers is None:
+            workers = self.workers
+        if executor is None:
+            executor = self.executor
+        setters, jobs = self._collect_render_jobs(referenceprefix=referenceprefix)
+        if not jobs:
+            return
+        if executor is not None:
+            results = self._render_jobs_with_executor(
+                executor=executor, jobs=jobs, workers=workers or multiprocessing.cpu_count())
+        elif workers and workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = self._render_jobs_with_executor(executor=executor, jobs=jobs, workers=workers)
+        else:
+            results = render_jobs(jobs)
+        for setter, html in zip(setters, results):
+            setter(html)
+
+    def clear_rendered_html(self, referenceprefix=None):
+        """
+        Release the HTML memoized for sections and their examples.
+        See :meth:`pythonkss.section.Section.clear_rendered_html`.
+
+        Args:
+            referenceprefix: See :meth:`.get_sections`.
+        """
+        for section in self.get_sections(referenceprefix=referenceprefix):
+            section.clear_rendered_html()
+
     def as_tree(self):
         """
         Get sections organized in :class:`pythonkss.sectiontree.SectionTree`.
@@ -0,0 +1,221 @@
+import codecs
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from pythonkss.parsecache import _replace_file
+
+
+class RenderCache(object):
+    """
+    Content-addressed cache for the HTML rendered by
+    :class:`pythonkss.markdownformatter.MarkdownFormatter`.
+
+    Enable it by setting :attr:`pythonkss.markdownformatter.MarkdownFormatter.render_cache`::
+
+        from pythonkss.markdownformatter import MarkdownFormatter
+        from pythonkss.rendercache import RenderCache
+
+        MarkdownFormatter.render_cache = RenderCache(cache_dir='/path/to/cache')
+
+    Keys are SHA-256 hashes of everything that affects the output (see
+    :meth:`pythonkss.markdownformatter.MarkdownFormatter.get_render_cache_keyparts`),
+    so entries never have to be invalidated.
+
+    The cache has two tiers:
+
+    - An in-memory LRU tier with at most ``max_entries`` entries.
+    - An optional on-disk tier in ``cache_dir``. When the files in the tier
+      use more than ``max_disk_bytes``, the least recently used entries are
+      removed. Entries are written to a temporary file and moved into place,
+      so multiple processes can share the same ``cache_dir``.
+
+    .. attribute:: hits
+
+        Number of lookups found in the memory tier.
+
+    .. attribute:: disk_hits
+
+        Number of lookups not in the memory tier, but found in the disk tier.
+
+    .. attribute:: misses
+
+        Number of lookups not found in any tier.
+
+    .. attribute:: evictions
+
+        Number of entries evicted from the memory tier.
+
+    .. attribute:: disk_evictions
+
+        Number of entries evicted from the disk tier.
+    """
+    def __init__(self, max_entries=10000, cache_dir=None, max_disk_bytes=100 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Max number of entries in the memory tier.
+            cache_dir: Directory for the disk tier. Created if it does not exist.
+                Defaults to ``None``, which means no disk tier.
+            max_disk_bytes: Max total size of the files in the disk tier.
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def make_key(self, keyparts):
+        """
+        Make a key from a list of JSON serializable ``keyparts``.
+        """
+        data = json.dumps(keyparts, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get_stats(self):
+        """
+        Get the counters as a dict.
+        """
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'disk_evictions': self.disk_evictions,
+            'entries': len(self._entries),
+        }
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.html')
+
+    def _set_in_memory(self, key, html):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_from_memory(self, key):
+        with self._lock:
+            html = self._entries.pop(key, None)
+            if html is not None:
+                self._entries[key] = html
+            return html
+
+    def _get_from_disk(self, key):
+        entry_path = self._get_entry_path(key)
+        try:
+            with codecs.open(entry_path, 'r', 'utf-8') as fileobj:
+                html = fileobj.read()
+            os.utime(entry_path, None)
+        except (IOError, OSError):
+            return None
+        return html
+
+    def _iter_disk_entries(self):
+        for directorypath, directorynames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith('.html'):
+                    continue
+                entry_path = os.path.join(directorypath, filename)
+                try:
+                    stat = os.stat(entry_path)
+                except OSError:
+                    continue
+                yield entry_path, stat
+
+    def _get_disk_bytes(self):
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(stat.st_size for entry_path, stat in self._iter_disk_entries())
+        return self._disk_bytes
+
+    def _evict_from_disk(self):
+        entries = sorted(self._iter_disk_entries(), key=lambda entry: entry[1].st_mtime)
+        disk_bytes = sum(stat.st_size for entry_path, stat in entries)
+        # Evict down to 90% of the max so we do not have to scan the directory on each set.
+        target_bytes = self.max_disk_bytes * 0.9
+        for entry_path, stat in entries:
+            if disk_bytes <= target_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            disk_bytes -= stat.st_size
+            self.disk_evictions += 1
+        self._disk_bytes = disk_bytes
+
+    def _set_on_disk(self, key, html):
+        entry_path = self._get_entry_path(key)
+        directory = os.path.dirname(entry_path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        data = html.encode('utf-8')
+        with self._lock:
+            # Count the existing entries before writing, so the new entry is not counted twice.
+            self._get_disk_bytes()
+        try:
+            replaced_bytes = os.stat(entry_path).st_size
+        except OSError:
+            replaced_bytes = 0
+        filedescriptor, temppath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(filedescriptor, 'wb') as fileobj:
+                fileobj.write(data)
+            _replace_file(temppath, entry_path)
+        except Exception:
+            if os.path.exists(temppath):
+                os.remove(temppath)
+            raise
+        with self._lock:
+            self._disk_bytes += len(data) - replaced_bytes
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_from_disk()
+
+    def get(self, key):
+        """
+        Get the HTML for ``key``.
+
+        Returns:
+            str: The HTML, or ``None`` if ``key`` is not in the cache.
+        """
+        html = self._get_from_memory(key)
+        if html is not None:
+            self.hits += 1
+            return html
+        if self.cache_dir is not None:
+            html = self._get_from_disk(key)
+            if html is not None:
+                self.disk_hits += 1
+                self._set_in_memory(key, html)
+                return html
+        self.misses += 1
+        return None
+
+    def set(self, key, html):
+        """
+        Store ``html`` for ``key`` in all the tiers.
+        """
+        self._set_in_memory(key, html)
+        if self.cache_dir is not None:
+            self._set_on_disk(key, html)
+
+    def clear(self):
+        """
+        Remove all the entries from the memory tier.
+        """
+        with self._lock:
+            self._entries.clear()
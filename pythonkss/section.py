@@ -1,3 +1,4 @@
+import copy
 import os
 import re
 import textwrap
@@ -5,15 +6,25 @@ import textwrap
 from pythonkss import markdownformatter
 from pythonkss.example import Example
 from pythonkss.exceptions import NotSectionError, InvalidMergeSectionTypeError, InvalidMergeNotSameReferenceError
+from pythonkss.interning import intern_string
 
 EXAMPLE_START = 'Example:'
 
+#: Every section has this on its last line, so comments without it can not be sections.
+STYLEGUIDE_KEYWORD = 'Styleguide'
+
 intented_line_re = re.compile(r'^\s\s+.*$')
 reference_re = re.compile(
-    r'^Styleguide(?P<type>(?:ExtendBefore|ExtendAfter|Replace))? '
+    r'^' + STYLEGUIDE_KEYWORD + r'(?P<type>(?:ExtendBefore|ExtendAfter|Replace))? '
     r'(?P<reference>(?:[0-9a-z_-]*\.)*(?:(?:\d+:)?[0-9a-z_-]+))$')
 extend_title_re = re.compile(r'Title:(?P<title>.+)$')
 
+# Shared by all sections without variables. Empty frozensets are not singletons in all Python versions.
+_no_used_variables = frozenset()
+
+# Shared by all sections. There are only four possible body line slices.
+_body_line_slices = {}
+
 
 class SectionParser(object):
     def __init__(self, comment):
@@ -27,6 +38,7 @@ class SectionParser(object):
         self.reference_segment_list = []
         self.sortkey = None
         self.description = None
+        self.body_line_slice = None
 
         self.in_example = False
         self.description_lines = []
@@ -97,10 +109,15 @@ class SectionParser(object):
     def _parse_raw_reference(self, raw_reference):
         self.raw_reference = raw_reference
         if raw_reference:
-            self.raw_reference_segment_list = self.raw_reference.split('.')
+            self.raw_reference_segment_list = [intern_string(segment) for segment in raw_reference.split('.')]
             self.sortkey, text = self._parse_last_reference_segment(self.raw_reference_segment_list[-1])
-            self.reference_segment_list = self.raw_reference_segment_list[0:-1] + [text]
-            self.reference = '.'.join(self.reference_segment_list)
+            if text == self.raw_reference_segment_list[-1]:
+                # Share the list and string with the raw reference when they are equal
+                self.reference_segment_list = self.raw_reference_segment_list
+                self.reference = raw_reference
+            else:
+                self.reference_segment_list = self.raw_reference_segment_list[0:-1] + [intern_string(text)]
+                self.reference = '.'.join(self.reference_segment_list)
 
     def _parse_styleguide_line(self, line):
         match = reference_re.match(line)
@@ -109,9 +126,9 @@ class SectionParser(object):
             self.section_type = groupdict['type'] or Section.TYPE_DEFAULT
             self._parse_raw_reference(groupdict['reference'])
 
-    def parse(self, reference=None, title=None):
+    def parse_header(self, reference=None, title=None):
         """
-        Parse the section.
+        Parse the reference, section type and title of the section.
 
         Args:
             reference: If provided, we parse the provided reference
@@ -119,6 +136,12 @@ class SectionParser(object):
                 after ``Styleguide`` on the last line of the comment.
             title: If provided, we use the provided title
                 instead of extracting it from the first line of the comment.
+
+        Sets :attr:`.body_line_slice` to ``(start, stop)`` so that
+        ``comment.strip().splitlines()[start:stop]`` is the returned lines.
+
+        Returns:
+            list: The remaining lines of the comment. Pass these to :meth:`.parse_body`.
         """
         lines = self.comment.strip().splitlines()
         minimum_lines = 2
@@ -129,10 +152,13 @@ class SectionParser(object):
         if len(lines) < minimum_lines:
             raise NotSectionError('Not a section. A section must have at least 2 lines.',
                                   comment_lines=lines)
+        start = 0
+        stop = None
         if reference:
             self._parse_raw_reference(reference)
         else:
             styleguide_line = lines.pop()
+            stop = -1
             self._parse_styleguide_line(styleguide_line)
         if self.reference is None:
             raise NotSectionError('Not a section. A section must have the reference on the last line.',
@@ -144,7 +170,17 @@ class SectionParser(object):
             title_line_consumed = self._parse_title(lines[0])
             if title_line_consumed:
                 lines = lines[1:]
+                start = 1
+        self.body_line_slice = (start, stop)
+        return lines
 
+    def parse_body(self, lines):
+        """
+        Parse the description and examples of the section.
+
+        Args:
+            lines: The lines returned by :meth:`.parse_header`.
+        """
         self._reset_in_booleans()
         for line in lines:
             self.parse_body_line(line=line)
@@ -152,11 +188,44 @@ class SectionParser(object):
         if self.example_lines:
             self.examples.append([self.example_lines, self.example_argumentstring])
 
+    def parse(self, **kwargs):
+        """
+        Parse the section.
+
+        Args:
+            **kwargs: Forwarded to :meth:`.parse_header`.
+        """
+        self.parse_body(lines=self.parse_header(**kwargs))
+
 
 class Section(object):
     """
     A section in the documentation.
+
+    Uses ``__slots__`` to keep the memory usage low for large styleguides.
+    Subclasses must define ``__slots__`` for any attributes they add.
+
+    .. attribute:: comment
+
+        The comment the section is parsed from.
+
+    .. attribute:: filepath
+
+        The path to the file the section is defined in. Can be ``None``.
+
+    .. attribute:: used_variables
+
+        The keys of the variable map used in the comment, as a frozenset.
+        Set by :func:`pythonkss.parser.parse_file`, and used by
+        :meth:`pythonkss.parser.Parser.update_variables`.
     """
+    __slots__ = (
+        'comment', 'filepath', 'used_variables', '_html_output_mode',
+        '_body_line_slice', '_section_type', '_title', '_reference', '_raw_reference',
+        '_raw_reference_segment_list', '_reference_segment_list', '_sortkey',
+        '_description', '_examples', '_rendered_description_html',
+    )
+
     TYPE_DEFAULT = 'Default'
     TYPE_EXTEND_AFTER = 'ExtendAfter'
     TYPE_EXTEND_BEFORE = 'ExtendBefore'
@@ -165,8 +234,42 @@ class Section(object):
 
     def __init__(self, comment=None, filepath=None):
         self.comment = comment or ''
-        self.filepath = filepath
-        self._parsed = False
+        self.filepath = intern_string(filepath) if filepath else filepath
+        self.used_variables = _no_used_variables
+        self._html_output_mode = None
+
+    @classmethod
+    def _get_slot_names(cls):
+        slot_names = []
+        for klass in reversed(cls.__mro__):
+            slot_names.extend(klass.__dict__.get('__slots__', ()))
+        return slot_names
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self._get_slot_names() if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # Strings are not interned when unpickled (E.g.: from a ParseCache or a worker process)
+        if self.filepath:
+            self.filepath = intern_string(self.filepath)
+        if hasattr(self, '_raw_reference_segment_list'):
+            self._raw_reference_segment_list = [
+                intern_string(segment) for segment in self._raw_reference_segment_list]
+            if self._reference_segment_list == self._raw_reference_segment_list:
+                self._reference_segment_list = self._raw_reference_segment_list
+            else:
+                self._reference_segment_list = [
+                    intern_string(segment) for segment in self._reference_segment_list]
+
+    def _copy_attributes_to(self, section):
+        """
+        Shallow copy all the attributes of this section to ``section``.
+        """
+        for name in Section._get_slot_names():
+            if hasattr(self, name):
+                setattr(section, name, getattr(self, name))
 
     @property
     def filename(self):
@@ -179,25 +282,74 @@ class Section(object):
         """
         Parse the section.
 
+        Only the reference, section type and title are parsed here. The
+        description and examples are parsed the first time
+        :meth:`.description` or :meth:`.examples` is accessed (or when
+        :meth:`.parse_body_if_needed` is called), so code that only needs
+        references and titles (E.g.: navigation) never pays for parsing the body.
+        Only the position of the body lines within :attr:`.comment` is kept
+        until then, so the text is not stored twice.
+
         Args:
-            **kwargs: Forwarded to :meth:`.SectionParser.parse`.
+            **kwargs: Forwarded to :meth:`.SectionParser.parse_header`.
         """
         sectionparser = SectionParser(comment=self.comment)
-        sectionparser.parse(**kwargs)
+        sectionparser.parse_header(**kwargs)
+        body_line_slice = sectionparser.body_line_slice
+        self._body_line_slice = _body_line_slices.setdefault(body_line_slice, body_line_slice)
         self._section_type = sectionparser.section_type
         self._title = sectionparser.title
-        self._description = sectionparser.description
         self._reference = sectionparser.reference
         self._raw_reference = sectionparser.raw_reference
         self._raw_reference_segment_list = sectionparser.raw_reference_segment_list
         self._reference_segment_list = sectionparser.reference_segment_list
         self._sortkey = sectionparser.sortkey
+        for attribute in ('_description', '_examples'):
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+
+    def _parse_body(self):
+        if not hasattr(self, '_body_line_slice'):
+            self.parse()
+        start, stop = self._body_line_slice
+        sectionparser = SectionParser(comment=self.comment)
+        sectionparser.parse_body(lines=self.comment.strip().splitlines()[start:stop])
+        self._description = sectionparser.description
         self._examples = []
         for lines, argumentstring in sectionparser.examples:
             self._add_example_linelist(example_lines=lines, argumentstring=argumentstring)
+        del self._body_line_slice
+
+    def parse_body_if_needed(self):
+        """
+        Parse the description and examples unless they are already parsed.
+
+        Used by :func:`pythonkss.parser.parse_file` when the sections are
+        sent to another process or stored in a :class:`pythonkss.parsecache.ParseCache`,
+        so the body is parsed where the work is done, and not again each time
+        the sections are loaded.
+        """
+        if not hasattr(self, '_description'):
+            self._parse_body()
+
+    def copy(self):
+        """
+        Get a copy of this section.
+
+        The copy has its own list of examples, so the copy can be
+        used as the target for :meth:`.merge_into_section` without
+        changing this section.
+        """
+        section = copy.copy(self)
+        if hasattr(self, '_examples'):
+            section._examples = list(self._examples)
+        return section
 
     def parse_if_needed(self):
-        if not self._parsed:
+        """
+        Parse the section unless it is already parsed.
+        """
+        if not hasattr(self, '_reference'):
             self.parse()
 
     @property
@@ -233,7 +385,7 @@ class Section(object):
         Get the description as plain text.
         """
         if not hasattr(self, '_description'):
-            self.parse()
+            self._parse_body()
         return self._description
 
     @property
@@ -241,8 +393,71 @@ class Section(object):
         """
         Get the :meth:`.description` converted to markdown using
         :class:`pythonkss.markdownformatter.MarkdownFormatter`.
+
+        The result is memoized until the description or :meth:`.html_output_mode`
+        changes, or :meth:`.clear_rendered_html` is called.
+        """
+        if not self.has_rendered_description_html():
+            html = markdownformatter.MarkdownFormatter.to_html(
+                markdowntext=self.description, output_mode=self.html_output_mode)
+            self.set_rendered_description_html(html)
+        return self._rendered_description_html[1]
+
+    def _get_description_html_cachekey(self):
+        return self.description, self.html_output_mode
+
+    def has_rendered_description_html(self):
         """
-        return markdownformatter.MarkdownFormatter.to_html(markdowntext=self.description)
+        Returns ``True`` if :meth:`.description_html` is memoized for the current description.
+        """
+        return hasattr(self, '_rendered_description_html') \
+            and self._rendered_description_html[0] == self._get_description_html_cachekey()
+
+    def set_rendered_description_html(self, html):
+        """
+        Memoize ``html`` as the :meth:`.description_html` for the current description.
+        Used when the HTML is rendered elsewhere (E.g.: by
+        :meth:`pythonkss.parser.Parser.render_all`).
+        """
+        self._rendered_description_html = (self._get_description_html_cachekey(), html)
+
+    @property
+    def html_output_mode(self):
+        """
+        Get the ``output_mode`` for :meth:`pythonkss.markdownformatter.MarkdownFormatter.to_html`
+        used by :meth:`.description_html` and the :meth:`pythonkss.example.Example.html`
+        of the :meth:`.examples`. Defaults to ``None``.
+
+        Setting this also sets it for the examples.
+        """
+        return self._html_output_mode
+
+    @html_output_mode.setter
+    def html_output_mode(self, html_output_mode):
+        self._html_output_mode = html_output_mode
+        if hasattr(self, '_examples'):
+            for example in self._examples:
+                example.html_output_mode = html_output_mode
+
+    def prerender_html(self):
+        """
+        Render and memoize :meth:`.description_html` and the
+        :meth:`pythonkss.example.Example.html` of all the :meth:`.examples`.
+        """
+        self.description_html
+        for example in self.examples:
+            example.html
+
+    def clear_rendered_html(self):
+        """
+        Release the HTML memoized by :meth:`.description_html` and
+        the :meth:`pythonkss.example.Example.html` of all the :meth:`.examples`.
+        """
+        if hasattr(self, '_rendered_description_html'):
+            del self._rendered_description_html
+        if hasattr(self, '_examples'):
+            for example in self._examples:
+                example.clear_rendered_html()
 
     @property
     def examples(self):
@@ -250,20 +465,20 @@ class Section(object):
         Get all ``Example`` sections as a list of :class:`pythonkss.example.Example` objects.
         """
         if not hasattr(self, '_examples'):
-            self.parse()
+            self._parse_body()
         return self._examples
 
     def has_examples(self):
         """
         Returns ``True`` if the section has at least one ``Example:`` section.
         """
-        return len(self._examples) > 0
+        return len(self.examples) > 0
 
     def has_multiple_examples(self):
         """
         Returns ``True`` if the section more than one ``Example:`` section.
         """
-        return len(self._examples) > 1
+        return len(self.examples) > 1
 
     @property
     def reference(self):
@@ -379,34 +594,18 @@ class Section(object):
         example = Example(
             text=text,
             filename=self.filename,
+            html_output_mode=self.html_output_mode,
             **kwargs)
         self._examples.append(example)
 
-    def _merge_title_into_section(self, target_section, after):
-        if after:
-            formattingstring = '{target} {source}'
-        else:
-            formattingstring = '{source} {target}'
-        target_section._title = formattingstring.format(
-            source=self.title,
-            target=target_section.title)
-
-    def _merge_description_into_section(self, target_section, after):
-        if after:
-            formattingstring = '{target}\n\n{source}'
-        else:
-            formattingstring = '{source}\n\n{target}'
-        target_section._description = formattingstring.format(
-            source=self.description,
-            target=target_section.description)
-
-    def _merge_examples_into_section(self, target_section, after):
-        if after:
-            target_section._examples.extend(self._examples)
-        else:
-            target_section._examples = self._examples + target_section._examples
+    def check_can_merge_into_section(self, target_section):
+        """
+        Raise an exception if this section can not be merged into ``target_section``.
 
-    def merge_into_section(self, target_section):
+        Raises:
+            InvalidMergeSectionTypeError: If this is not an extend section.
+            InvalidMergeNotSameReferenceError: If the references do not match.
+        """
         if self.section_type not in self.EXTEND_TYPES:
             raise InvalidMergeSectionTypeError(
                 'Can only merge sections of the following types '
@@ -420,10 +619,78 @@ class Section(object):
                     source=self.reference,
                     target=target_section.reference
                 ))
-        after = self.section_type == self.TYPE_EXTEND_AFTER
-        if self.title:
-            self._merge_title_into_section(target_section=target_section, after=after)
-        if self.description:
-            self._merge_description_into_section(target_section=target_section, after=after)
-        if self.examples:
-            self._merge_examples_into_section(target_section=target_section, after=after)
+
+    def merge_into_section(self, target_section):
+        """
+        Merge this ``StyleguideExtendBefore`` or ``StyleguideExtendAfter``
+        section into ``target_section``.
+
+        Use :class:`.SectionMergePlan` to merge multiple sections into the same target.
+        """
+        SectionMergePlan([self]).merge_into_section(target_section=target_section)
+
+
+class SectionMergePlan(object):
+    """
+    Merges a list of ``StyleguideExtendBefore`` and ``StyleguideExtendAfter``
+    sections into a target section.
+
+    The result is the same as calling :meth:`.Section.merge_into_section` for
+    each of the sections in order, but the title, description and examples of
+    the target are only built once. This means that merging ``n`` sections into
+    the same target is ``O(n)`` instead of ``O(n^2)``.
+
+    Since each ``ExtendBefore`` section is added before the result of
+    merging all the previous sections, the ``ExtendBefore`` sections end up in
+    reverse order before the target, and the ``ExtendAfter`` sections end up
+    in order after the target.
+    """
+    def __init__(self, source_sections):
+        """
+        Args:
+            source_sections: Iterable of extend sections in the order they should be merged.
+        """
+        self.source_sections = list(source_sections)
+        self.before_sections = []
+        self.after_sections = []
+        for source_section in self.source_sections:
+            if source_section.section_type == Section.TYPE_EXTEND_AFTER:
+                self.after_sections.append(source_section)
+            else:
+                self.before_sections.append(source_section)
+        self.before_sections.reverse()
+
+    def _join(self, separator, target_value, attribute):
+        before_values = [getattr(section, attribute) for section in self.before_sections]
+        after_values = [getattr(section, attribute) for section in self.after_sections]
+        before_values = [value for value in before_values if value]
+        after_values = [value for value in after_values if value]
+        if not before_values and not after_values:
+            return target_value
+        return separator.join(before_values + [target_value] + after_values)
+
+    def _join_examples(self, target_examples):
+        examples = []
+        for section in self.before_sections:
+            examples.extend(section.examples)
+        examples.extend(target_examples)
+        for section in self.after_sections:
+            examples.extend(section.examples)
+        return examples
+
+    def merge_into_section(self, target_section):
+        """
+        Merge the sections into ``target_section``.
+
+        Raises:
+            InvalidMergeSectionTypeError: If any of the sections is not an extend section.
+            InvalidMergeNotSameReferenceError: If the reference of any of the sections
+                does not match the reference of ``target_section``.
+        """
+        for source_section in self.source_sections:
+            source_section.check_can_merge_into_section(target_section=target_section)
+        if hasattr(target_section, '_rendered_description_html'):
+            del target_section._rendered_description_html
+        target_section._title = self._join(' ', target_section.title, 'title')
+        target_section._description = self._join('\n\n', target_section.description, 'description')
+        target_section._examples = self._join_examples(target_section.examples)
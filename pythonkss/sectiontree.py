@@ -1,3 +1,7 @@
+def _get_node_sort_tiebreak_key(node):
+    return node.sortkey, node.segment_text
+
+
 class SectionTreeNode(object):
     """
     A node in the :class:`.SectionTree`.
@@ -30,6 +34,9 @@ class SectionTreeNode(object):
         A dict mapping :attr:`~.SectionTreeNode.segment_text` to
         :class:`.SectionTreeNode` objects.
     """
+    __slots__ = ('children', 'segment_text', 'reference', 'section', 'level', 'root',
+                 'numbered_path_list', '_sorted_children')
+
     def __init__(self, segment_text=None, reference=None, level=-1, root=None):
         self.children = {}
         self.segment_text = segment_text
@@ -45,23 +52,52 @@ class SectionTreeNode(object):
         return self.children[segment_text]
 
     def add_section(self, remaining_segments, parent_segments, section, root):
-        segment_text = remaining_segments[0]
-        current_segments = parent_segments + [segment_text]
-        if segment_text not in self.children:
-            self.children[segment_text] = SectionTreeNode(
-                segment_text=segment_text,
-                reference='.'.join(current_segments),
-                level=self.level + 1,
-                root=root)
-
-        if len(remaining_segments) == 1:
-            self.children[segment_text].section = section
+        """
+        Add ``section`` to the tree below this node, creating virtual nodes
+        for any missing parents.
+
+        Args:
+            remaining_segments: The segments of the reference of the section
+                below this node.
+            parent_segments: The segments of the reference of this node. Only
+                used if this node has no :attr:`.reference`.
+            section: The :class:`pythonkss.section.Section`.
+            root: The :class:`.SectionTree`.
+        """
+        node = self
+        parent_reference = self.reference
+        if parent_reference is None and parent_segments:
+            parent_reference = '.'.join(parent_segments)
+        last_index = len(remaining_segments) - 1
+        for index, segment_text in enumerate(remaining_segments):
+            child = node.children.get(segment_text)
+            if child is None:
+                if index == last_index:
+                    reference = section.reference
+                elif parent_reference is None:
+                    reference = segment_text
+                else:
+                    reference = parent_reference + '.' + segment_text
+                child = SectionTreeNode(
+                    segment_text=segment_text,
+                    reference=reference,
+                    level=node.level + 1,
+                    root=root)
+                node.children[segment_text] = child
+            node = child
+            parent_reference = node.reference
+        node.section = section
+
+    def _sort_children_without_numbering(self):
+        if self.children:
+            self._sorted_children = sorted(self.children.values(), key=_get_node_sort_tiebreak_key)
         else:
-            self.children[segment_text].add_section(
-                remaining_segments=remaining_segments[1:],
-                section=section,
-                parent_segments=current_segments,
-                root=root)
+            self._sorted_children = []
+
+    def _sort_children(self):
+        self._sort_children_without_numbering()
+        for number, child in enumerate(self._sorted_children, 1):
+            child.numbered_path_list = self.numbered_path_list + [number]
 
     def _sort(self, numbered_path_list=None):
         """
@@ -70,13 +106,17 @@ class SectionTreeNode(object):
         This is called automatically by :meth:`.sorted_children`
         the first time it is called, so you should not need
         to call this directly.
+
+        Children with the same :meth:`.sortkey` are sorted by
+        :attr:`.segment_text`, so the result does not depend on the order
+        the sections were added in.
         """
-        self._sorted_children = sorted(self.children.values(), key=lambda node: node.sortkey)
         self.numbered_path_list = numbered_path_list or []
-        for number, child in enumerate(self._sorted_children, 1):
-            child._sort(
-                numbered_path_list = self.numbered_path_list + [number]
-            )
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._sort_children()
+            stack.extend(node._sorted_children)
 
     @property
     def dotted_numbered_path(self):
@@ -126,33 +166,49 @@ class SectionTreeNode(object):
         Get children sorted by :meth:`.sortkey`.
         """
         if not hasattr(self, '_sorted_children'):
-            self._sort()
+            self._sort(numbered_path_list=self.numbered_path_list)
         return self._sorted_children
 
+    def iter_descendants_sorted(self):
+        """
+        Iterate over all descendants in sorted order.
+
+        Yields each direct child and all its descendants before the next
+        child (and all its descendants). Does not recurse, so it works
+        for trees of any depth.
+
+        Returns:
+            iterator: Iterable of :class:`.SectionTreeNode` objects.
+        """
+        stack = [iter(self.sorted_children)]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                if child.children:
+                    stack.append(iter(child.sorted_children))
+                    break
+            else:
+                stack.pop()
+
     def collect_descendants_sorted(self, result):
         """
         Add all descendants in the provided result list
         in sorted order.
 
-        This runs recursively, and adds each direct child and all its descendants
-        before adding the next child (and all its descendants).
+        See :meth:`.iter_descendants_sorted`.
 
         Args:
             result: A list.
         """
-        for child in self.sorted_children:
-            result.append(child)
-            child.collect_descendants_sorted(result=result)
+        result.extend(self.iter_descendants_sorted())
 
     def sorted_all_descendants_flat(self):
         """
         Get a flat list of all descendants in sorted order.
 
-        Uses :meth:`.collect_descendants_sorted` to build the list.
+        See :meth:`.iter_descendants_sorted`.
         """
-        result = []
-        self.collect_descendants_sorted(result=result)
-        return result
+        return list(self.iter_descendants_sorted())
 
     def prettyformat(self, indent_level=False):
         """
@@ -189,8 +245,8 @@ class SectionTreeNode(object):
         """
         if self.segment_text:
             print(self.prettyformat(indent_level=True))
-        for child in self.sorted_children:
-            child.prettyprint_tree()
+        for node in self.iter_descendants_sorted():
+            print(node.prettyformat(indent_level=True))
 
 
 class SectionTree(SectionTreeNode):
@@ -205,11 +261,13 @@ class SectionTree(SectionTreeNode):
         the tree is just the root node with a different constructor
         and some extra functionality.
     """
+    __slots__ = ('sections', '_all_nodes_map')
+
     def __init__(self, sections):
         """
         Args:
-            sections: An iterable of :class:`pythonkss.section.Section`.
-                Must be sorted by :class:`pythonkss.section.Section.reference`.
+            sections: An iterable of :class:`pythonkss.section.Section`
+                in any order.
         """
         super(SectionTree, self).__init__()
         self.sections = sections
@@ -224,6 +282,139 @@ class SectionTree(SectionTreeNode):
                              root=self)
         self._sort()
 
+    def _get_parent_node(self, node):
+        if node.level == 0:
+            return self
+        return self._all_nodes_map[node.reference.rsplit('.', 1)[0]]
+
+    def _renumber_subtree(self, node):
+        """
+        Update the :attr:`~.SectionTreeNode.numbered_path_list` of all
+        the descendants of ``node`` after the numbered path of ``node`` changed.
+        Nodes that have not been sorted yet (new nodes) are sorted.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if hasattr(node, '_sorted_children'):
+                for number, child in enumerate(node._sorted_children, 1):
+                    child.numbered_path_list = node.numbered_path_list + [number]
+            else:
+                node._sort_children()
+            stack.extend(node._sorted_children)
+
+    def _resort_children(self, node):
+        """
+        Re-sort the children of ``node``, and renumber the children that
+        moved (or are new) and their descendants.
+        """
+        node._sort_children_without_numbering()
+        for number, child in enumerate(node._sorted_children, 1):
+            numbered_path_list = node.numbered_path_list + [number]
+            if child.numbered_path_list != numbered_path_list:
+                child.numbered_path_list = numbered_path_list
+                self._renumber_subtree(child)
+
+    def _find_deepest_existing_node(self, reference_segment_list):
+        node = self
+        for segment_text in reference_segment_list:
+            child = node.children.get(segment_text)
+            if child is None:
+                break
+            node = child
+        return node
+
+    def insert_section(self, section):
+        """
+        Add a section to the tree.
+
+        Missing virtual parent nodes are created. If the tree already has
+        a node with the reference of the section, the section is set on
+        that node (see :meth:`.update_section`). Only the parent of the topmost
+        changed node is re-sorted, and only nodes whose position changed
+        are renumbered.
+
+        Args:
+            section: A :class:`pythonkss.section.Section`.
+        """
+        if section.reference in self._all_nodes_map:
+            self.update_section(section)
+            return
+        parent = self._find_deepest_existing_node(section.reference_segment_list)
+        self.add_section(remaining_segments=section.reference_segment_list,
+                         parent_segments=[],
+                         section=section,
+                         root=self)
+        self._resort_children(parent)
+
+    def update_section(self, section):
+        """
+        Replace the section of the node with the same reference as ``section``.
+
+        The siblings are only re-sorted if the sortkey changed.
+
+        Args:
+            section: A :class:`pythonkss.section.Section`.
+
+        Raises:
+            KeyError: If the tree has no node with the reference of the section.
+        """
+        node = self._all_nodes_map[section.reference]
+        sortkey = node.sortkey
+        node.section = section
+        if node.sortkey != sortkey:
+            self._resort_children(self._get_parent_node(node))
+
+    def remove_section(self, reference):
+        """
+        Remove the section with the provided reference from the tree.
+
+        The node is kept as a virtual node if it has children. Virtual
+        nodes that no longer have any descendants with a section are removed.
+
+        Args:
+            reference: The reference of the section.
+
+        Raises:
+            KeyError: If the tree has no node with the reference.
+        """
+        node = self._all_nodes_map[reference]
+        sortkey = node.sortkey
+        node.section = None
+        pruned = False
+        while node is not self and node.section is None and not node.children:
+            parent = self._get_parent_node(node)
+            del parent.children[node.segment_text]
+            del self._all_nodes_map[node.reference]
+            node = parent
+            pruned = True
+        if pruned:
+            self._resort_children(node)
+        elif node.sortkey != sortkey:
+            self._resort_children(self._get_parent_node(node))
+
+    def update_sections(self, added_sections=(), changed_sections=(), removed_references=()):
+        """
+        Patch the tree with added, changed and removed sections.
+
+        Uses :meth:`.remove_section`, :meth:`.insert_section` and :meth:`.update_section`,
+        so only the affected parts of the tree are re-sorted and renumbered.
+        Used by :meth:`pythonkss.parser.Parser.refresh`.
+
+        Args:
+            added_sections: Iterable of :class:`pythonkss.section.Section` objects
+                with a reference that is not in the tree.
+            changed_sections: Iterable of :class:`pythonkss.section.Section` objects
+                that replace the section with the same reference in the tree.
+            removed_references: Iterable of references to remove sections for.
+        """
+        for reference in removed_references:
+            self.remove_section(reference)
+        for section in added_sections:
+            self.insert_section(section)
+        for section in changed_sections:
+            self.update_section(section)
+
     def register_node_in_root(self, node):
         self._all_nodes_map[node.reference] = node
 
@@ -0,0 +1,81 @@
+import os
+import re
+import threading
+
+
+class VariableSubstituter(object):
+    """
+    Replaces the keys of a variable map with their values in a single pass.
+
+    Used by :class:`pythonkss.comment.CommentParser`.
+
+    All the keys are compiled into a single regex, so the cost of substituting
+    does not grow with the number of variables. Texts that do not contain
+    the common prefix of all the keys (E.g.: ``{%`` with the default
+    ``variablepattern`` for :class:`pythonkss.parser.Parser`) are returned
+    without searching for variables.
+
+    .. note:: Values are not searched for variables. With the old approach of
+        calling ``str.replace()`` once for each key, a value containing another
+        key could be replaced again depending on the order of the variable map.
+    """
+    def __init__(self, variablemap):
+        """
+        Args:
+            variablemap (dict): Maps variable substitution strings to values.
+        """
+        self.variablemap = dict((key, value) for key, value in variablemap.items() if key)
+        keys = sorted(self.variablemap, key=len, reverse=True)
+        if keys:
+            # Longest first, so a key that is a prefix of another key does not hide it.
+            self._regex = re.compile('|'.join(re.escape(key) for key in keys))
+        else:
+            self._regex = None
+        self.prefix = os.path.commonprefix(keys)
+
+    def might_contain_variables(self, text):
+        """
+        Returns ``False`` if we are certain that ``text`` does not contain any variables.
+        """
+        return self._regex is not None and self.prefix in text
+
+    def _replace_match(self, match):
+        return self.variablemap[match.group(0)]
+
+    def substitute(self, text):
+        """
+        Replace all the variables in ``text`` with their values.
+        """
+        if not self.might_contain_variables(text):
+            return text
+        return self._regex.sub(self._replace_match, text)
+
+    def find_variables(self, text):
+        """
+        Get the keys of the variables used in ``text``.
+
+        Returns:
+            set: Set of variable map keys.
+        """
+        if not self.might_contain_variables(text):
+            return set()
+        return set(self._regex.findall(text))
+
+
+_substituter_cache = threading.local()
+
+
+def get_variable_substituter(variablemap):
+    """
+    Get a :class:`.VariableSubstituter` for ``variablemap``.
+
+    Compiling the regex for a large variable map is more expensive than
+    substituting variables in a single file, so we reuse the last substituter
+    (per thread) as long as the variable map is equal.
+    """
+    cached = getattr(_substituter_cache, 'cached', None)
+    if cached is not None and cached[0] == variablemap:
+        return cached[1]
+    substituter = VariableSubstituter(variablemap)
+    _substituter_cache.cached = (dict(variablemap), substituter)
+    return substituter
@@ -0,0 +1,395 @@
+"""
+Render the same styleguide with different variables without parsing it again.
+
+Example::
+
+    import pythonkss
+
+    parser = pythonkss.Parser('/path/to/my/styles/')
+    for theme, variables in themes.items():
+        variant = parser.variant(variables)
+        render_styleguide(theme, variant.as_tree())
+
+See :meth:`pythonkss.parser.Parser.variant`.
+"""
+import codecs
+import collections
+import re
+
+from pythonkss.example import Example
+from pythonkss.exceptions import ArgumentStringError
+from pythonkss.markdownformatter import string_types
+from pythonkss.parser import Parser
+from pythonkss.section import Section, STYLEGUIDE_KEYWORD, EXAMPLE_START
+from pythonkss.variables import get_variable_substituter
+
+
+#: Values starting with these can change how the line they are on is parsed.
+UNSAFE_VALUE_PREFIXES = (EXAMPLE_START, 'Title:')
+
+
+class TemplateString(object):
+    """
+    A string that may contain variable placeholders.
+
+    .. attribute:: text
+
+        The string with the placeholders.
+
+    .. attribute:: spans
+
+        List of ``(start, end)`` tuples with the position of each placeholder
+        in :attr:`.text`.
+    """
+    def __init__(self, text, placeholder_re):
+        """
+        Args:
+            text: The string.
+            placeholder_re: Compiled regex matching placeholders.
+        """
+        self.text = text
+        self.spans = [match.span() for match in placeholder_re.finditer(text)]
+
+    def has_placeholders(self):
+        """
+        Returns ``True`` if the string has any placeholders.
+        """
+        return len(self.spans) > 0
+
+    def render(self, substituter):
+        """
+        Get the string with the variables of ``substituter``
+        (a :class:`pythonkss.variables.VariableSubstituter`) applied.
+        """
+        if not self.spans:
+            return self.text
+        return substituter.substitute(self.text)
+
+
+class VariantSection(Section):
+    """
+    A :class:`pythonkss.section.Section` with the variables of a
+    :class:`.ParserVariant` applied.
+
+    If the description does not use any variables, :meth:`.description_html`
+    is memoized on the section this section was created from, so it is only
+    rendered once for all the variants.
+
+    .. attribute:: template_section
+
+        The section this section was created from.
+    """
+    __slots__ = ('template_section',)
+
+    @classmethod
+    def from_section(cls, section):
+        """
+        Make a copy of ``section`` as a :class:`.VariantSection`.
+        """
+        variant_section = cls.__new__(cls)
+        section._copy_attributes_to(variant_section)
+        if hasattr(variant_section, '_rendered_description_html'):
+            del variant_section._rendered_description_html
+        variant_section.template_section = section
+        return variant_section
+
+    def _get_description_html_section(self):
+        template_section = self.template_section
+        if self._get_description_html_cachekey() == template_section._get_description_html_cachekey():
+            return template_section
+        return None
+
+    @property
+    def description_html(self):
+        template_section = self._get_description_html_section()
+        if template_section is not None:
+            return template_section.description_html
+        return super(VariantSection, self).description_html
+
+    def has_rendered_description_html(self):
+        template_section = self._get_description_html_section()
+        if template_section is not None:
+            return template_section.has_rendered_description_html()
+        return super(VariantSection, self).has_rendered_description_html()
+
+    def set_rendered_description_html(self, html):
+        template_section = self._get_description_html_section()
+        if template_section is not None:
+            template_section.set_rendered_description_html(html)
+        else:
+            super(VariantSection, self).set_rendered_description_html(html)
+
+
+class SectionTemplate(object):
+    """
+    The parts of a :class:`pythonkss.section.Section` that can contain
+    variables, as :class:`.TemplateString` objects.
+    """
+    def __init__(self, section, placeholder_re):
+        self.section = section
+        self.title = TemplateString(section.title or '', placeholder_re)
+        self.description = TemplateString(section.description, placeholder_re)
+        self.examples = []
+        for example in section.examples:
+            self.examples.append((
+                example,
+                TemplateString(example.text, placeholder_re),
+                TemplateString(example.argumentstring or '', placeholder_re)))
+
+    def has_placeholders(self):
+        if self.title.has_placeholders() or self.description.has_placeholders():
+            return True
+        for example, text, argumentstring in self.examples:
+            if text.has_placeholders() or argumentstring.has_placeholders():
+                return True
+        return False
+
+    def _make_example(self, example, text, argumentstring, substituter):
+        if not text.has_placeholders() and not argumentstring.has_placeholders():
+            return example
+        return Example(
+            text=text.render(substituter),
+            filename=example.filename,
+            argumentstring=None if example.argumentstring is None else argumentstring.render(substituter),
+            html_output_mode=example.html_output_mode)
+
+    def make_section(self, substituter):
+        """
+        Make a section with the variables of ``substituter`` applied.
+
+        Returns the template section itself if it does not use any variables.
+        """
+        if not self.has_placeholders():
+            return self.section
+        section = VariantSection.from_section(self.section)
+        section.comment = substituter.substitute(self.section.comment)
+        if self.section.title is not None:
+            section._title = self.title.render(substituter)
+        section._description = self.description.render(substituter)
+        section._examples = [
+            self._make_example(example, text, argumentstring, substituter=substituter)
+            for example, text, argumentstring in self.examples]
+        return section
+
+
+def get_placeholder_affixes(variablepattern):
+    """
+    Get the text before and after the variable name in ``variablepattern``
+    (E.g.: ``('{% ', ' %}')`` for ``'{{% {variable} %}}'``).
+
+    Returns:
+        tuple: ``(prefix, suffix)``. Both are empty strings if the pattern does not
+        contain ``{variable}`` exactly once.
+    """
+    placeholder = variablepattern.format(variable='\x00')
+    if placeholder.count('\x00') != 1:
+        return '', ''
+    prefix, suffix = placeholder.split('\x00')
+    return prefix, suffix
+
+
+def _is_safe_variable_key(key, prefix, suffix):
+    if not key.startswith(prefix) or not key.endswith(suffix):
+        return False
+    name = key[len(prefix):len(key) - len(suffix)]
+    return prefix not in name and suffix not in name and '\n' not in name
+
+
+def _is_safe_variable_value(value):
+    return isinstance(value, string_types) and bool(value) and value == value.strip() \
+        and len(value.splitlines()) == 1 \
+        and STYLEGUIDE_KEYWORD not in value \
+        and not value.startswith(UNSAFE_VALUE_PREFIXES)
+
+
+def can_apply_variables_after_parsing(variablemap, variablepattern):
+    """
+    Returns ``True`` if applying the variables in ``variablemap`` after parsing
+    gives the same result as applying them before parsing (given that no
+    variables are used in the ``Styleguide`` line).
+
+    This is the case as long as the values can not change the structure of
+    the comments, so they must be single line strings without leading or trailing
+    whitespace, and they can not contain ``Styleguide`` or start with
+    ``Example:`` or ``Title:``.
+    """
+    prefix, suffix = get_placeholder_affixes(variablepattern)
+    if not prefix or not suffix:
+        return False
+    for key, value in variablemap.items():
+        if not _is_safe_variable_key(key, prefix, suffix) or not _is_safe_variable_value(value):
+            return False
+    return True
+
+
+class VariantTemplate(object):
+    """
+    The sections of a :class:`pythonkss.parser.Parser` parsed without variables,
+    as :class:`.SectionTemplate` objects. Created once for each parser by
+    :meth:`pythonkss.parser.Parser.variant`, and shared by all the variants.
+
+    .. attribute:: has_placeholders_in_references
+
+        ``True`` if any of the files use variables in a ``Styleguide`` line.
+        Those comments are not parsed as sections without the variables,
+        so variants can not be made from this template.
+
+    .. attribute:: has_placeholders_in_example_arguments
+
+        ``True`` if any of the files use variables in the argument string
+        of an ``Example:`` line. Argument strings are parsed as YAML when the
+        examples are created, and the placeholders are not valid YAML,
+        so variants can not be made from this template.
+    """
+    def __init__(self, parser):
+        """
+        Args:
+            parser: A :class:`pythonkss.parser.Parser` without ``variables``.
+        """
+        self.parser = parser
+        self.placeholder_prefix, self.placeholder_suffix = get_placeholder_affixes(parser.variablepattern)
+        self.has_placeholders_in_references, self.has_placeholders_in_example_arguments = \
+            self._find_unsupported_placeholders()
+        self.section_templates = []
+        if self.can_make_variants():
+            placeholder_re = re.compile(
+                re.escape(self.placeholder_prefix) + r'.*?' + re.escape(self.placeholder_suffix),
+                re.DOTALL)
+            try:
+                self.section_templates = [
+                    SectionTemplate(section, placeholder_re=placeholder_re)
+                    for section in parser.sections.values()]
+            except ArgumentStringError:
+                # Placeholders in an argument string we did not detect. Parsing the
+                # files with the variables gives the same result as a Parser would.
+                self.has_placeholders_in_example_arguments = True
+
+    def can_make_variants(self):
+        """
+        Returns ``True`` if variants can be made from this template.
+        """
+        return not self.has_placeholders_in_references and not self.has_placeholders_in_example_arguments
+
+    def _find_unsupported_placeholders(self):
+        if not self.placeholder_prefix:
+            return True, False
+        escaped_prefix = re.escape(self.placeholder_prefix)
+        reference_re = re.compile(re.escape(STYLEGUIDE_KEYWORD) + r'[^\n]*' + escaped_prefix)
+        example_arguments_re = re.compile(re.escape(EXAMPLE_START) + r'[^\n]*' + escaped_prefix)
+        has_placeholders_in_example_arguments = False
+        for filepath in self.parser.find_files():
+            with codecs.open(filepath, 'r', 'utf-8') as fileobj:
+                text = fileobj.read()
+            if reference_re.search(text):
+                return True, has_placeholders_in_example_arguments
+            if not has_placeholders_in_example_arguments and example_arguments_re.search(text):
+                has_placeholders_in_example_arguments = True
+        return False, has_placeholders_in_example_arguments
+
+    def make_sections(self, variablemap):
+        """
+        Make the sections for a variant.
+
+        Returns:
+            OrderedDict: Same format as :meth:`pythonkss.parser.Parser.sections`.
+        """
+        substituter = get_variable_substituter(variablemap)
+        sections = collections.OrderedDict()
+        for section_template in self.section_templates:
+            section = section_template.make_section(substituter=substituter)
+            sections[section.reference] = section
+        return sections
+
+
+class ParserVariant(Parser):
+    """
+    A :class:`pythonkss.parser.Parser` with other ``variables`` than the parser
+    it was created from with :meth:`pythonkss.parser.Parser.variant`.
+
+    If the variables can be applied after parsing (see
+    :func:`.can_apply_variables_after_parsing`), the sections are made from
+    the sections of the parser parsed without variables, so no files are parsed
+    for the variant. Sections and examples that do not use any variables are
+    shared with the other variants of the same parser, and so is the HTML
+    memoized for them. Otherwise, the variant parses the files with its variables
+    just like any other :class:`pythonkss.parser.Parser`.
+
+    A variant made from the template has no parsed state for the files, so
+    :meth:`.parse`, :meth:`.iter_sections`, :meth:`.refresh`, :meth:`.find_changed_files`,
+    :meth:`.update_variables`, :meth:`.get_sections_using_variables` and
+    :meth:`.multiblockparser` make it stop using the template and parse the files with
+    its variables, just like any other :class:`pythonkss.parser.Parser`. Sections and
+    trees returned before that are not updated.
+    """
+    def __init__(self, parser, variables):
+        """
+        Args:
+            parser: The :class:`pythonkss.parser.Parser` this is a variant of.
+            variables (dict): See :class:`pythonkss.parser.Parser`.
+        """
+        kwargs = parser._get_init_kwargs()
+        kwargs['variables'] = variables
+        super(ParserVariant, self).__init__(*parser.paths, **kwargs)
+        self._template_parser = parser
+
+    @property
+    def template(self):
+        """
+        The :class:`.VariantTemplate` the sections are made from, or
+        ``None`` if the variant parses the files.
+        """
+        if not hasattr(self, '_template'):
+            self._template = None
+            if can_apply_variables_after_parsing(self._make_variablemap(), self.variablepattern):
+                template = self._template_parser._get_variant_template()
+                if template.can_make_variants():
+                    self._template = template
+            del self._template_parser
+        return self._template
+
+    def _stop_using_template(self):
+        """
+        Make the variant parse the files with its variables from now on.
+        """
+        if self.template is not None:
+            self._template = None
+            for attribute in ('_variant_sections', '_built_tree'):
+                if hasattr(self, attribute):
+                    delattr(self, attribute)
+
+    def parse(self):
+        self._stop_using_template()
+        return super(ParserVariant, self).parse()
+
+    def iter_sections(self):
+        self._stop_using_template()
+        return super(ParserVariant, self).iter_sections()
+
+    def refresh(self):
+        self._stop_using_template()
+        return super(ParserVariant, self).refresh()
+
+    def find_changed_files(self):
+        self._stop_using_template()
+        return super(ParserVariant, self).find_changed_files()
+
+    def update_variables(self, variables):
+        self._stop_using_template()
+        return super(ParserVariant, self).update_variables(variables)
+
+    def get_sections_using_variables(self, variables):
+        self._stop_using_template()
+        return super(ParserVariant, self).get_sections_using_variables(variables)
+
+    @property
+    def multiblockparser(self):
+        self._stop_using_template()
+        return super(ParserVariant, self).multiblockparser
+
+    @property
+    def sections(self):
+        if self.template is None:
+            return super(ParserVariant, self).sections
+        if not hasattr(self, '_variant_sections'):
+            self._variant_sections = self.template.make_sections(self._make_variablemap())
+        return self._variant_sections
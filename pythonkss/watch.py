@@ -0,0 +1,330 @@
+"""
+Watch the style files of a :class:`pythonkss.parser.Parser` for changes.
+
+Example::
+
+    import pythonkss
+    from pythonkss import watch
+
+    parser = pythonkss.Parser('/path/to/my/styles/')
+    for event in watch.Watcher(parser).iter_events():
+        if isinstance(event, watch.RefreshFailed):
+            show_error(event.exception)
+        elif isinstance(event, watch.TreeReordered):
+            rerender_navigation(event.tree)
+        elif isinstance(event, watch.SectionRemoved):
+            remove_page(event.reference)
+        else:
+            render_page(event.section)
+
+Changes are detected with inotify if the optional ``inotify_simple``
+package is installed and the platform supports it, and by polling
+file sizes and mtimes otherwise.
+"""
+import os
+import time
+
+from pythonkss.filefinder import get_filestat
+
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover
+    inotify_simple = None
+
+
+class SectionEvent(object):
+    """
+    Base class for section events.
+
+    .. attribute:: reference
+
+        The reference of the section.
+
+    .. attribute:: section
+
+        The :class:`pythonkss.section.Section`. ``None`` for :class:`.SectionRemoved`.
+    """
+    def __init__(self, reference, section=None):
+        self.reference = reference
+        self.section = section
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.reference)
+
+
+class SectionAdded(SectionEvent):
+    """
+    A section with a new reference was added.
+    """
+
+
+class SectionChanged(SectionEvent):
+    """
+    A section was re-parsed or re-merged.
+    """
+
+
+class SectionRemoved(SectionEvent):
+    """
+    A section was removed.
+    """
+
+
+class TreeReordered(object):
+    """
+    The sorted order or the numbering of the nodes in the
+    :class:`pythonkss.sectiontree.SectionTree` changed.
+
+    .. attribute:: tree
+
+        The :class:`pythonkss.sectiontree.SectionTree`.
+    """
+    def __init__(self, tree):
+        self.tree = tree
+
+    def __repr__(self):
+        return 'TreeReordered()'
+
+
+class RefreshFailed(object):
+    """
+    :meth:`pythonkss.parser.Parser.refresh` raised an exception
+    (E.g.: a :class:`pythonkss.exceptions.DuplicateReferenceError` while
+    a file is being edited).
+
+    The parser is left unchanged by the failed refresh, so the
+    changes are picked up by the next refresh after the files change again.
+
+    .. attribute:: exception
+
+        The exception.
+    """
+    def __init__(self, exception):
+        self.exception = exception
+
+    def __repr__(self):
+        return 'RefreshFailed({!r})'.format(self.exception)
+
+
+class PollingBackend(object):
+    """
+    Detects changes by comparing the size and mtime of all the files
+    found by :meth:`pythonkss.parser.Parser.find_files`.
+    """
+    def __init__(self, parser, interval=1.0):
+        """
+        Args:
+            parser: A :class:`pythonkss.parser.Parser`.
+            interval: Seconds between each check.
+        """
+        self.parser = parser
+        self.interval = interval
+        self._snapshot = self._make_snapshot()
+
+    def _make_snapshot(self):
+        snapshot = {}
+        for filepath in self.parser.find_files():
+            try:
+                snapshot[filepath] = get_filestat(filepath)
+            except OSError:
+                pass
+        return snapshot
+
+    def wait(self, timeout):
+        """
+        Wait at most ``timeout`` seconds for changes.
+
+        Returns:
+            bool: ``True`` if anything changed.
+        """
+        time.sleep(min(self.interval, timeout))
+        snapshot = self._make_snapshot()
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyBackend(object):
+    """
+    Detects changes using inotify. Requires the ``inotify_simple`` package.
+
+    Only the directories searched by :meth:`pythonkss.parser.Parser.find_files`
+    are watched, and changes to files and directories that
+    :meth:`pythonkss.parser.Parser.find_files` would skip are ignored.
+    """
+    def __init__(self, parser):
+        """
+        Args:
+            parser: A :class:`pythonkss.parser.Parser`.
+        """
+        self.parser = parser
+        self._filefinder = parser.make_file_finder()
+        flags = inotify_simple.flags
+        self._flags = 0
+        for flag in (flags.CREATE, flags.DELETE, flags.MODIFY, flags.CLOSE_WRITE,
+                     flags.MOVED_FROM, flags.MOVED_TO, flags.DELETE_SELF):
+            self._flags |= flag
+        self._inotify = inotify_simple.INotify()
+        self._watched_directories = {}
+        self._watch_directories(paths=parser.paths)
+
+    def _watch_directory(self, directorypath):
+        try:
+            watch_descriptor = self._inotify.add_watch(directorypath, self._flags)
+        except OSError:
+            return
+        self._watched_directories[watch_descriptor] = directorypath
+
+    def _watch_directories(self, paths):
+        for directorypath in self._filefinder.iter_directories(paths=paths):
+            self._watch_directory(directorypath)
+
+    def _is_relevant_event(self, event):
+        directorypath = self._watched_directories.get(event.wd)
+        if directorypath is None or not event.name:
+            # Events for the watched directory itself (E.g.: DELETE_SELF).
+            return True
+        path = os.path.join(directorypath, event.name)
+        if event.mask & inotify_simple.flags.ISDIR:
+            if not self._filefinder.might_contain_files(path):
+                return False
+            if event.mask & (inotify_simple.flags.CREATE | inotify_simple.flags.MOVED_TO):
+                self._watch_directories(paths=[path])
+            return True
+        return self._filefinder.includes_file(path)
+
+    def wait(self, timeout):
+        """
+        Wait at most ``timeout`` seconds for changes.
+
+        Returns:
+            bool: ``True`` if any relevant files or directories changed.
+        """
+        events = self._inotify.read(timeout=int(timeout * 1000))
+        changed = False
+        for event in events:
+            if self._is_relevant_event(event):
+                changed = True
+        return changed
+
+    def close(self):
+        self._inotify.close()
+
+
+def make_default_backend(parser, interval=1.0):
+    """
+    Get a :class:`.InotifyBackend` if inotify is available,
+    and a :class:`.PollingBackend` if not.
+    """
+    if inotify_simple is not None:
+        try:
+            return InotifyBackend(parser=parser)
+        except OSError:  # pragma: no cover
+            pass
+    return PollingBackend(parser=parser, interval=interval)
+
+
+class Watcher(object):
+    """
+    Watches the files of a :class:`pythonkss.parser.Parser`, and
+    uses :meth:`pythonkss.parser.Parser.refresh` to re-parse only the
+    changed files.
+    """
+    def __init__(self, parser, interval=1.0, debounce=0.2, backend=None):
+        """
+        Args:
+            parser: A :class:`pythonkss.parser.Parser`.
+            interval: Seconds between each check for changes when polling.
+            debounce: Wait until no files have changed for this many seconds
+                before re-parsing, so a burst of saves only gives one refresh.
+            backend: The backend used to detect changes. Defaults to the one
+                returned by :func:`.make_default_backend`.
+        """
+        self.parser = parser
+        self.debounce = debounce
+        self.parser.as_tree()
+        self.backend = backend or make_default_backend(parser=parser, interval=interval)
+        self._numbered_paths = self._get_numbered_paths()
+
+    def _get_numbered_paths(self):
+        return dict((node.reference, node.dotted_numbered_path)
+                    for node in self.parser.as_tree().sorted_all_descendants_flat())
+
+    def _make_events(self, changes):
+        events = []
+        sections = self.parser.sections
+        for reference in sorted(changes.added_references):
+            events.append(SectionAdded(reference=reference, section=sections[reference]))
+        for reference in sorted(changes.changed_references):
+            events.append(SectionChanged(reference=reference, section=sections[reference]))
+        for reference in sorted(changes.removed_references):
+            events.append(SectionRemoved(reference=reference))
+        if changes.has_section_changes():
+            numbered_paths = self._get_numbered_paths()
+            if numbered_paths != self._numbered_paths:
+                self._numbered_paths = numbered_paths
+                events.append(TreeReordered(tree=self.parser.as_tree()))
+        return events
+
+    def refresh(self):
+        """
+        Refresh the parser, and get the resulting events.
+
+        Returns:
+            list: List of :class:`.SectionAdded`, :class:`.SectionChanged`,
+            :class:`.SectionRemoved` and :class:`.TreeReordered` objects,
+            or a list with a single :class:`.RefreshFailed` if the refresh
+            raised an exception.
+        """
+        try:
+            changes = self.parser.refresh()
+        except Exception as exception:
+            return [RefreshFailed(exception=exception)]
+        return self._make_events(changes)
+
+    def wait_for_events(self, timeout=None):
+        """
+        Wait until files change, and the changes have settled for
+        ``debounce`` seconds, then refresh the parser and return the events.
+
+        Args:
+            timeout: Max seconds to wait for the first change. ``None`` means wait forever.
+
+        Returns:
+            list: See :meth:`.refresh`. Empty if nothing changed within ``timeout``,
+            or if the changed files did not change any sections.
+        """
+        start = time.time()
+        while not self.backend.wait(timeout=self._get_wait_timeout(start, timeout)):
+            if timeout is not None and time.time() - start >= timeout:
+                return []
+        while self.backend.wait(timeout=self.debounce):
+            pass
+        return self.refresh()
+
+    def _get_wait_timeout(self, start, timeout):
+        if timeout is None:
+            return 1.0
+        return max(0, min(1.0, timeout - (time.time() - start)))
+
+    def iter_events(self):
+        """
+        Iterate over events forever (or until :meth:`.close` is called).
+
+        A refresh that fails yields a :class:`.RefreshFailed` event
+        instead of stopping the iteration.
+        """
+        while self.backend is not None:
+            for event in self.wait_for_events(timeout=1.0):
+                yield event
+
+    def close(self):
+        """
+        Stop watching.
+        """
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
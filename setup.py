@@ -41,5 +41,8 @@ setup(
             'mock',
             'pytest',
         ],
+        'watch': [
+            'inotify_simple',
+        ],
     },
 )
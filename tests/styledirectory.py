@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def get_fixture_path(*path):
+    return os.path.join(FIXTURES_DIRECTORY, *path)
+
+
+class TemporaryStyleDirectory(object):
+    """
+    A temporary directory with style files for tests that change
+    files on disk.
+
+    Args:
+        testcase: The ``unittest.TestCase`` using the directory. The
+            directory is removed when the test finishes.
+        fixture: Name of a directory in ``tests/fixtures/`` to copy
+            into the directory.
+    """
+    def __init__(self, testcase, fixture=None):
+        self.path = tempfile.mkdtemp()
+        testcase.addCleanup(shutil.rmtree, self.path)
+        self._mtime = 1000000
+        if fixture:
+            fixturepath = get_fixture_path(fixture)
+            for filename in sorted(os.listdir(fixturepath)):
+                with open(os.path.join(fixturepath, filename)) as fileobj:
+                    self.write(filename, fileobj.read())
+
+    def join(self, *path):
+        return os.path.join(self.path, *path)
+
+    def write(self, filename, content):
+        """
+        Write ``content`` to ``filename``, and return the path of the file.
+
+        Every write gets a later mtime than the previous write, so
+        changes are detected even on filesystems with low mtime resolution.
+        """
+        filepath = self.join(filename)
+        with open(filepath, 'w') as fileobj:
+            fileobj.write(content)
+        self._mtime += 10
+        os.utime(filepath, (self._mtime, self._mtime))
+        return filepath
+
+    def write_comments(self, filename, *comments):
+        """
+        Write each of ``comments`` as a ``/* ... */`` comment block to ``filename``.
+        """
+        return self.write(filename, ''.join('/*\n{}\n*/\n\n'.format(comment) for comment in comments))
+
+    def remove(self, filename):
+        os.remove(self.join(filename))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import codecs
 import os
 import unittest
 
@@ -94,3 +95,64 @@ class CommentVariablesTestCase(unittest.TestCase):
         }).blocks
         self.assertEqual('The value of $test-variable is 10px.', comments[0])
         self.assertEqual('Another variable: hello.', comments[1])
+
+    def test_iter_blocks_with_variables(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'fixtures', 'variables_in_comments.txt')
+        commentparser = comment.CommentParser(filepath, variablemap={
+            '{% $test-variable %}': '10px',
+            '{% another-variable %}': 'hello'
+        })
+        self.assertEqual(list(commentparser.iter_blocks()), commentparser.blocks)
+
+    def test_iter_raw_and_blocks(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'fixtures', 'variables_in_comments.txt')
+        commentparser = comment.CommentParser(filepath, variablemap={
+            '{% $test-variable %}': '10px',
+        })
+        rawcommentblock, commentblock = next(commentparser.iter_raw_and_blocks())
+        self.assertEqual('The value of $test-variable is {% $test-variable %}.', rawcommentblock)
+        self.assertEqual('The value of $test-variable is 10px.', commentblock)
+
+
+class IterCommentBlocksTestCase(unittest.TestCase):
+    def assert_same_as_by_line(self, text):
+        self.assertEqual(
+            list(comment.iter_comment_blocks(text)),
+            list(comment.iter_comment_blocks_by_line(text.splitlines(True))))
+
+    def test_fixture(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'fixtures', 'comments.txt')
+        with codecs.open(filepath, 'r', 'utf-8') as fileobj:
+            text = fileobj.read()
+        self.assert_same_as_by_line(text)
+        self.assert_same_as_by_line(text.replace('\n', '\r\n'))
+        self.assert_same_as_by_line(text.replace('\n', '\r'))
+
+    def test_single_line_block_at_end_of_file_is_ignored(self):
+        self.assertEqual(list(comment.iter_comment_blocks('// a\n// b\n')), [])
+        self.assertEqual(list(comment.iter_comment_blocks('// a\n// b\n\n')), ['a\nb'])
+
+    def test_unterminated_multi_line_comment_is_ignored(self):
+        self.assertEqual(list(comment.iter_comment_blocks('/* a\nb\n')), [])
+
+    def test_single_line_comment_does_not_end_multi_line_comment(self):
+        self.assert_same_as_by_line('/* a\n// b */\nc */\n')
+        self.assertEqual(list(comment.iter_comment_blocks('/* a\n// b */\nc */\n')), ['a\n// b\nc'])
+
+    def test_multi_line_comment_replaces_single_line_block(self):
+        self.assert_same_as_by_line('// a\n/* b */\n')
+        self.assertEqual(list(comment.iter_comment_blocks('// a\n/* b */\n')), ['b'])
+
+    def test_mixed(self):
+        self.assert_same_as_by_line(
+            'a { }\n'
+            '  // one\n'
+            '  //two\n'
+            'b { } /* trailing */\n'
+            '/* x\n'
+            ' * y\n'
+            '   z */ c { }\n'
+            '/**/\n'
+            '\t/* tab */\n'
+            '//\n'
+            '\n')
@@ -0,0 +1,58 @@
+import unittest
+
+import mock
+
+from pythonkss import example as examplemodule
+from pythonkss.example import Example, parse_argumentstring
+from pythonkss.exceptions import ArgumentStringError
+
+
+class ParseArgumentstringTestCase(unittest.TestCase):
+    def setUp(self):
+        examplemodule._argumentstring_cache.clear()
+
+    def test_title_only(self):
+        self.assertEqual(parse_argumentstring('A title'), ('A title', {}))
+
+    def test_flat(self):
+        with mock.patch.object(examplemodule.yaml, 'load') as load:
+            self.assertEqual(
+                parse_argumentstring('{syntax: scss, height: 300, code: no, preview: null} A title'),
+                ('A title', {'syntax': 'scss', 'height': 300, 'code': False, 'preview': None}))
+            self.assertFalse(load.called)
+
+    def test_empty(self):
+        self.assertEqual(parse_argumentstring('{}'), ('', {}))
+
+    def test_yaml_fallback(self):
+        self.assertEqual(
+            parse_argumentstring('{syntax: "scss", height: 1.5, tags: [a, b]}'),
+            ('', {'syntax': 'scss', 'height': 1.5, 'tags': ['a', 'b']}))
+
+    def test_same_as_yaml(self):
+        for arguments in ['type: isolated, syntax: css', 'a: -1, b: 0, c: 010, d: 1_000',
+                          'a: yes, b: Off, c: TRUE, d: y', 'a:b', 'yes: 1', 'a: b,']:
+            self.assertEqual(
+                parse_argumentstring('{' + arguments + '}')[1],
+                examplemodule.yaml.safe_load('{' + arguments + '}'), arguments)
+
+    def test_invalid(self):
+        with self.assertRaises(ArgumentStringError):
+            parse_argumentstring('{syntax: [scss} A title')
+
+    def test_unsafe_tag(self):
+        with self.assertRaises(ArgumentStringError):
+            parse_argumentstring('{a: !!python/object/apply:os.getcwd []}')
+
+    def test_memoized(self):
+        title, argumentdict = parse_argumentstring('{syntax: scss}')
+        argumentdict['syntax'] = 'changed'
+        with mock.patch.object(examplemodule, '_parse_flat_arguments') as parse_flat_arguments:
+            self.assertEqual(parse_argumentstring('{syntax: scss}'), ('', {'syntax': 'scss'}))
+            self.assertFalse(parse_flat_arguments.called)
+
+    def test_example(self):
+        example = Example('<p>a</p>', argumentstring=' {syntax: css, height: 300} A title ')
+        self.assertEqual(example.title, 'A title')
+        self.assertEqual(example.syntax, 'css')
+        self.assertEqual(example.height, 300)
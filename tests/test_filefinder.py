@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pythonkss.filefinder import FileFinder, FilenamePatternMatcher
+
+
+class FilenamePatternMatcherTestCase(unittest.TestCase):
+    def test_matches(self):
+        matcher = FilenamePatternMatcher(['*find_files/buttons.css', '*advanced/form-*'])
+        self.assertTrue(matcher.matches('/a/find_files/buttons.css'))
+        self.assertTrue(matcher.matches('/a/advanced/form-inputs.css'))
+        self.assertFalse(matcher.matches('/a/advanced/menu.css'))
+
+    def test_matches_no_patterns(self):
+        self.assertFalse(FilenamePatternMatcher([]).matches('/a/buttons.css'))
+
+    def test_can_match_below_leading_wildcard(self):
+        matcher = FilenamePatternMatcher(['*mytheme/*'])
+        self.assertTrue(matcher.can_match_below('/a/node_modules'))
+
+    def test_can_match_below_literal_prefix(self):
+        matcher = FilenamePatternMatcher(['/styles/mytheme/*', '/styles/other/buttons.scss'])
+        self.assertTrue(matcher.can_match_below('/styles'))
+        self.assertTrue(matcher.can_match_below('/styles/mytheme'))
+        self.assertTrue(matcher.can_match_below('/styles/mytheme/sub'))
+        self.assertTrue(matcher.can_match_below('/styles/other'))
+        self.assertFalse(matcher.can_match_below('/styles/other/sub'))
+        self.assertFalse(matcher.can_match_below('/styles/node_modules'))
+        self.assertFalse(matcher.can_match_below('/styles/mythemeextra'))
+
+
+class FileFinderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def __make_file(self, *path):
+        filepath = os.path.join(self.directory, *path)
+        if not os.path.exists(os.path.dirname(filepath)):
+            os.makedirs(os.path.dirname(filepath))
+        open(filepath, 'w').close()
+        return filepath
+
+    def __relative(self, filepaths):
+        return [os.path.relpath(filepath, self.directory) for filepath in filepaths]
+
+    def test_sorted_files_before_subdirectories(self):
+        self.__make_file('b.css')
+        self.__make_file('a', 'c.css')
+        self.__make_file('a.css')
+        self.__make_file('a', 'b', 'd.css')
+        filepaths = FileFinder(paths=[self.directory], extensions=['.css']).iter_files()
+        self.assertEqual(self.__relative(filepaths), [
+            'a.css', 'b.css', os.path.join('a', 'c.css'), os.path.join('a', 'b', 'd.css')])
+
+    def test_extensions(self):
+        self.__make_file('a.css')
+        self.__make_file('b.scss')
+        self.__make_file('c.txt')
+        filepaths = FileFinder(paths=[self.directory], extensions=['.css', '.scss']).iter_files()
+        self.assertEqual(self.__relative(filepaths), ['a.css', 'b.scss'])
+
+    def test_overlapping_paths(self):
+        self.__make_file('a.css')
+        self.__make_file('sub', 'b.css')
+        filepaths = FileFinder(
+            paths=[os.path.join(self.directory, 'sub'), self.directory],
+            extensions=['.css']).iter_files()
+        self.assertEqual(self.__relative(filepaths), [os.path.join('sub', 'b.css'), 'a.css'])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'Requires os.symlink')
+    def test_symlinked_file(self):
+        filepath = self.__make_file('a.css')
+        os.symlink(filepath, os.path.join(self.directory, 'b.css'))
+        filepaths = FileFinder(paths=[self.directory], extensions=['.css']).iter_files()
+        self.assertEqual(self.__relative(filepaths), ['a.css'])
+
+    def test_filename_patterns_prune(self):
+        self.__make_file('mytheme', 'a.css')
+        self.__make_file('node_modules', 'mytheme', 'b.css')
+        filefinder = FileFinder(
+            paths=[self.directory], extensions=['.css'],
+            filename_patterns=[os.path.join(self.directory, 'mytheme', '*')])
+        self.assertEqual(self.__relative(filefinder.iter_files()), [os.path.join('mytheme', 'a.css')])
+
+    def test_exclude_directory_patterns(self):
+        self.__make_file('mytheme', 'a.css')
+        self.__make_file('node_modules', 'b.css')
+        self.__make_file('.git', 'c.css')
+        filefinder = FileFinder(
+            paths=[self.directory], extensions=['.css'],
+            exclude_directory_patterns=['node_modules', '.*'])
+        self.assertEqual(self.__relative(filefinder.iter_files()), [os.path.join('mytheme', 'a.css')])
+
+    def test_nonexisting_path(self):
+        filefinder = FileFinder(paths=[os.path.join(self.directory, 'nope')], extensions=['.css'])
+        self.assertEqual(list(filefinder.iter_files()), [])
+
+    def test_iter_directories(self):
+        self.__make_file('mytheme', 'sub', 'a.css')
+        self.__make_file('node_modules', 'b.css')
+        filefinder = FileFinder(
+            paths=[self.directory], extensions=['.css'],
+            exclude_directory_patterns=['node_modules'])
+        self.assertEqual(self.__relative(filefinder.iter_directories()),
+                         ['.', 'mytheme', os.path.join('mytheme', 'sub')])
+        self.assertEqual(self.__relative(filefinder.iter_directories(paths=[os.path.join(self.directory, 'mytheme')])),
+                         ['mytheme', os.path.join('mytheme', 'sub')])
+
+    def test_might_contain_files_and_includes_file(self):
+        filefinder = FileFinder(
+            paths=[self.directory], extensions=['.css'],
+            exclude_directory_patterns=['node_modules'])
+        self.assertTrue(filefinder.might_contain_files(os.path.join(self.directory, 'mytheme')))
+        self.assertFalse(filefinder.might_contain_files(os.path.join(self.directory, 'node_modules')))
+        self.assertTrue(filefinder.includes_file(os.path.join(self.directory, 'removed.css')))
+        self.assertFalse(filefinder.includes_file(os.path.join(self.directory, 'notes.txt')))
@@ -0,0 +1,223 @@
+import random
+import threading
+import unittest
+
+import mock
+
+from pythonkss.markdownformatter import MarkdownFormatter
+from pythonkss.rendercache import RenderCache
+
+
+class MarkdownFormatterTestCase(unittest.TestCase):
+    def test_to_html(self):
+        self.assertEqual('<p>\n   Hello\n  </p>', MarkdownFormatter.to_html('Hello'))
+
+    def test_get_markdown_reused(self):
+        self.assertIs(MarkdownFormatter(markdowntext='a').get_markdown(),
+                      MarkdownFormatter(markdowntext='b').get_markdown())
+
+    def test_get_markdown_per_thread(self):
+        markdown_objects = []
+        thread = threading.Thread(target=lambda: markdown_objects.append(
+            MarkdownFormatter(markdowntext='a').get_markdown()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(markdown_objects[0], MarkdownFormatter(markdowntext='a').get_markdown())
+
+    def test_get_markdown_subclass_with_other_extensions(self):
+        class NoCodeHiliteMarkdownFormatter(MarkdownFormatter):
+            markdown_extensions = ['fenced_code']
+
+        self.assertIsNot(NoCodeHiliteMarkdownFormatter(markdowntext='a').get_markdown(),
+                         MarkdownFormatter(markdowntext='a').get_markdown())
+        self.assertNotIn('codehilite', NoCodeHiliteMarkdownFormatter.to_html('```html\n<b>a</b>\n```'))
+        self.assertIn('codehilite', MarkdownFormatter.to_html('```html\n<b>a</b>\n```'))
+
+    def test_header_shift(self):
+        html = MarkdownFormatter.to_html('# A\n## B\n### C\n#### D')
+        self.assertEqual(
+            html,
+            '<h3>\n   A\n  </h3>\n  <h4>\n   B\n  </h4>\n'
+            '  <h5>\n   C\n  </h5>\n  <h4>\n   D\n  </h4>')
+
+    def test_header_shift_does_not_change_raw_html(self):
+        self.assertIn('<h1>', MarkdownFormatter.to_html('<h1>raw</h1>'))
+
+    def test_beautifulsoup_header_shift(self):
+        class BeautifulSoupMarkdownFormatter(MarkdownFormatter):
+            beautifulsoup_header_shift = True
+
+        markdowntext = '# A\n## B\n### C\n#### D'
+        self.assertEqual(BeautifulSoupMarkdownFormatter.to_html(markdowntext),
+                         MarkdownFormatter.to_html(markdowntext))
+        self.assertIn('<h3>', BeautifulSoupMarkdownFormatter.to_html('<h1>raw</h1>'))
+
+    def test_compact_output_mode(self):
+        self.assertEqual(
+            MarkdownFormatter.to_html('# A\n\nHello *world*',
+                                      output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT),
+            '<h3>A</h3>\n<p>Hello <em>world</em></p>')
+
+    def test_compact_output_mode_beautifulsoup_header_shift(self):
+        class BeautifulSoupMarkdownFormatter(MarkdownFormatter):
+            beautifulsoup_header_shift = True
+
+        self.assertEqual(
+            BeautifulSoupMarkdownFormatter.to_html('# A\n\n<h1>raw</h1>',
+                                                   output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT),
+            '<h3>A</h3>\n<h3>raw</h3>')
+
+    def test_invalid_output_mode(self):
+        with self.assertRaises(ValueError):
+            MarkdownFormatter.to_html('Hello', output_mode='invalid')
+
+    def test_no_state_between_conversions(self):
+        MarkdownFormatter.to_html('Hello[^1]\n\n[1]: http://example.com')
+        self.assertEqual(MarkdownFormatter.to_html('[link][1]'),
+                         '<p>\n   [link][1]\n  </p>')
+
+
+class CodeToHtmlTestCase(unittest.TestCase):
+    def assert_same_as_markdown(self, code, syntax):
+        for output_mode in (None, MarkdownFormatter.OUTPUT_MODE_COMPACT):
+            self.assertEqual(
+                MarkdownFormatter.code_to_html(code=code, syntax=syntax, output_mode=output_mode),
+                MarkdownFormatter.to_html(MarkdownFormatter.make_code_markdowntext(code=code, syntax=syntax),
+                                          output_mode=output_mode))
+
+    def test_same_as_markdown(self):
+        self.assert_same_as_markdown('<div>\n  <em>"Hello"</em> &amp; --\n</div>', 'html')
+        self.assert_same_as_markdown('.a {\n  color: red;\n}', 'css')
+        self.assert_same_as_markdown('\n\n<b>a</b>\n   \n<b>b</b>\n\n', 'html')
+        self.assert_same_as_markdown('', 'html')
+
+    def test_same_as_markdown_fallback(self):
+        self.assert_same_as_markdown('<b>a</b>\n```\n<b>b</b>', 'html')
+        self.assert_same_as_markdown('<b>\ta</b>', 'html')
+        self.assert_same_as_markdown('<b>a</b>', 'nonexistent-syntax')
+        self.assert_same_as_markdown('<b>a</b>', '')
+
+    def test_uses_pygments_directly(self):
+        with mock.patch.object(MarkdownFormatter, 'process_html') as mock_process_html:
+            MarkdownFormatter.code_to_html(code='<b>a</b>', syntax='html')
+        self.assertFalse(mock_process_html.called)
+
+    def test_falls_back_to_markdown(self):
+        with mock.patch.object(MarkdownFormatter, 'process_html',
+                               return_value='<p>a</p>') as mock_process_html:
+            MarkdownFormatter.code_to_html(code='<b>a</b>', syntax='nonexistent-syntax')
+        self.assertTrue(mock_process_html.called)
+
+    def test_falls_back_to_markdown_with_other_extensions(self):
+        class OtherExtensionsMarkdownFormatter(MarkdownFormatter):
+            markdown_extensions = MarkdownFormatter.markdown_extensions + ['attr_list']
+
+        with mock.patch.object(OtherExtensionsMarkdownFormatter, 'process_html',
+                               return_value='<p>a</p>') as mock_process_html:
+            OtherExtensionsMarkdownFormatter.code_to_html(code='<b>a</b>', syntax='html')
+        self.assertTrue(mock_process_html.called)
+
+    def test_falls_back_to_markdown_if_preprocessed(self):
+        class PreprocessingMarkdownFormatter(MarkdownFormatter):
+            def preprocess_markdowntext(self, markdowntext):
+                return markdowntext.replace('a', 'b')
+
+        html = PreprocessingMarkdownFormatter.code_to_html(code='<b>a</b>', syntax='html',
+                                                           output_mode='compact')
+        self.assertIn('>b<', html)
+
+
+class ToHtmlManyTestCase(unittest.TestCase):
+    def assert_same_as_to_html(self, markdowntexts):
+        for output_mode in (None, MarkdownFormatter.OUTPUT_MODE_COMPACT):
+            self.assertEqual(
+                MarkdownFormatter.to_html_many(markdowntexts, output_mode=output_mode),
+                [MarkdownFormatter.to_html(markdowntext, output_mode=output_mode)
+                 for markdowntext in markdowntexts])
+
+    def test_same_as_to_html(self):
+        self.assert_same_as_to_html([
+            'Hello *world*',
+            '',
+            '# Title\n\n- a\n- b',
+            'Term\n:   Definition',
+            '```html\n<b>a</b>\n```',
+            '    indented code',
+            '"Quoted" -- text...',
+        ])
+
+    def test_same_as_to_html_unsafe(self):
+        self.assert_same_as_to_html([
+            'Hello <b>world',
+            'A [link][1]',
+            '[1]: http://example.com',
+            '<style>a {}</style>',
+            '  leading whitespace',
+            'Hello <!-- pythonkss-batch-separator-0 --> world',
+        ])
+
+    def test_texts_do_not_affect_each_other(self):
+        self.assert_same_as_to_html(['Intro text', ': note about spacing'])
+        self.assert_same_as_to_html(['Term', ':   Definition'])
+        self.assert_same_as_to_html(['> A quote', 'lazy continuation'])
+        self.assert_same_as_to_html(['- item', 'lazy continuation'])
+        self.assert_same_as_to_html(['Setext header', '======'])
+        self.assert_same_as_to_html(['Setext header', '------'])
+        self.assert_same_as_to_html(['| a | b |', '|---|---|', '| 1 | 2 |'])
+        self.assert_same_as_to_html(['A [link][1]', '[1]: http://example.com'])
+        self.assert_same_as_to_html(['```', 'code', '```'])
+        self.assert_same_as_to_html(['    code', '    more code'])
+        self.assert_same_as_to_html(['a\x02b', '\x03', 'c\x020\x03'])
+        self.assert_same_as_to_html(['  leading', 'trailing  ', '\n\n'])
+
+    def test_same_as_to_html_random(self):
+        pieces = ['Hello', '*em*', '`code`', '\n', '\n\n', '    ', '- a', '1. x', '> q', '# H',
+                  '===', '---', '"q"', '...', '[r][1]', '[1]: http://y', 'Term\n:   Def', ': note',
+                  '| a | b |\n|---|---|', '```\ncode\n```', '&amp;', '&', '\t', '\x02', '\x03']
+        rng = random.Random(0)
+        for iteration in range(30):
+            self.assert_same_as_to_html([
+                ''.join(rng.choice(pieces) for piece in range(rng.randint(0, 6)))
+                for text in range(rng.randint(1, 6))])
+
+    def test_postprocesses_in_one_pass(self):
+        with mock.patch.object(MarkdownFormatter, 'postprocess_html',
+                               wraps=MarkdownFormatter.postprocess_html,
+                               autospec=True) as mock_postprocess_html:
+            MarkdownFormatter.to_html_many(['a', 'b', 'c'])
+        self.assertEqual(mock_postprocess_html.call_count, 1)
+
+    def test_raw_html_converted_separately(self):
+        with mock.patch.object(MarkdownFormatter, 'postprocess_html',
+                               wraps=MarkdownFormatter.postprocess_html,
+                               autospec=True) as mock_postprocess_html:
+            MarkdownFormatter.to_html_many(['a', 'b', '<b>c'])
+        self.assertEqual(mock_postprocess_html.call_count, 2)
+
+    def test_separator_in_text_converted_separately(self):
+        with mock.patch.object(MarkdownFormatter, 'postprocess_html',
+                               wraps=MarkdownFormatter.postprocess_html,
+                               autospec=True) as mock_postprocess_html:
+            MarkdownFormatter.to_html_many(['a', 'b', 'pythonkss-batch-separator-0'])
+        self.assertEqual(mock_postprocess_html.call_count, 2)
+
+    def test_render_cache(self):
+        rendercache = RenderCache()
+        with mock.patch.object(MarkdownFormatter, 'render_cache', rendercache):
+            htmllist = MarkdownFormatter.to_html_many(['a', 'b', '<b>c'])
+            self.assertEqual(rendercache.get_stats()['entries'], 3)
+            self.assertEqual(MarkdownFormatter.to_html_many(['a', 'b', '<b>c']), htmllist)
+        self.assertEqual(rendercache.misses, 3)
+        self.assertEqual(rendercache.hits, 3)
+
+    def test_subclass_with_overridden_methods_not_batched(self):
+        class PreprocessingMarkdownFormatter(MarkdownFormatter):
+            def preprocess_markdowntext(self, markdowntext):
+                return markdowntext.upper()
+
+        with mock.patch.object(PreprocessingMarkdownFormatter, 'process_html',
+                               wraps=PreprocessingMarkdownFormatter.process_html,
+                               autospec=True) as mock_process_html:
+            htmllist = PreprocessingMarkdownFormatter.to_html_many(['a', 'b'])
+        self.assertEqual(mock_process_html.call_count, 2)
+        self.assertEqual(htmllist, ['<p>\n   A\n  </p>', '<p>\n   B\n  </p>'])
@@ -0,0 +1,101 @@
+import os
+import time
+import unittest
+
+import mock
+
+import pythonkss
+from pythonkss import parser as parsermodule
+from pythonkss.parsecache import ParseCache
+from pythonkss.section import Section, SectionParser
+
+from .styledirectory import TemporaryStyleDirectory
+
+
+class ParseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.styles = TemporaryStyleDirectory(self, 'parsecache')
+        self.directory = self.styles.path
+        self.cache_dir = self.styles.join('cache')
+        self.filepath = self.styles.join('buttons.css')
+
+    def __make_sections(self):
+        section = Section('Buttons\n\nStyleguide buttons', filepath=self.filepath)
+        section.parse()
+        return [section]
+
+    def test_get_miss(self):
+        parsecache = ParseCache(self.cache_dir)
+        self.assertIsNone(parsecache.get(self.filepath, parsecache.stat_file(self.filepath)))
+
+    def test_set_get(self):
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        sections = ParseCache(self.cache_dir).get(self.filepath, parsecache.stat_file(self.filepath))
+        self.assertEqual([section.reference for section in sections], ['buttons'])
+
+    def test_changed_content(self):
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        self.styles.write('buttons.css', '/*\nButtons\n\nStyleguide buttons.x\n*/\n')
+        self.assertIsNone(parsecache.get(self.filepath, parsecache.stat_file(self.filepath)))
+
+    def test_changed_mtime_same_content(self):
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        os.utime(self.filepath, (1000, 1000))
+        self.assertIsNotNone(parsecache.get(self.filepath, parsecache.stat_file(self.filepath)))
+
+    def test_variablemap_changes_namespace(self):
+        parsecache = ParseCache(self.cache_dir, variablemap={'{% a %}': '1'})
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        other = ParseCache(self.cache_dir, variablemap={'{% a %}': '2'})
+        self.assertIsNone(other.get(self.filepath, other.stat_file(self.filepath)))
+
+    def test_version_changes_namespace(self):
+        parsecache = ParseCache(self.cache_dir)
+        with mock.patch.object(pythonkss, '__version__', 'other'):
+            self.assertNotEqual(parsecache.namespace, ParseCache(self.cache_dir).namespace)
+
+    def test_no_lock_file_per_entry(self):
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        filenames = os.listdir(parsecache.directory)
+        self.assertEqual(len([filename for filename in filenames if filename.endswith('.pickle')]), 1)
+        self.assertEqual(sorted(filename for filename in filenames if not filename.endswith('.pickle')),
+                         ['.lock', 'namespace.json'])
+
+    def test_prune_namespaces_for_other_versions(self):
+        with mock.patch.object(pythonkss, '__version__', 'old'):
+            old = ParseCache(self.cache_dir)
+            old.set(self.filepath, old.stat_file(self.filepath), self.__make_sections())
+        other_variables = ParseCache(self.cache_dir, variablemap={'{% a %}': '1'})
+        other_variables.set(self.filepath, other_variables.stat_file(self.filepath), self.__make_sections())
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         sorted([parsecache.namespace, other_variables.namespace]))
+
+    def test_prune_unused_namespaces(self):
+        unused = ParseCache(self.cache_dir, variablemap={'{% a %}': '1'})
+        unused.set(self.filepath, unused.stat_file(self.filepath), self.__make_sections())
+        last_used = time.time() - unused.max_namespace_age - 10
+        os.utime(os.path.join(unused.directory, 'namespace.json'), (last_used, last_used))
+        parsecache = ParseCache(self.cache_dir)
+        parsecache.set(self.filepath, parsecache.stat_file(self.filepath), self.__make_sections())
+        self.assertEqual(os.listdir(self.cache_dir), [parsecache.namespace])
+
+    def test_parser_cache_dir(self):
+        parser = pythonkss.Parser(self.directory, cache_dir=self.cache_dir)
+        self.assertEqual(list(parser.sections.keys()), ['buttons'])
+        with mock.patch.object(parsermodule, 'parse_file') as parse_file:
+            parser = pythonkss.Parser(self.directory, cache_dir=self.cache_dir)
+            self.assertEqual(parser.sections['buttons'].title, 'Buttons')
+            self.assertFalse(parse_file.called)
+
+    def test_cached_sections_have_parsed_bodies(self):
+        pythonkss.Parser(self.directory, cache_dir=self.cache_dir).sections
+        parser = pythonkss.Parser(self.directory, cache_dir=self.cache_dir)
+        with mock.patch.object(SectionParser, 'parse_body') as mock_parse_body:
+            self.assertEqual(parser.sections['buttons'].description, '')
+        self.assertFalse(mock_parse_body.called)
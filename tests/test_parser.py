@@ -1,9 +1,16 @@
 import os
 import unittest
 
+import mock
+
 import pythonkss
+from pythonkss import parser as parsermodule
+from pythonkss.markdownformatter import MarkdownFormatter
 from pythonkss.exceptions import DuplicateReferenceError, ExtendReferenceDoesNotExistError, \
     ReplaceReferenceDoesNotExistError
+from pythonkss.section import SectionParser
+
+from .styledirectory import TemporaryStyleDirectory, get_fixture_path
 
 
 class ParserBasicsTestCase(unittest.TestCase):
@@ -62,6 +69,46 @@ class ParseTestCase(unittest.TestCase):
         self.multiple = pythonkss.Parser(os.path.join(self.fixtures_path, 'scss'),
                                          os.path.join(self.fixtures_path, 'less'))
 
+    def test_find_files_sorted(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'find_files'))
+        filenames = [os.path.relpath(filepath, self.fixtures_path) for filepath in parser.find_files()]
+        self.assertEqual(filenames, [
+            os.path.join('find_files', 'buttons.css'),
+            os.path.join('find_files', 'forms.css'),
+            os.path.join('find_files', 'advanced', 'form-buttons.css'),
+            os.path.join('find_files', 'advanced', 'form-inputs.css'),
+            os.path.join('find_files', 'advanced', 'menu.css'),
+        ])
+
+    def test_find_files_exclude_directory_patterns(self):
+        parser = pythonkss.Parser(
+            os.path.join(self.fixtures_path, 'find_files'),
+            exclude_directory_patterns=['adv*'])
+        filenames = [os.path.relpath(filepath, self.fixtures_path) for filepath in parser.find_files()]
+        self.assertEqual(filenames, [
+            os.path.join('find_files', 'buttons.css'),
+            os.path.join('find_files', 'forms.css'),
+        ])
+
+    def test_find_files_absolute_filename_patterns(self):
+        parser = pythonkss.Parser(
+            self.fixtures_path,
+            filename_patterns=[os.path.join(self.fixtures_path, 'find_files', 'advanced', 'form-*')])
+        filenames = [os.path.relpath(filepath, self.fixtures_path) for filepath in parser.find_files()]
+        self.assertEqual(filenames, [
+            os.path.join('find_files', 'advanced', 'form-buttons.css'),
+            os.path.join('find_files', 'advanced', 'form-inputs.css'),
+        ])
+
+    def test_find_files_should_include_file_override(self):
+        class MenuOnlyParser(pythonkss.Parser):
+            def should_include_file(self, filepath):
+                return filepath.endswith('menu.css')
+
+        parser = MenuOnlyParser(os.path.join(self.fixtures_path, 'find_files'))
+        filenames = [os.path.relpath(filepath, self.fixtures_path) for filepath in parser.find_files()]
+        self.assertEqual(filenames, [os.path.join('find_files', 'advanced', 'menu.css')])
+
     def test_parses_kss_comments_in_scss(self):
         self.assertEqual(self.scss.get_section_by_reference('2.1.1').title, 'Your standard form button.')
 
@@ -302,3 +349,350 @@ class ParseTestCase(unittest.TestCase):
             parser.multiblockparser.replaced_sections[0].title,
             'Strong'
         )
+
+    def test_prerender_and_clear_rendered_html(self):
+        self.scss.prerender_html()
+        section = self.scss.sections['2.1.1']
+        self.assertTrue(hasattr(section, '_rendered_description_html'))
+        self.scss.clear_rendered_html()
+        self.assertFalse(hasattr(section, '_rendered_description_html'))
+
+    def test_html_output_mode(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'css'),
+                                  html_output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT)
+        section = parser.get_section_by_reference('1')
+        self.assertEqual(section.html_output_mode, MarkdownFormatter.OUTPUT_MODE_COMPACT)
+        self.assertTrue(section.examples[0].html.startswith('<div class="codehilite"><pre>'))
+
+
+class IterSectionsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+    def test_same_sections_as_parse(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'scss'))
+        references = [section.reference for section in parser.iter_sections()]
+        self.assertEqual(references, list(pythonkss.Parser(
+            os.path.join(self.fixtures_path, 'scss')).sections.keys()))
+
+    def test_does_not_parse_again(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'scss'))
+        list(parser.iter_sections())
+        with mock.patch.object(parser, 'parse') as mock_parse:
+            self.assertTrue(len(parser.sections) > 0)
+            parser.as_tree()
+        self.assertFalse(mock_parse.called)
+
+    def test_is_lazy(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'scss'))
+        with mock.patch.object(parsermodule, 'parse_file',
+                               wraps=parsermodule.parse_file) as mock_parse_file:
+            next(parser.iter_sections())
+        self.assertEqual(mock_parse_file.call_count, 1)
+
+    def test_extend_yields_final_section_last(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'extend'))
+        sections = list(parser.iter_sections())
+        self.assertEqual(len(sections), 2)
+        self.assertEqual(sections[0].title, 'Strong')
+        self.assertEqual(sections[1].title, 'title prefix Strong title suffix')
+        self.assertIs(sections[1], parser.sections['extend.strong'])
+
+    def test_replace_yields_final_section_last(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'replace'))
+        sections = list(parser.iter_sections())
+        self.assertEqual(len(sections), 2)
+        self.assertEqual(sections[0].title, 'Strong')
+        self.assertEqual(sections[1].title, 'Replaced Strong title')
+
+    def test_refresh_after_iter_sections(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'scss'))
+        list(parser.iter_sections())
+        self.assertFalse(parser.refresh().has_file_changes())
+
+
+class ParallelParseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+    def __summarize(self, parser):
+        return sorted(
+            (section.reference, section.title, section.description,
+             [example.text for example in section.examples])
+            for section in parser.get_sections())
+
+    def test_workers_same_result_as_serial(self):
+        paths = [os.path.join(self.fixtures_path, name) for name in ('scss', 'less', 'automatic_references')]
+        serial = pythonkss.Parser(*paths)
+        parallel = pythonkss.Parser(*paths, workers=2)
+        self.assertEqual(self.__summarize(serial), self.__summarize(parallel))
+
+    def test_workers_extend(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'extend'), workers=2)
+        section = parser.get_section_by_reference('extend.strong')
+        self.assertEqual(section.title, 'title prefix Strong title suffix')
+        self.assertEqual([example.text for example in section.examples], [
+            '<strong>Extra example before</strong>',
+            '<strong>Example</strong>',
+            '<strong>Extra example after</strong>',
+        ])
+
+    def test_workers_duplicate_references(self):
+        parser = pythonkss.Parser(os.path.join(self.fixtures_path, 'duplicate_reference'), workers=2)
+        with self.assertRaises(DuplicateReferenceError):
+            parser.parse()
+
+    def test_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        path = os.path.join(self.fixtures_path, 'css')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parser = pythonkss.Parser(path, executor=executor)
+            self.assertEqual(self.__summarize(pythonkss.Parser(path)), self.__summarize(parser))
+
+
+class RenderAllTestCase(unittest.TestCase):
+    def setUp(self):
+        self.paths = [os.path.join(os.path.dirname(__file__), 'fixtures', name)
+                      for name in ('css', 'automatic_references', 'extend')]
+
+    def __summarize_html(self, parser):
+        return sorted(
+            (section.reference, section.description_html,
+             [example.html for example in section.examples])
+            for section in parser.get_sections())
+
+    def test_workers_same_result_as_serial(self):
+        serial = pythonkss.Parser(*self.paths)
+        parallel = pythonkss.Parser(*self.paths)
+        parallel.render_all(workers=2)
+        with mock.patch.object(MarkdownFormatter, 'to_html') as mock_to_html, \
+                mock.patch.object(MarkdownFormatter, 'code_to_html') as mock_code_to_html:
+            parallel_html = self.__summarize_html(parallel)
+        self.assertFalse(mock_to_html.called)
+        self.assertFalse(mock_code_to_html.called)
+        self.assertEqual(self.__summarize_html(serial), parallel_html)
+
+    def test_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        parser = pythonkss.Parser(*self.paths, html_output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parser.render_all(executor=executor)
+        self.assertEqual(self.__summarize_html(pythonkss.Parser(
+            *self.paths, html_output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT)),
+            self.__summarize_html(parser))
+
+    def test_same_result_as_serial_for_definition_list_syntax(self):
+        path = os.path.join(os.path.dirname(__file__), 'fixtures', 'render_all')
+        parser = pythonkss.Parser(path)
+        parser.render_all()
+        self.assertEqual(self.__summarize_html(pythonkss.Parser(path)), self.__summarize_html(parser))
+        self.assertIn('note about spacing', parser.sections['spacing.margins'].description_html)
+
+    def test_executor_workers(self):
+        from concurrent.futures import ThreadPoolExecutor
+        parser = pythonkss.Parser(*self.paths)
+        with ThreadPoolExecutor(max_workers=2) as executor, \
+                mock.patch.object(pythonkss.Parser, '_chunk_render_jobs',
+                                  wraps=parser._chunk_render_jobs) as mock_chunk_render_jobs:
+            parser.render_all(executor=executor, workers=3)
+        self.assertEqual(mock_chunk_render_jobs.call_args[1]['workers'], 3)
+
+    def test_skips_rendered(self):
+        parser = pythonkss.Parser(*self.paths)
+        parser.prerender_html()
+        with mock.patch.object(parsermodule, 'render_jobs') as mock_render_jobs:
+            parser.render_all()
+        self.assertFalse(mock_render_jobs.called)
+
+    def test_chunk_render_jobs(self):
+        parser = pythonkss.Parser(*self.paths)
+        jobs = [(parsermodule.RENDER_JOB_MARKDOWN, ('a' * size, None))
+                for size in (10, 10, 1000, 10, 10, 10)]
+        chunks = parser._chunk_render_jobs(jobs=jobs, workers=2)
+        self.assertEqual(chunks[0], [2])
+        self.assertEqual(sorted(index for chunk in chunks for index in chunk), list(range(6)))
+
+
+class RefreshTestCase(unittest.TestCase):
+    def setUp(self):
+        self.styles = TemporaryStyleDirectory(self, 'refresh')
+        self.directory = self.styles.path
+
+    def test_no_changes(self):
+        parser = pythonkss.Parser(self.directory)
+        parser.sections
+        changes = parser.refresh()
+        self.assertFalse(changes.has_file_changes())
+        self.assertFalse(changes.has_section_changes())
+
+    def test_not_parsed(self):
+        parser = pythonkss.Parser(self.directory)
+        changes = parser.refresh()
+        self.assertEqual(changes.added_references, {'a', 'b.x'})
+
+    def test_changed_file(self):
+        parser = pythonkss.Parser(self.directory)
+        self.assertEqual(parser.sections['b.x'].title, 'B')
+        self.styles.write_comments('b.css', 'B changed\n\nStyleguide b.x')
+        self.assertEqual(parser.find_changed_files().changed_files, [os.path.join(self.directory, 'b.css')])
+        changes = parser.refresh()
+        self.assertEqual(changes.changed_references, {'b.x'})
+        self.assertEqual(parser.sections['b.x'].title, 'B changed')
+        self.assertEqual(parser.sections['a'].title, 'A extended')
+
+    def test_changed_extend(self):
+        parser = pythonkss.Parser(self.directory)
+        self.assertEqual(parser.sections['a'].title, 'A extended')
+        self.styles.write_comments('c.css', 'Title: changed\n\nStyleguideExtendAfter a')
+        changes = parser.refresh()
+        self.assertEqual(changes.changed_references, {'a'})
+        self.assertEqual(parser.sections['a'].title, 'A changed')
+
+    def test_added_and_removed_files(self):
+        parser = pythonkss.Parser(self.directory)
+        tree = parser.as_tree()
+        self.styles.remove('b.css')
+        self.styles.write_comments('d.css', 'D\n\nStyleguide d')
+        changes = parser.refresh()
+        self.assertEqual(changes.added_files, [os.path.join(self.directory, 'd.css')])
+        self.assertEqual(changes.removed_files, [os.path.join(self.directory, 'b.css')])
+        self.assertEqual(changes.added_references, {'d'})
+        self.assertEqual(changes.removed_references, {'b.x'})
+        self.assertEqual(set(parser.sections), {'a', 'd'})
+        self.assertIs(parser.as_tree(), tree)
+        self.assertEqual(set(tree.children), {'a', 'd'})
+        self.assertEqual(tree['a'].section.title, 'A extended')
+        self.assertEqual([node.dotted_numbered_path for node in tree.sorted_children], ['1', '2'])
+
+    def test_keeps_file_order(self):
+        self.styles.write_comments('e.css', 'Title: before\n\nStyleguideExtendAfter a')
+        parser = pythonkss.Parser(self.directory)
+        self.assertEqual(parser.sections['a'].title, 'A extended before')
+        self.styles.write_comments('c.css', 'Title: changed\n\nStyleguideExtendAfter a')
+        parser.refresh()
+        self.assertEqual(parser.sections['a'].title, 'A changed before')
+
+    def test_failed_refresh_leaves_parser_unchanged(self):
+        parser = pythonkss.Parser(self.directory)
+        tree = parser.as_tree()
+        self.styles.write_comments('b.css', 'B\n\nStyleguide b.x', 'C\n\nStyleguide c')
+        self.styles.write_comments('d.css', 'Duplicate\n\nStyleguide a')
+        with self.assertRaises(DuplicateReferenceError):
+            parser.refresh()
+        self.assertEqual(set(parser.sections), {'a', 'b.x'})
+        self.assertEqual(parser.sections['a'].title, 'A extended')
+        self.assertEqual(set(tree.children), {'a', 'b'})
+
+        self.styles.write_comments('d.css', 'D\n\nStyleguide d')
+        changes = parser.refresh()
+        self.assertEqual(changes.added_files, [os.path.join(self.directory, 'd.css')])
+        self.assertEqual(changes.changed_files, [os.path.join(self.directory, 'b.css')])
+        self.assertEqual(changes.added_references, {'c', 'd'})
+        self.assertEqual(changes.changed_references, {'b.x'})
+        self.assertEqual(set(parser.sections), set(pythonkss.Parser(self.directory).sections))
+        self.assertEqual(set(tree.children), {'a', 'b', 'c', 'd'})
+
+
+class UpdateVariablesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.styles = TemporaryStyleDirectory(self, 'update_variables')
+        self.directory = self.styles.path
+
+    def __make_parser(self):
+        return pythonkss.Parser(self.directory, variables={'color': 'red', 'size': 'large'})
+
+    def test_used_variables(self):
+        parser = self.__make_parser()
+        parser.sections
+        self.assertEqual(parser._file_sections[os.path.join(self.directory, 'a.css')][0].used_variables,
+                         {'{% color %}'})
+        self.assertEqual(parser._file_sections[os.path.join(self.directory, 'c.css')][0].used_variables,
+                         frozenset())
+
+    def test_get_sections_using_variables(self):
+        parser = self.__make_parser()
+        self.assertEqual([section.reference for section in parser.get_sections_using_variables(['size'])],
+                         ['a', 'b'])
+        self.assertEqual(parser.get_sections_using_variables(['unused']), [])
+
+    def test_update_variables(self):
+        parser = self.__make_parser()
+        self.assertEqual(parser.sections['a'].title, 'A red large')
+        section_c = parser.sections['c']
+        section_b = parser.sections['b']
+        changes = parser.update_variables({'color': 'blue', 'size': 'large'})
+        self.assertEqual(changes.changed_files, [os.path.join(self.directory, 'a.css')])
+        self.assertEqual(changes.changed_references, {'a'})
+        self.assertEqual(parser.sections['a'].title, 'A blue large')
+        self.assertIs(parser.sections['b'], section_b)
+        self.assertIs(parser.sections['c'], section_c)
+
+    def test_update_variables_extend(self):
+        parser = self.__make_parser()
+        parser.as_tree()
+        changes = parser.update_variables({'color': 'red', 'size': 'small'})
+        self.assertEqual(changes.changed_references, {'a', 'b'})
+        self.assertEqual(parser.sections['a'].title, 'A red small')
+        self.assertEqual(parser.sections['b'].title, 'B small')
+        self.assertEqual(parser.as_tree()['a'].section.title, 'A red small')
+
+    def test_update_variables_same_as_new_parser(self):
+        parser = self.__make_parser()
+        parser.sections
+        variables = {'color': 'green', 'other': 'x'}
+        parser.update_variables(variables)
+        expected = pythonkss.Parser(self.directory, variables=variables)
+        self.assertEqual(
+            [(section.reference, section.title) for section in parser.iter_sorted_sections()],
+            [(section.reference, section.title) for section in expected.iter_sorted_sections()])
+
+    def test_update_variables_no_changes(self):
+        parser = self.__make_parser()
+        parser.sections
+        changes = parser.update_variables({'color': 'red', 'size': 'large', 'unused': 'x'})
+        self.assertFalse(changes.has_file_changes())
+
+    def test_update_variables_value_with_keyword(self):
+        self.styles.write_comments('e.css', '{% extra %}')
+        parser = self.__make_parser()
+        self.assertEqual(set(parser.sections), {'a', 'b', 'c'})
+        changes = parser.update_variables({'color': 'red', 'size': 'large', 'extra': 'E\n\nStyleguide e'})
+        self.assertEqual(len(changes.changed_files), 5)
+        self.assertEqual(changes.added_references, {'e'})
+
+    def test_update_variables_not_parsed(self):
+        parser = self.__make_parser()
+        parser.update_variables({'color': 'blue'})
+        self.assertEqual(parser.sections['b'].title, 'B {% size %}')
+
+
+class ParseFilePrefilterTestCase(unittest.TestCase):
+    def __get_fixture_path(self, filename):
+        return get_fixture_path('prefilter', filename)
+
+    def test_file_might_contain_sections(self):
+        self.assertTrue(parsermodule.file_might_contain_sections(self.__get_fixture_path('section.css')))
+        self.assertFalse(parsermodule.file_might_contain_sections(self.__get_fixture_path('comment.css')))
+        self.assertFalse(parsermodule.file_might_contain_sections(self.__get_fixture_path('empty.css')))
+
+    def test_parse_file_parse_bodies(self):
+        filepath = self.__get_fixture_path('section.css')
+        section = parsermodule.parse_file(filepath, parse_bodies=True)[0]
+        with mock.patch.object(SectionParser, 'parse_body') as mock_parse_body:
+            self.assertEqual(section.description, 'The description')
+        self.assertFalse(mock_parse_body.called)
+
+    def test_parse_file_skips_files_without_keyword(self):
+        filepath = self.__get_fixture_path('comment.css')
+        with mock.patch.object(parsermodule, 'CommentParser') as commentparser:
+            self.assertEqual(parsermodule.parse_file(filepath), [])
+            self.assertFalse(commentparser.called)
+
+    def test_parse_commentblock_without_keyword(self):
+        with mock.patch.object(parsermodule, 'Section') as section:
+            self.assertIsNone(parsermodule.parse_commentblock('A\n\nNot a section', filepath='a.css'))
+            self.assertFalse(section.called)
+
+    def test_variable_adds_section(self):
+        parser = pythonkss.Parser(get_fixture_path('variable_reference'), variables={'ref': 'Styleguide a'})
+        self.assertEqual(list(parser.sections), ['a'])
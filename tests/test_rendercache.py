@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pythonkss.markdownformatter import MarkdownFormatter
+from pythonkss.rendercache import RenderCache
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_miss(self):
+        rendercache = RenderCache()
+        self.assertIsNone(rendercache.get('a'))
+        self.assertEqual(rendercache.misses, 1)
+
+    def test_set_get(self):
+        rendercache = RenderCache()
+        rendercache.set('a', '<p>a</p>')
+        self.assertEqual(rendercache.get('a'), '<p>a</p>')
+        self.assertEqual(rendercache.hits, 1)
+
+    def test_lru_eviction(self):
+        rendercache = RenderCache(max_entries=2)
+        rendercache.set('a', '<p>a</p>')
+        rendercache.set('b', '<p>b</p>')
+        rendercache.get('a')
+        rendercache.set('c', '<p>c</p>')
+        self.assertEqual(rendercache.evictions, 1)
+        self.assertIsNone(rendercache.get('b'))
+        self.assertEqual(rendercache.get('a'), '<p>a</p>')
+        self.assertEqual(rendercache.get('c'), '<p>c</p>')
+
+    def test_disk_tier(self):
+        RenderCache(cache_dir=self.cache_dir).set('a', u'<p>æ</p>')
+        rendercache = RenderCache(cache_dir=self.cache_dir)
+        self.assertEqual(rendercache.get('a'), u'<p>æ</p>')
+        self.assertEqual(rendercache.disk_hits, 1)
+        self.assertEqual(rendercache.get('a'), u'<p>æ</p>')
+        self.assertEqual(rendercache.hits, 1)
+
+    def test_disk_eviction(self):
+        rendercache = RenderCache(cache_dir=self.cache_dir, max_disk_bytes=25)
+        for index, key in enumerate(['aa', 'bb', 'cc']):
+            rendercache.set(key, '<p>{}</p>'.format(key))
+            entry_path = os.path.join(self.cache_dir, key[:2], key + '.html')
+            os.utime(entry_path, (1000 + index, 1000 + index))
+        rendercache.set('dd', '<p>dd</p>')
+        self.assertEqual(rendercache.disk_evictions, 2)
+        rendercache.clear()
+        self.assertIsNone(rendercache.get('aa'))
+        self.assertIsNone(rendercache.get('bb'))
+        self.assertEqual(rendercache.get('dd'), '<p>dd</p>')
+
+    def test_disk_bytes_when_overwriting(self):
+        RenderCache(cache_dir=self.cache_dir).set('aa', '<p>aa</p>')
+        rendercache = RenderCache(cache_dir=self.cache_dir)
+        for index in range(5):
+            rendercache.set('aa', '<p>aa</p>')
+        rendercache.set('bb', '<p>b</p>')
+        self.assertEqual(rendercache._get_disk_bytes(), len('<p>aa</p>') + len('<p>b</p>'))
+
+    def test_get_stats(self):
+        rendercache = RenderCache()
+        rendercache.set('a', '<p>a</p>')
+        rendercache.get('a')
+        rendercache.get('b')
+        self.assertEqual(rendercache.get_stats(), {
+            'hits': 1, 'disk_hits': 0, 'misses': 1,
+            'evictions': 0, 'disk_evictions': 0, 'entries': 1,
+        })
+
+
+class MarkdownFormatterRenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rendercache = RenderCache()
+        patcher = mock.patch.object(MarkdownFormatter, 'render_cache', self.rendercache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_to_html(self):
+        html = MarkdownFormatter.to_html('Hello')
+        with mock.patch.object(MarkdownFormatter, 'process_html') as mock_process_html:
+            self.assertEqual(MarkdownFormatter.to_html('Hello'), html)
+        self.assertFalse(mock_process_html.called)
+        self.assertEqual(self.rendercache.hits, 1)
+
+    def test_output_mode_in_key(self):
+        pretty_html = MarkdownFormatter.to_html('Hello')
+        compact_html = MarkdownFormatter.to_html('Hello', output_mode=MarkdownFormatter.OUTPUT_MODE_COMPACT)
+        self.assertNotEqual(pretty_html, compact_html)
+        self.assertEqual(self.rendercache.misses, 2)
+
+    def test_subclass_in_key(self):
+        class NoCodeHiliteMarkdownFormatter(MarkdownFormatter):
+            markdown_extensions = ['fenced_code']
+
+        markdowntext = '```html\n<b>a</b>\n```'
+        self.assertNotEqual(NoCodeHiliteMarkdownFormatter.to_html(markdowntext),
+                            MarkdownFormatter.to_html(markdowntext))
+
+    def test_code_to_html(self):
+        html = MarkdownFormatter.code_to_html(code='<b>a</b>', syntax='html')
+        self.assertEqual(MarkdownFormatter.code_to_html(code='<b>a</b>', syntax='html'), html)
+        self.assertEqual(self.rendercache.hits, 1)
@@ -1,6 +1,10 @@
+import pickle
 import unittest
 
-from pythonkss.section import Section
+import mock
+
+from pythonkss import markdownformatter
+from pythonkss.section import Section, SectionMergePlan, SectionParser
 from pythonkss.exceptions import NotSectionError, InvalidMergeSectionTypeError, InvalidMergeNotSameReferenceError
 
 
@@ -340,3 +344,248 @@ class SectionTestCase(unittest.TestCase):
         self.assertEqual(target.examples[0].text, '<em>example2</em>')
         self.assertEqual(target.examples[1].text, '<em>example3</em>')
         self.assertEqual(target.examples[2].text, '<em>example</em>')
+
+
+class SectionLazyBodyTestCase(unittest.TestCase):
+    comment = ('The title\n'
+               'The description\n'
+               'Example:\n  <em>example</em>\n'
+               'Styleguide a.b')
+
+    def test_parse_does_not_parse_body(self):
+        section = Section(self.comment)
+        with mock.patch.object(SectionParser, 'parse_body') as mock_parse_body:
+            section.parse()
+            self.assertEqual(section.reference, 'a.b')
+            self.assertEqual(section.title, 'The title')
+        self.assertFalse(mock_parse_body.called)
+
+    def test_description_parses_body(self):
+        section = Section(self.comment)
+        section.parse()
+        self.assertEqual(section.description, 'The description')
+        self.assertEqual(section.examples[0].text, '<em>example</em>')
+
+    def test_examples_parses_body(self):
+        section = Section(self.comment)
+        section.parse()
+        self.assertTrue(section.has_examples())
+        self.assertEqual(section.description, 'The description')
+
+    def test_body_parsed_once(self):
+        section = Section(self.comment)
+        section.parse()
+        with mock.patch.object(SectionParser, 'parse_body',
+                               wraps=SectionParser.parse_body,
+                               autospec=True) as mock_parse_body:
+            section.description
+            section.examples
+            section.description
+        self.assertEqual(mock_parse_body.call_count, 1)
+
+    def test_copy_does_not_parse_body(self):
+        section = Section(self.comment)
+        section.parse()
+        copied_section = section.copy()
+        self.assertFalse(hasattr(section, '_examples'))
+        self.assertEqual(copied_section.description, 'The description')
+        self.assertEqual(copied_section.examples[0].text, '<em>example</em>')
+
+    def test_merge_into_unparsed_target(self):
+        target = Section(self.comment)
+        target.parse()
+        source = Section('Example:\n  <em>example2</em>\n'
+                         'StyleguideExtendAfter a.b')
+        source.parse()
+        source.merge_into_section(target_section=target)
+        self.assertEqual(target.description, 'The description')
+        self.assertEqual([example.text for example in target.examples],
+                         ['<em>example</em>', '<em>example2</em>'])
+
+    def test_unparsed_body_is_not_stored_twice(self):
+        section = Section(self.comment)
+        section.parse()
+        state = section.__getstate__()
+        self.assertEqual([value for value in state.values() if value == 'The description'], [])
+        self.assertFalse(any(isinstance(value, list) and 'The description' in value for value in state.values()))
+
+    def test_body_with_provided_title_and_reference(self):
+        section = Section('The description\nExample:\n  <em>example</em>')
+        section.parse(title='Provided title', reference='a.b')
+        self.assertEqual(section.description, 'The description')
+        self.assertEqual(section.examples[0].text, '<em>example</em>')
+
+    def test_parse_body_if_needed(self):
+        section = Section(self.comment)
+        section.parse()
+        section.parse_body_if_needed()
+        unpickled = pickle.loads(pickle.dumps(section, protocol=pickle.HIGHEST_PROTOCOL))
+        with mock.patch.object(SectionParser, 'parse_body') as mock_parse_body:
+            unpickled.parse_body_if_needed()
+            self.assertEqual(unpickled.description, 'The description')
+        self.assertFalse(mock_parse_body.called)
+
+
+class SectionRenderedHtmlTestCase(unittest.TestCase):
+    def _make_section(self):
+        section = Section('The title\n'
+                          'The description\n'
+                          'Example:\n  <em>example</em>\n'
+                          'Styleguide a.b')
+        section.parse()
+        return section
+
+    def _patch_to_html(self, methodname='to_html'):
+        return mock.patch.object(markdownformatter.MarkdownFormatter, methodname,
+                                 wraps=getattr(markdownformatter.MarkdownFormatter, methodname))
+
+    def test_description_html_memoized(self):
+        section = self._make_section()
+        with self._patch_to_html() as mock_to_html:
+            html = section.description_html
+            self.assertEqual(section.description_html, html)
+        self.assertEqual(mock_to_html.call_count, 1)
+
+    def test_example_html_memoized(self):
+        example = self._make_section().examples[0]
+        with self._patch_to_html('code_to_html') as mock_to_html:
+            html = example.html
+            self.assertEqual(example.html, html)
+        self.assertEqual(mock_to_html.call_count, 1)
+
+    def test_example_html_invalidated_when_text_changes(self):
+        example = self._make_section().examples[0]
+        example.html
+        example.text = '<strong>changed</strong>'
+        self.assertIn('changed', example.html)
+
+    def test_description_html_invalidated_by_merge(self):
+        target = self._make_section()
+        self.assertNotIn('Extra', target.description_html)
+        source = Section('Extra description\nStyleguideExtendAfter a.b')
+        source.parse()
+        source.merge_into_section(target_section=target)
+        self.assertIn('Extra', target.description_html)
+
+    def test_prerender_html(self):
+        section = self._make_section()
+        section.prerender_html()
+        with self._patch_to_html() as mock_to_html, \
+                self._patch_to_html('code_to_html') as mock_code_to_html:
+            section.description_html
+            section.examples[0].html
+        self.assertFalse(mock_to_html.called)
+        self.assertFalse(mock_code_to_html.called)
+
+    def test_clear_rendered_html(self):
+        section = self._make_section()
+        section.prerender_html()
+        section.clear_rendered_html()
+        with self._patch_to_html() as mock_to_html, \
+                self._patch_to_html('code_to_html') as mock_code_to_html:
+            section.description_html
+            section.examples[0].html
+        self.assertEqual(mock_to_html.call_count, 1)
+        self.assertEqual(mock_code_to_html.call_count, 1)
+
+    def test_html_output_mode(self):
+        section = self._make_section()
+        section.html_output_mode = markdownformatter.MarkdownFormatter.OUTPUT_MODE_COMPACT
+        self.assertEqual(section.description_html, '<p>The description</p>')
+        self.assertEqual(section.examples[0].html_output_mode,
+                         markdownformatter.MarkdownFormatter.OUTPUT_MODE_COMPACT)
+
+    def test_html_output_mode_change_invalidates(self):
+        section = self._make_section()
+        pretty_html = section.description_html
+        section.html_output_mode = markdownformatter.MarkdownFormatter.OUTPUT_MODE_COMPACT
+        self.assertNotEqual(section.description_html, pretty_html)
+
+
+class SectionMemoryTestCase(unittest.TestCase):
+    comment = ('The title\n'
+               'The description\n'
+               'Example:\n  <em>example</em>\n'
+               'Styleguide components.2:buttons')
+
+    def test_slots(self):
+        section = Section(self.comment, filepath='/path/to/buttons.css')
+        section.parse()
+        self.assertFalse(hasattr(section, '__dict__'))
+        self.assertFalse(hasattr(section.examples[0], '__dict__'))
+
+    def test_parse_if_needed_parses_once(self):
+        section = Section(self.comment)
+        with mock.patch.object(SectionParser, 'parse_header',
+                               wraps=SectionParser.parse_header,
+                               autospec=True) as mock_parse_header:
+            section.parse_if_needed()
+            section.parse_if_needed()
+            section.reference
+        self.assertEqual(mock_parse_header.call_count, 1)
+
+    def test_interned_strings(self):
+        first = Section(self.comment, filepath=''.join(['/path/to/', 'buttons.css']))
+        second = Section(self.comment.replace('2:buttons', 'links'), filepath='/path/to/buttons.css')
+        self.assertIs(first.filepath, second.filepath)
+        self.assertIs(first.reference_segment_list[0], second.reference_segment_list[0])
+
+    def test_reference_shared_with_raw_reference(self):
+        section = Section(self.comment.replace('2:buttons', 'buttons'))
+        self.assertIs(section.reference_segment_list, section.raw_reference_segment_list)
+
+    def test_pickle(self):
+        section = Section(self.comment, filepath='/path/to/buttons.css')
+        section.parse()
+        unpickled = pickle.loads(pickle.dumps(section, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(unpickled.reference, 'components.buttons')
+        self.assertEqual(unpickled.raw_reference_segment_list, ['components', '2:buttons'])
+        self.assertEqual(unpickled.description, 'The description')
+        self.assertIs(unpickled.filepath, section.filepath)
+        self.assertIs(unpickled.reference_segment_list[0], section.reference_segment_list[0])
+
+
+class SectionMergePlanTestCase(unittest.TestCase):
+    def __make_section(self, comment):
+        section = Section(comment)
+        section.parse()
+        return section
+
+    def __make_target(self):
+        return self.__make_section('The title\nThe description\nExample:\n  <em>target</em>\nStyleguide a.b')
+
+    def __make_sources(self):
+        return [
+            self.__make_section('Title: before1\nDescription before1\nStyleguideExtendBefore a.b'),
+            self.__make_section('Title: after1\nExample:\n  <em>after1</em>\nStyleguideExtendAfter a.b'),
+            self.__make_section('Description before2\nExample:\n  <em>before2</em>\nStyleguideExtendBefore a.b'),
+            self.__make_section('Title: after2\nDescription after2\nStyleguideExtendAfter a.b'),
+            self.__make_section('Title: before3\nStyleguideExtendBefore a.b'),
+        ]
+
+    def __summarize(self, section):
+        return section.title, section.description, [example.text for example in section.examples]
+
+    def test_same_as_merging_one_by_one(self):
+        expected = self.__make_target()
+        for source in self.__make_sources():
+            source.merge_into_section(target_section=expected)
+        target = self.__make_target()
+        SectionMergePlan(self.__make_sources()).merge_into_section(target_section=target)
+        self.assertEqual(self.__summarize(target), self.__summarize(expected))
+        self.assertEqual(self.__summarize(target), (
+            'before3 before1 The title after1 after2',
+            'Description before2\n\nDescription before1\n\nThe description\n\nDescription after2',
+            ['<em>before2</em>', '<em>target</em>', '<em>after1</em>']))
+
+    def test_no_sources(self):
+        target = self.__make_target()
+        SectionMergePlan([]).merge_into_section(target_section=target)
+        self.assertEqual(self.__summarize(target), ('The title', 'The description', ['<em>target</em>']))
+
+    def test_invalid_source(self):
+        target = self.__make_target()
+        sources = self.__make_sources() + [self.__make_section('Other\nStyleguideExtendAfter a.c')]
+        with self.assertRaises(InvalidMergeNotSameReferenceError):
+            SectionMergePlan(sources).merge_into_section(target_section=target)
+        self.assertEqual(target.title, 'The title')
@@ -0,0 +1,145 @@
+import random
+import sys
+import types
+import unittest
+
+import mock
+
+from pythonkss.section import Section
+from pythonkss.sectiontree import SectionTree
+
+
+def make_section(reference, title='The title'):
+    section = Section('{}\nStyleguide {}'.format(title, reference))
+    section.parse()
+    return section
+
+
+class SectionTreeTestCase(unittest.TestCase):
+    references = ['a', 'a.1:x', 'a.1:y', 'a.b', 'a.b-c', 'a.b.x', 'a.01', 'a.1',
+                  'q.r.s', 'q.2:z', 'q.2:a', 'q.r', 'c.d.e.f']
+
+    def __summarize(self, tree):
+        return [(node.reference, node.dotted_numbered_path, node.level, node.section is not None)
+                for node in tree.iter_descendants_sorted()]
+
+    def test_virtual_nodes(self):
+        tree = SectionTree([make_section('c.d.e')])
+        self.assertEqual(self.__summarize(tree), [
+            ('c', '1', 0, False),
+            ('c.d', '1.1', 1, False),
+            ('c.d.e', '1.1.1', 2, True),
+        ])
+
+    def test_unsorted_input(self):
+        sections = [make_section(reference) for reference in self.references]
+        expected = self.__summarize(SectionTree(sorted(sections, key=lambda section: section.reference)))
+        for seed in range(5):
+            random.Random(seed).shuffle(sections)
+            self.assertEqual(self.__summarize(SectionTree(sections)), expected)
+
+    def test_iter_descendants_sorted(self):
+        tree = SectionTree([make_section(reference) for reference in self.references])
+        self.assertIsInstance(tree.iter_descendants_sorted(), types.GeneratorType)
+        self.assertEqual(list(tree.iter_descendants_sorted()), tree.sorted_all_descendants_flat())
+        self.assertEqual([node.reference for node in tree['q'].iter_descendants_sorted()],
+                         ['q.a', 'q.z', 'q.r', 'q.r.s'])
+
+    def test_deep_tree(self):
+        depth = sys.getrecursionlimit() + 100
+        reference = '.'.join('s{}'.format(index) for index in range(depth))
+        tree = SectionTree([make_section(reference)])
+        nodes = tree.sorted_all_descendants_flat()
+        self.assertEqual(len(nodes), depth)
+        self.assertEqual(nodes[-1].reference, reference)
+        self.assertEqual(nodes[-1].level, depth - 1)
+        with mock.patch('pythonkss.sectiontree.print', create=True) as mock_print:
+            tree.prettyprint_tree()
+        self.assertEqual(mock_print.call_count, depth)
+
+
+class SectionTreeIncrementalTestCase(unittest.TestCase):
+    references = SectionTreeTestCase.references + ['a.b.y', 'a.3:b', 'q', 'c.d', 'e.4:f']
+
+    def __summarize(self, tree):
+        return [(node.reference, node.dotted_numbered_path, node.level, node.section)
+                for node in tree.iter_descendants_sorted()]
+
+    def assert_same_as_new_tree(self, tree, sections):
+        self.assertEqual(self.__summarize(tree), self.__summarize(SectionTree(list(sections.values()))))
+        self.assertEqual(
+            sorted(tree._all_nodes_map),
+            sorted(node.reference for node in tree.iter_descendants_sorted()))
+
+    def test_random_changes(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            sections = {}
+            tree = SectionTree([])
+            for iteration in range(60):
+                section = make_section(rng.choice(self.references), title='Title {}'.format(iteration))
+                if section.reference in sections and rng.random() < 0.5:
+                    del sections[section.reference]
+                    tree.remove_section(section.reference)
+                elif section.reference in sections:
+                    sections[section.reference] = section
+                    tree.update_section(section)
+                else:
+                    sections[section.reference] = section
+                    tree.insert_section(section)
+                self.assert_same_as_new_tree(tree, sections)
+
+    def test_insert_into_virtual_node(self):
+        tree = SectionTree([make_section('a.b.c')])
+        section = make_section('a.b')
+        tree.insert_section(section)
+        self.assertIs(tree['a']['b'].section, section)
+        self.assertEqual(tree['a']['b']['c'].dotted_numbered_path, '1.1.1')
+
+    def test_remove_keeps_virtual_node_with_children(self):
+        tree = SectionTree([make_section('a.2:b'), make_section('a.1:c'), make_section('a.b.x')])
+        self.assertEqual(tree['a']['b'].dotted_numbered_path, '1.2')
+        tree.remove_section('a.b')
+        self.assertIsNone(tree['a']['b'].section)
+        self.assertEqual([node.reference for node in tree.iter_descendants_sorted()],
+                         ['a', 'a.c', 'a.b', 'a.b.x'])
+        self.assertEqual(tree['a']['b']['x'].dotted_numbered_path, '1.2.1')
+
+    def test_remove_prunes_virtual_parents(self):
+        tree = SectionTree([make_section('a.b.c.d'), make_section('e')])
+        tree.remove_section('a.b.c.d')
+        self.assertEqual([node.reference for node in tree.iter_descendants_sorted()], ['e'])
+        self.assertEqual(tree['e'].dotted_numbered_path, '1')
+        with self.assertRaises(KeyError):
+            tree.get_node_by_reference('a.b')
+
+    def test_update_section_with_new_sortkey_moves_subtree(self):
+        tree = SectionTree([make_section('a.1:x'), make_section('a.2:y'), make_section('a.x.z')])
+        tree.update_section(make_section('a.3:x'))
+        self.assertEqual([(node.reference, node.dotted_numbered_path) for node in tree.iter_descendants_sorted()],
+                         [('a', '1'), ('a.y', '1.1'), ('a.x', '1.2'), ('a.x.z', '1.2.1')])
+
+    def test_only_parent_of_change_is_resorted(self):
+        tree = SectionTree([make_section(reference) for reference in self.references])
+        with mock.patch('pythonkss.sectiontree.sorted', create=True, side_effect=sorted) as mock_sorted:
+            tree.insert_section(make_section('a.b.z'))
+            self.assertEqual(mock_sorted.call_count, 1)
+            tree.update_section(make_section('q.r', title='Other title'))
+            self.assertEqual(mock_sorted.call_count, 1)
+            tree.remove_section('a.b.z')
+            self.assertEqual(mock_sorted.call_count, 2)
+
+    def test_update_sections(self):
+        sections = dict((section.reference, section)
+                        for section in [make_section(reference) for reference in self.references])
+        tree = SectionTree(list(sections.values()))
+        removed_references = ['a.b', 'a.b.x', 'q.r.s']
+        for reference in removed_references:
+            del sections[reference]
+        added_sections = [make_section('a.b.z'), make_section('n.m')]
+        changed_sections = [make_section('q.r', title='Changed'), make_section('a.9:x')]
+        for section in added_sections + changed_sections:
+            sections[section.reference] = section
+        tree.update_sections(added_sections=added_sections, changed_sections=changed_sections,
+                             removed_references=removed_references)
+        self.assert_same_as_new_tree(tree, sections)
@@ -0,0 +1,44 @@
+import unittest
+
+from pythonkss.variables import VariableSubstituter, get_variable_substituter
+
+
+class VariableSubstituterTestCase(unittest.TestCase):
+    def test_substitute(self):
+        substituter = VariableSubstituter({'{% a %}': '1', '{% b %}': '2'})
+        self.assertEqual(substituter.substitute('a={% a %}, b={% b %}, a={% a %}'), 'a=1, b=2, a=1')
+
+    def test_substitute_no_variables(self):
+        substituter = VariableSubstituter({})
+        self.assertEqual(substituter.substitute('a={% a %}'), 'a={% a %}')
+
+    def test_substitute_unknown_variable(self):
+        substituter = VariableSubstituter({'{% a %}': '1'})
+        self.assertEqual(substituter.substitute('{% b %} {% a %}'), '{% b %} 1')
+
+    def test_substitute_longest_key_first(self):
+        substituter = VariableSubstituter({'$a': '1', '$ab': '2'})
+        self.assertEqual(substituter.substitute('$ab $a'), '2 1')
+
+    def test_substitute_does_not_substitute_values(self):
+        substituter = VariableSubstituter({'{% a %}': '{% b %}', '{% b %}': '2'})
+        self.assertEqual(substituter.substitute('{% a %}'), '{% b %}')
+
+    def test_substitute_regex_characters_in_keys(self):
+        substituter = VariableSubstituter({'{% $a.b* %}': '1'})
+        self.assertEqual(substituter.substitute('{% $a.b* %} {% $aXb %}'), '1 {% $aXb %}')
+
+    def test_might_contain_variables(self):
+        substituter = VariableSubstituter({'{% a %}': '1', '{% b %}': '2'})
+        self.assertEqual(substituter.prefix, '{% ')
+        self.assertTrue(substituter.might_contain_variables('x {% c %}'))
+        self.assertFalse(substituter.might_contain_variables('x {c}'))
+
+    def test_find_variables(self):
+        substituter = VariableSubstituter({'{% a %}': '1', '{% b %}': '2'})
+        self.assertEqual(substituter.find_variables('{% a %} {% a %} {% c %}'), {'{% a %}'})
+
+    def test_get_variable_substituter_reused(self):
+        substituter = get_variable_substituter({'{% a %}': '1'})
+        self.assertIs(get_variable_substituter({'{% a %}': '1'}), substituter)
+        self.assertIsNot(get_variable_substituter({'{% a %}': '2'}), substituter)
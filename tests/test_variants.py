@@ -0,0 +1,168 @@
+import unittest
+
+import mock
+
+import pythonkss
+from pythonkss.exceptions import ArgumentStringError
+from pythonkss.variants import ParserVariant, VariantSection, can_apply_variables_after_parsing
+
+from .styledirectory import TemporaryStyleDirectory, get_fixture_path
+
+
+class VariantTestCase(unittest.TestCase):
+    def setUp(self):
+        self.styles = TemporaryStyleDirectory(self, 'variants')
+        self.directory = self.styles.path
+        with open(get_fixture_path('variants', 'buttons.css')) as fileobj:
+            self.buttons_css = fileobj.read()
+
+    def __summarize(self, parser):
+        summary = []
+        for section in parser.iter_sorted_sections():
+            summary.append((
+                section.reference, section.title, section.description, section.description_html,
+                [(example.text, example.argumentstring, example.html) for example in section.examples]))
+        return summary
+
+    def test_variant_same_as_parsing_with_variables(self):
+        parser = pythonkss.Parser(self.directory)
+        for variables in [{'theme': 'dark', 'primary': '#000'}, {'theme': 'light', 'primary': '#fff'}]:
+            variant = parser.variant(variables)
+            self.assertIsNotNone(variant.template)
+            expected = pythonkss.Parser(self.directory, variables=variables)
+            self.assertEqual(self.__summarize(variant), self.__summarize(expected))
+
+    def test_variant_of_parser_with_variables(self):
+        parser = pythonkss.Parser(self.directory, variables={'theme': 'dark', 'primary': '#000'})
+        variant = parser.variant({'theme': 'light', 'primary': '#fff'})
+        self.assertIsNotNone(variant.template)
+        expected = pythonkss.Parser(self.directory, variables={'theme': 'light', 'primary': '#fff'})
+        self.assertEqual(self.__summarize(variant), self.__summarize(expected))
+        self.assertEqual(parser.get_section_by_reference('buttons').title, 'Buttons dark')
+
+    def test_variant_shares_sections_without_variables(self):
+        parser = pythonkss.Parser(self.directory)
+        dark = parser.variant({'theme': 'dark', 'primary': '#000'})
+        light = parser.variant({'theme': 'light', 'primary': '#fff'})
+        self.assertIs(dark.sections['buttons.sizes'], light.sections['buttons.sizes'])
+        self.assertIsNot(dark.sections['buttons'], light.sections['buttons'])
+        self.assertIsInstance(dark.sections['buttons'], VariantSection)
+        self.assertIs(dark.sections['buttons'].examples[1], light.sections['buttons'].examples[1])
+        self.assertIsNot(dark.sections['buttons'].examples[0], light.sections['buttons'].examples[0])
+
+    def test_variant_shares_description_html_without_variables(self):
+        self.styles.write('buttons.css', self.buttons_css.replace('Buttons in the {% theme %} theme.', 'Buttons.'))
+        parser = pythonkss.Parser(self.directory)
+        dark = parser.variant({'theme': 'dark', 'primary': '#000'})
+        light = parser.variant({'theme': 'light', 'primary': '#fff'})
+        dark.render_all()
+        self.assertTrue(light.sections['buttons'].has_rendered_description_html())
+        self.assertTrue(parser.sections['buttons'].has_rendered_description_html())
+
+    def test_variant_falls_back_to_parsing_for_multiline_values(self):
+        parser = pythonkss.Parser(self.directory)
+        variables = {'theme': 'dark\n\nExample:\n<p>Injected</p>', 'primary': '#000'}
+        variant = parser.variant(variables)
+        self.assertIsNone(variant.template)
+        expected = pythonkss.Parser(self.directory, variables=variables)
+        self.assertEqual(self.__summarize(variant), self.__summarize(expected))
+
+    def test_variant_falls_back_to_parsing_for_variables_in_reference(self):
+        self.styles.write('links.css', '/*\nLinks\n\nStyleguide {% section %}.links\n*/\n')
+        parser = pythonkss.Parser(self.directory)
+        variables = {'theme': 'dark', 'primary': '#000', 'section': 'buttons'}
+        variant = parser.variant(variables)
+        self.assertIsNone(variant.template)
+        self.assertEqual(variant.get_section_by_reference('buttons.links').title, 'Links')
+
+    def test_variant_falls_back_to_parsing_for_variables_in_example_arguments(self):
+        self.styles.write('links.css', (
+            '/*\nLinks\n\nExample: {syntax: {% syn %}} My title\n'
+            '    <a>Link</a>\n\nStyleguide links\n*/\n'))
+        variables = {'theme': 'dark', 'primary': '#000', 'syn': 'scss'}
+        variant = pythonkss.Parser(self.directory).variant(variables)
+        self.assertIsNone(variant.template)
+        self.assertEqual(variant.sections['links'].examples[0].syntax, 'scss')
+        self.assertEqual(self.__summarize(variant),
+                         self.__summarize(pythonkss.Parser(self.directory, variables=variables)))
+
+    def test_variant_falls_back_to_parsing_for_undetected_variables_in_example_arguments(self):
+        self.styles.write('links.css', '/*\nLinks\n\nExample:\n    <a>Link</a>\n\nStyleguide links\n*/\n')
+        variables = {'theme': 'dark', 'primary': '#000'}
+        parser = pythonkss.Parser(self.directory)
+        with mock.patch('pythonkss.variants.SectionTemplate', side_effect=ArgumentStringError('Invalid')):
+            variant = parser.variant(variables)
+            self.assertIsNone(variant.template)
+        self.assertEqual(self.__summarize(variant),
+                         self.__summarize(pythonkss.Parser(self.directory, variables=variables)))
+
+    def __assert_stops_using_template(self, call):
+        variables = {'theme': 'dark', 'primary': '#000'}
+        variant = pythonkss.Parser(self.directory).variant(variables)
+        self.assertIsNotNone(variant.template)
+        template_sections = variant.sections
+        call(variant)
+        self.assertIsNone(variant.template)
+        self.assertIsNot(variant.sections, template_sections)
+        self.assertEqual(self.__summarize(variant),
+                         self.__summarize(pythonkss.Parser(self.directory, variables=variables)))
+        return variant
+
+    def test_variant_parse(self):
+        self.__assert_stops_using_template(lambda variant: variant.parse())
+
+    def test_variant_iter_sections(self):
+        self.__assert_stops_using_template(lambda variant: list(variant.iter_sections()))
+
+    def test_variant_multiblockparser(self):
+        self.__assert_stops_using_template(lambda variant: variant.multiblockparser)
+
+    def test_variant_find_changed_files(self):
+        self.__assert_stops_using_template(lambda variant: variant.find_changed_files())
+
+    def test_variant_get_sections_using_variables(self):
+        variant = self.__assert_stops_using_template(
+            lambda variant: variant.get_sections_using_variables(['primary']))
+        self.assertEqual(
+            [section.reference for section in variant.get_sections_using_variables(['primary'])],
+            ['buttons.colors'])
+
+    def test_variant_refresh(self):
+        variant = pythonkss.Parser(self.directory).variant({'theme': 'dark', 'primary': '#000'})
+        variant.sections
+        variant.refresh()
+        self.assertIsNone(variant.template)
+        self.styles.write('buttons.css', self.buttons_css.replace('Buttons {% theme %}', 'Knapper {% theme %}'))
+        self.assertIn('buttons', variant.refresh().changed_references)
+        self.assertEqual(variant.sections['buttons'].title, 'Knapper dark')
+
+    def test_variant_update_variables(self):
+        variant = pythonkss.Parser(self.directory).variant({'theme': 'dark', 'primary': '#000'})
+        variant.sections
+        variant.update_variables({'theme': 'light', 'primary': '#000'})
+        self.assertIsNone(variant.template)
+        self.assertEqual(variant.sections['buttons'].title, 'Buttons light')
+
+    def test_variant_after_refresh(self):
+        parser = pythonkss.Parser(self.directory)
+        self.assertEqual(parser.variant({'theme': 'dark', 'primary': '#000'}).sections['buttons'].title,
+                         'Buttons dark')
+        self.styles.write('buttons.css', self.buttons_css.replace('Buttons {% theme %}', 'Knapper {% theme %}'))
+        parser.refresh()
+        variant = parser.variant({'theme': 'dark', 'primary': '#000'})
+        self.assertIsInstance(variant, ParserVariant)
+        self.assertEqual(variant.sections['buttons'].title, 'Knapper dark')
+
+
+class CanApplyVariablesAfterParsingTestCase(unittest.TestCase):
+    def test_simple_values(self):
+        self.assertTrue(can_apply_variables_after_parsing(
+            {'{% a %}': 'red', '{% b %}': 'Some text'}, '{{% {variable} %}}'))
+
+    def test_unsafe_values(self):
+        for value in ['', ' red', 'red\nblue', 'Styleguide 1', 'Example:', 'Title: x', 10]:
+            self.assertFalse(can_apply_variables_after_parsing(
+                {'{% a %}': value}, '{{% {variable} %}}'), repr(value))
+
+    def test_pattern_without_prefix(self):
+        self.assertFalse(can_apply_variables_after_parsing({'a': 'red'}, '{variable}'))
@@ -0,0 +1,106 @@
+import os
+import unittest
+
+import pythonkss
+from pythonkss import watch
+from pythonkss.exceptions import DuplicateReferenceError
+
+from .styledirectory import TemporaryStyleDirectory
+
+
+class WatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.styles = TemporaryStyleDirectory(self, 'watch')
+        self.directory = self.styles.path
+
+    def __make_watcher(self, backendclass=watch.PollingBackend, **parserkwargs):
+        parser = pythonkss.Parser(self.directory, **parserkwargs)
+        if backendclass is watch.PollingBackend:
+            backend = watch.PollingBackend(parser=parser, interval=0.01)
+        else:
+            backend = backendclass(parser=parser)
+        watcher = watch.Watcher(parser, debounce=0.05, backend=backend)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_no_changes(self):
+        watcher = self.__make_watcher()
+        self.assertEqual(watcher.wait_for_events(timeout=0.05), [])
+
+    def test_section_changed(self):
+        watcher = self.__make_watcher()
+        self.styles.write_comments('a.css', 'A changed\n\nStyleguide 2:a')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0], watch.SectionChanged)
+        self.assertEqual(events[0].section.title, 'A changed')
+
+    def test_section_added_and_removed(self):
+        watcher = self.__make_watcher()
+        self.styles.remove('b.css')
+        self.styles.write_comments('c.css', 'C\n\nStyleguide 1:c')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertEqual(
+            [(event.__class__, getattr(event, 'reference', None)) for event in events],
+            [(watch.SectionAdded, 'c'), (watch.SectionRemoved, 'b'), (watch.TreeReordered, None)])
+
+    def test_tree_reordered(self):
+        watcher = self.__make_watcher()
+        self.styles.write_comments('a.css', 'A\n\nStyleguide 0:a')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertIsInstance(events[-1], watch.TreeReordered)
+        self.assertEqual(events[-1].tree.sorted_children[0].reference, 'a')
+
+    @unittest.skipUnless(watch.inotify_simple, 'Requires inotify_simple')
+    def test_inotify_backend(self):
+        watcher = self.__make_watcher(backendclass=watch.InotifyBackend)
+        self.styles.write_comments('a.css', 'A changed\n\nStyleguide 2:a')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertEqual([event.section.title for event in events], ['A changed'])
+
+    def test_refresh_failed(self):
+        watcher = self.__make_watcher()
+        self.styles.write_comments('c.css', 'Duplicate\n\nStyleguide 1:b')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0], watch.RefreshFailed)
+        self.assertIsInstance(events[0].exception, DuplicateReferenceError)
+        self.assertEqual(set(watcher.parser.sections), {'a', 'b'})
+
+    def test_iter_events_continues_after_refresh_failed(self):
+        watcher = self.__make_watcher()
+        events = watcher.iter_events()
+        self.styles.write_comments('c.css', 'Duplicate\n\nStyleguide 1:b')
+        self.assertIsInstance(next(events), watch.RefreshFailed)
+        self.styles.write_comments('c.css', 'C\n\nStyleguide 3:c')
+        event = next(events)
+        self.assertIsInstance(event, watch.SectionAdded)
+        self.assertEqual(event.reference, 'c')
+
+    @unittest.skipUnless(watch.inotify_simple, 'Requires inotify_simple')
+    def test_inotify_backend_skips_excluded_directories(self):
+        os.makedirs(os.path.join(self.directory, 'node_modules', 'lib'))
+        os.makedirs(os.path.join(self.directory, 'components'))
+        watcher = self.__make_watcher(backendclass=watch.InotifyBackend,
+                                      exclude_directory_patterns=['node_modules'])
+        self.assertEqual(sorted(watcher.backend._watched_directories.values()),
+                         [self.directory, os.path.join(self.directory, 'components')])
+
+    @unittest.skipUnless(watch.inotify_simple, 'Requires inotify_simple')
+    def test_inotify_backend_ignores_irrelevant_files(self):
+        watcher = self.__make_watcher(backendclass=watch.InotifyBackend,
+                                      exclude_directory_patterns=['node_modules'])
+        self.styles.write_comments('notes.txt', 'Not a style file')
+        os.makedirs(os.path.join(self.directory, 'node_modules'))
+        self.assertFalse(watcher.backend.wait(timeout=0.1))
+        self.styles.write_comments('c.css', 'C\n\nStyleguide 3:c')
+        self.assertTrue(watcher.backend.wait(timeout=5))
+
+    @unittest.skipUnless(watch.inotify_simple, 'Requires inotify_simple')
+    def test_inotify_backend_watches_new_directories(self):
+        watcher = self.__make_watcher(backendclass=watch.InotifyBackend)
+        os.makedirs(os.path.join(self.directory, 'components'))
+        self.assertTrue(watcher.backend.wait(timeout=5))
+        self.styles.write_comments(os.path.join('components', 'c.css'), 'C\n\nStyleguide 3:c')
+        events = watcher.wait_for_events(timeout=5)
+        self.assertEqual([event.reference for event in events if isinstance(event, watch.SectionAdded)], ['c'])